@@ -4,15 +4,47 @@
 # Author: Anzize Daouda (@Tryboy869)
 # Contact: nexusstudio100@gmail.com
 
+import atexit
+import asyncio
 import os
 import sys
 import re
 import csv
+import bz2
+import gzip
+import contextlib
+import glob
+import io
 import json
+import math
+import marshal
+import mmap
+import hashlib
+import heapq
+import bisect
+import tempfile
 import time
+import random
+import operator
+import functools
+import itertools
+import threading
+import queue
+from array import array
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-import statistics
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
 
 def is_generator_mode():
     """Check if we should generate project files or run the translator"""
@@ -46,7 +78,7 @@ AVERAGE ← TOTAL÷⍴SALES
 GROWTH ← 100×(¯1↑SALES)÷1↑SALES
 
 ⍝ Monthly comparison  
-MONTHLY_CHANGE ← 1↓SALES-¯1↓SALES
+MONTHLY_CHANGE ← (1↓SALES)-¯1↓SALES
 TREND ← +/MONTHLY_CHANGE
 
 ⍝ Prediction (simple linear)
@@ -90,24 +122,24 @@ SORTED_ROWS ← DATA[⍋+/DATA;]
 ⍝ Sample customer data processing
 CUSTOMERS ← 1000?100000  ⍝ Customer IDs
 PURCHASES ← 1000?5000    ⍝ Purchase amounts
-REGIONS ← 1000?10        ⍝ Region codes
+REGIONS ← ?1000⍴10       ⍝ Region codes
 
 ⍝ Segmentation analysis
 HIGH_VALUE ← PURCHASES > 1000
 PREMIUM_CUSTOMERS ← HIGH_VALUE / CUSTOMERS
 
-⍝ Regional performance
-REGIONAL_SALES ← {+/PURCHASES×REGIONS=⍵}¨⍳10
-TOP_REGION ← REGIONAL_SALES⍳⌈/REGIONAL_SALES
+⍝ Regional performance (one hash pass with the key operator)
+REGIONAL_SALES ← REGIONS {+/⍵}⌸ PURCHASES
+TOP_REGION ← (∪REGIONS)[REGIONAL_SALES⍳⌈/REGIONAL_SALES]
 
 ⍝ Trends and patterns
-QUARTILES ← PURCHASES[⍋PURCHASES][0.25 0.5 0.75×≢PURCHASES]
+QUARTILES ← PURCHASES[⍋PURCHASES][⌈0.25 0.5 0.75×≢PURCHASES]
 OUTLIERS ← (PURCHASES > 3×QUARTILES[2]) / PURCHASES
 
 ⍝ Insights generation
 TOTAL_REVENUE ← +/PURCHASES
 AVG_ORDER ← TOTAL_REVENUE ÷ ≢PURCHASES
-CONVERSION_RATE ← 100 × ≢PREMIUM_CUSTOMERS ÷ ≢CUSTOMERS
+CONVERSION_RATE ← 100 × (≢PREMIUM_CUSTOMERS) ÷ ≢CUSTOMERS
 
 'Total Revenue: $' , ⍕TOTAL_REVENUE
 'Average Order: $' , ⍕AVG_ORDER
@@ -170,442 +202,6727 @@ def create_sample_data():
 
 def parse_natural_syntax(command):
     """Translate natural syntax to APL operations"""
+    if command.rstrip().endswith('&'):
+        return start_job(command.rstrip()[:-1].strip())
     
     # Pattern matching for natural language
     patterns = {
-        r'load data "([^"]+)"': lambda m: load_data_file(m.group(1)),
+        r'load data "([^"]+)"\s*(.*)': lambda m: load_data_file(m.group(1), m.group(2)),
         r'analyze data "([^"]+)" (.+)': lambda m: analyze_data_advanced(m.group(1), m.group(2)),
-        r'calculate (.+) from "([^"]+)"': lambda m: calculate_metrics(m.group(2), m.group(1)),
+        r'follow data "([^"]+)"\s*(.*?)(?:\s*every ([\d.]+))?\s*$': lambda m: (
+            follow_loop(m.group(1), m.group(2), float(m.group(3))) if m.group(3)
+            else follow_data(m.group(1), m.group(2))),
+        r'calculate (.+) from "([^"]+)"\s*(.*)': lambda m: calculate_metrics(m.group(2), m.group(1), m.group(3)),
         r'show examples': lambda: show_examples(),
         r'run "([^"]+)"': lambda m: run_apl_file(m.group(1)),
-        r'explain "([^"]+)"': lambda m: explain_apl_code(m.group(1)),
+        r'explain "([^"]+)"\s*(.*)': lambda m: explain_apl_code(m.group(1), m.group(2)),
         r'benchmark (.+)': lambda m: benchmark_operation(m.group(1)),
+        r'cache (stats|clear|budget)\s*([\d.]*)': lambda m: cache_command(m.group(1).lower(), m.group(2)),
+        r'profile\s*(on|off|clear|export|report)?\s*(.*)': lambda m: profile_command((m.group(1) or 'report').lower(), m.group(2)),
+        r'^backend\b\s*(.*)': lambda m: backend_command(m.group(1)),
+        r'^sort budget\s*([\d.]*)\s*$': lambda m: sort_budget_command(m.group(1)),
+        r'^refine\s*(\d*)\s*$': lambda m: refine_command(m.group(1)),
+        r'^jobs\s*$': lambda m: jobs_command(),
+        r'^wait\s*(\d*)\s*$': lambda m: wait_command(m.group(1)),
+        r'^cancel\s+(\d+)\s*$': lambda m: cancel_command(m.group(1)),
         r'help': lambda: show_help()
     }
     
     for pattern, handler in patterns.items():
         match = re.search(pattern, command, re.IGNORECASE)
         if match:
-            return handler() if pattern in ['show examples', 'help'] else handler(match)
+            if not PROFILER.enabled or pattern.startswith('profile'):
+                return handler() if pattern in ['show examples', 'help'] else handler(match)
+            with PROFILER.span(command, 'command'):
+                result = handler() if pattern in ['show examples', 'help'] else handler(match)
+            return f"{result}\n\n{PROFILER.report()}"
     
     return "Command not recognized. Type 'help' for available commands."
 
-def load_data_file(filename):
-    """Load and analyze CSV data file"""
-    filepath = Path(filename)
-    if not filepath.exists():
-        examples_path = Path('examples') / filename
-        if examples_path.exists():
-            filepath = examples_path
-        else:
-            return f"❌ Data file not found: {filename}"
-    
-    try:
-        start_time = time.time()
-        
-        with open(filepath, 'r') as f:
-            reader = csv.DictReader(f)
-            data = list(reader)
-        
-        load_time = time.time() - start_time
-        
-        # Quick analysis
-        num_rows = len(data)
-        num_cols = len(data[0]) if data else 0
-        columns = list(data[0].keys()) if data else []
-        
-        # Generate APL representation
-        apl_code = f'''⍝ Data loaded: {filepath.name}
-ROWS ← {num_rows}
-COLS ← {num_cols}
-COLUMNS ← {repr(columns)}
+# ---------------------------------------------------------------------------
+# Profiling
+#
+# When enabled (--profile or "profile on"), commands and APL lines record
+# nested spans: wall time from perf_counter, rows and bytes processed, and
+# peak memory. Spans cost one attribute check when profiling is off. The
+# collected spans can be exported as a JSON report or as Chrome trace events
+# (chrome://tracing, Perfetto). Only the newest PROFILER_MAX_SPANS are kept,
+# and each thread (REPL, job, server request) reports its own last command.
+# ---------------------------------------------------------------------------
 
-⍝ Sample operations available:
-⍝ TOTAL ← +/NUMERIC_COLUMN
-⍝ AVERAGE ← (+/DATA) ÷ ≢DATA  
-⍝ TRENDS ← 1↓DATA - ¯1↓DATA'''
-        
-        result = f"✅ Loaded: {filepath.name}\n"
-        result += f"📊 Data: {num_rows} rows, {num_cols} columns\n"
-        result += f"📈 Columns: {', '.join(columns)}\n"
-        result += f"⚡ Load time: {load_time:.3f} seconds\n\n"
-        result += f"Generated APL:\n{apl_code}"
-        
-        return result
-        
-    except Exception as e:
-        return f"❌ Error loading data: {str(e)}"
+PROFILER_MAX_SPANS = int(os.getenv('NEW_APL_PROFILE_SPANS', '100000'))
 
-def analyze_data_advanced(filename, operations):
-    """Perform advanced data analysis"""
-    filepath = Path(filename)
-    if not filepath.exists():
-        examples_path = Path('examples') / filename
-        if examples_path.exists():
-            filepath = examples_path
-        else:
-            return f"❌ Data file not found: {filename}"
-    
-    try:
-        start_time = time.time()
-        
-        with open(filepath, 'r') as f:
-            reader = csv.DictReader(f)
-            data = list(reader)
-        
-        # Extract numeric columns for analysis
-        numeric_data = {}
-        for row in data:
-            for key, value in row.items():
-                if key not in numeric_data:
-                    numeric_data[key] = []
-                try:
-                    numeric_data[key].append(float(value))
-                except ValueError:
-                    numeric_data[key].append(value)
-        
-        # Filter to actual numeric columns
-        numeric_cols = {k: v for k, v in numeric_data.items() 
-                       if all(isinstance(x, (int, float)) for x in v)}
-        
-        analysis_time = time.time() - start_time
-        
-        result = f"✅ Analysis complete for {filepath.name}\n"
-        result += f"⚡ Processing time: {analysis_time:.3f} seconds\n"
-        result += f"📊 Analyzed {len(data)} records\n\n"
-        
-        # Generate insights
-        if 'trend' in operations.lower():
-            result += "📈 TRENDS DETECTED:\n"
-            for col, values in numeric_cols.items():
-                if len(values) > 1:
-                    trend = values[-1] - values[0]
-                    percentage = (trend / values[0]) * 100 if values[0] != 0 else 0
-                    result += f"   {col}: {trend:+.1f} ({percentage:+.1f}%)\n"
-        
-        if 'predict' in operations.lower():
-            result += "\n🔮 PREDICTIONS:\n"
-            for col, values in numeric_cols.items():
-                if len(values) >= 3:
-                    avg_change = sum(values[i+1] - values[i] for i in range(len(values)-1)) / (len(values)-1)
-                    prediction = values[-1] + avg_change
-                    result += f"   Next {col}: {prediction:.1f}\n"
-        
-        if 'visualize' in operations.lower():
-            result += "\n📊 VISUALIZATION READY:\n"
-            result += "   Charts generated for numeric columns\n"
-            result += "   Trend lines calculated\n"
-            result += "   Distribution analysis complete\n"
-        
-        # Generate equivalent APL code
-        apl_code = f'''⍝ Advanced analysis - Generated APL
-DATA ← {len(data)} {len(numeric_cols)}⍴⍳{len(data) * len(numeric_cols)}
-TRENDS ← 1↓DATA - ¯1↓DATA  
-PREDICTIONS ← (¯1↑DATA) + (+/TRENDS)÷≢TRENDS
-INSIGHTS ← 'Analysis complete in {analysis_time:.3f}s'
-        '''
-        
-        result += f"\nGenerated APL:\n{apl_code}"
-        
-        return result
-        
-    except Exception as e:
-        return f"❌ Analysis error: {str(e)}"
+class ProfileSpan:
+    """One timed phase; set rows/nbytes inside the with-block"""
+    __slots__ = ('name', 'category', 'depth', 'start', 'duration', 'rows', 'nbytes',
+                 'peak', 'track_peak', 'children_peak', 'pid', 'tid')
 
-def calculate_metrics(filename, metrics):
-    """Calculate specific metrics from data"""
-    filepath = Path(filename)
-    if not filepath.exists():
-        examples_path = Path('examples') / filename
-        if examples_path.exists():
-            filepath = examples_path
-        else:
-            return f"❌ Data file not found: {filename}"
-    
-    try:
-        with open(filepath, 'r') as f:
-            reader = csv.DictReader(f)
-            data = list(reader)
-        
-        # Extract numeric data
-        numeric_data = {}
-        for row in data:
-            for key, value in row.items():
-                if key not in numeric_data:
-                    numeric_data[key] = []
-                try:
-                    numeric_data[key].append(float(value))
-                except ValueError:
-                    continue
-        
-        result = f"📊 Metrics for {filepath.name}:\n\n"
-        
-        for col, values in numeric_data.items():
-            if values:  # Only process columns with numeric data
-                total = sum(values)
-                average = total / len(values)
-                minimum = min(values)
-                maximum = max(values)
-                
-                if len(values) > 1:
-                    std_dev = statistics.stdev(values)
-                    median = statistics.median(values)
-                else:
-                    std_dev = 0
-                    median = values[0]
-                
-                result += f"{col.upper()}:\n"
-                result += f"   Total: {total:,.2f}\n"
-                result += f"   Average: {average:,.2f}\n"
-                result += f"   Median: {median:,.2f}\n"
-                result += f"   Range: {minimum:,.2f} - {maximum:,.2f}\n"
-                result += f"   Std Dev: {std_dev:.2f}\n\n"
-        
-        # APL equivalent
-        apl_code = '''⍝ Metrics calculation - APL style
-TOTAL ← +/DATA
-AVERAGE ← TOTAL÷≢DATA
-MAXIMUM ← ⌈/DATA
-MINIMUM ← ⌊/DATA
-RANGE ← MAXIMUM - MINIMUM'''
-        
-        result += f"APL equivalent:\n{apl_code}"
-        
-        return result
-        
-    except Exception as e:
-        return f"❌ Calculation error: {str(e)}"
+    def __init__(self, name, category, depth, track_peak):
+        self.name = name
+        self.category = category
+        self.depth = depth
+        self.start = 0.0
+        self.duration = 0.0
+        self.rows = 0
+        self.nbytes = 0
+        self.peak = 0
+        self.track_peak = track_peak
+        self.children_peak = 0
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
 
-def show_examples():
-    """Show available example programs"""
-    examples_dir = Path('examples')
-    if not examples_dir.exists():
-        return "No examples found. Run with --generate to create examples."
-    
-    apl_files = list(examples_dir.glob('*.apl'))
-    csv_files = list(examples_dir.glob('*.csv'))
-    
-    if not apl_files:
-        return "No example files found in examples/ directory."
-    
-    result = "📚 Available Examples:\n\n"
-    result += "APL Programs:\n"
-    for i, example in enumerate(apl_files, 1):
-        description = get_apl_description(example.name)
-        result += f"{i}. {example.name} - {description}\n"
-    
-    if csv_files:
-        result += "\nSample Data:\n"
-        for i, data_file in enumerate(csv_files, 1):
-            result += f"{i}. {data_file.name} - Sample dataset for analysis\n"
-    
-    result += "\nUsage Examples:\n"
-    result += '• load data "sales_data.csv"\n'
-    result += '• analyze data "customer_data.csv" trend predict\n'  
-    result += '• run "sales_analysis.apl"\n'
-    result += '• explain "matrix_operations.apl"'
-    
-    return result
+    def as_dict(self):
+        return {'name': self.name, 'category': self.category, 'depth': self.depth,
+                'start': self.start, 'duration': self.duration, 'rows': self.rows,
+                'bytes': self.nbytes, 'peak_bytes': self.peak, 'pid': self.pid, 'tid': self.tid}
 
-def get_apl_description(filename):
-    """Get description for APL example file"""
-    descriptions = {
-        'sales_analysis.apl': 'Revenue analysis and forecasting',
-        'matrix_operations.apl': 'Array manipulation and linear algebra',
-        'data_insights.apl': 'Customer segmentation and business intelligence'
-    }
-    return descriptions.get(filename, 'APL example program')
+class _NullSpan:
+    rows = nbytes = 0
 
-def run_apl_file(filename):
-    """Simulate running an APL file"""
-    filepath = Path(filename)
-    if not filepath.exists():
-        examples_path = Path('examples') / filename
-        if examples_path.exists():
-            filepath = examples_path
-        else:
-            return f"❌ File not found: {filename}"
-    
-    try:
-        start_time = time.time()
-        content = filepath.read_text()
-        
-        print(f"🚀 Running {filepath.name}...")
-        print("=" * 40)
-        
-        # Simulate APL execution with results
-        lines = content.split('\n')
-        result_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('⍝'):
-                continue  # Skip comments and empty lines
-            
-            # Simulate some APL operations
-            if 'SALES' in line and '←' in line:
-                result_lines.append("Sales data loaded: 12 months")
-            elif 'TOTAL ← +/SALES' in line:
-                result_lines.append("Total Sales: 20,500")
-            elif 'AVERAGE ← TOTAL÷⍴SALES' in line:
-                result_lines.append("Average Monthly: 1,708.33")
-            elif 'GROWTH' in line:
-                result_lines.append("Growth Rate: 100%")
-            elif 'NEXT_MONTH' in line:
-                result_lines.append("Predicted Next Month: 2,550")
-            elif line.startswith("'") and line.endswith("'"):
-                # Output statements
-                output = line.strip("'")
-                result_lines.append(output)
-        
-        for result in result_lines:
-            print(result)
-        
-        execution_time = time.time() - start_time
-        print("=" * 40)
-        print(f"✅ Execution completed in {execution_time:.3f} seconds")
-        print(f"🏆 APL Performance: Native array processing")
-        
-        return f"✅ {filepath.name} executed successfully"
-        
-    except Exception as e:
-        return f"❌ Error running {filename}: {str(e)}"
+    def __enter__(self):
+        return self
 
-def explain_apl_code(filename):
-    """Explain what an APL program does"""
-    filepath = Path(filename)
-    if not filepath.exists():
-        examples_path = Path('examples') / filename
-        if examples_path.exists():
-            filepath = examples_path
-        else:
-            return f"❌ File not found: {filename}"
-    
-    try:
-        content = filepath.read_text()
-        lines = content.split('\n')
-        
-        explanation = f"📝 APL Code Explanation for {filepath.name}:\n\n"
-        
-        for i, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line:
-                continue
-                
-            if line.startswith('⍝'):
-                explanation += f"Line {i}: Comment - {line[1:].strip()}\n"
-            elif '←' in line:
-                var_name = line.split('←')[0].strip()
-                explanation += f"Line {i}: Assigns result to variable '{var_name}'\n"
-            elif '+/' in line:
-                explanation += f"Line {i}: Sums all elements in array\n"
-            elif '÷' in line:
-                explanation += f"Line {i}: Division operation\n"
-            elif '⍴' in line:
-                explanation += f"Line {i}: Gets shape/size of array\n"
-            elif '⌈/' in line:
-                explanation += f"Line {i}: Finds maximum value\n"
-            elif '⌊/' in line:
-                explanation += f"Line {i}: Finds minimum value\n"
-            elif '?' in line:
-                explanation += f"Line {i}: Generates random numbers\n"
-            elif line.startswith("'") and line.endswith("'"):
-                explanation += f"Line {i}: Outputs text to display\n"
-            elif any(op in line for op in ['×', '+', '-']):
-                explanation += f"Line {i}: Performs arithmetic operations\n"
-            else:
-                explanation += f"Line {i}: APL array operation\n"
-        
-        explanation += f"\n💡 APL Key Concepts:\n"
-        explanation += f"• Arrays are fundamental - everything operates on arrays\n"
-        explanation += f"• Operations are vectorized automatically\n" 
-        explanation += f"• Concise syntax - one line can do complex operations\n"
-        explanation += f"• Right-to-left evaluation (like math notation)\n"
-        
-        return explanation
-        
-    except Exception as e:
-        return f"❌ Error reading {filename}: {str(e)}"
+    def __exit__(self, *exc):
+        return False
 
-def benchmark_operation(operation):
-    """Benchmark APL-style operations"""
-    import random
-    
-    print(f"🏁 Benchmarking: {operation}")
-    
-    if 'matrix' in operation.lower():
-        # Matrix multiplication benchmark
-        size = 100
-        data_size = size * size
-        
-        start_time = time.time()
-        # Simulate APL matrix operations
-        matrix_a = [random.random() for _ in range(data_size)]
-        matrix_b = [random.random() for _ in range(data_size)]
-        
-        # Simulate optimized array processing
-        result = []
-        for i in range(size):
-            row = []
-            for j in range(size):
-                sum_val = 0
-                for k in range(size):
-                    sum_val += matrix_a[i*size + k] * matrix_b[k*size + j]
-                row.append(sum_val)
-            result.extend(row)
-        
-        apl_time = time.time() - start_time
-        
-        return f"""⚡ Matrix Multiplication Benchmark Results:
-📊 Matrix size: {size}x{size} ({data_size:,} elements)
-🏆 APL-style processing: {apl_time:.3f} seconds
-📈 Equivalent Python nested loops: ~{apl_time * 50:.3f} seconds  
-🚀 Performance advantage: ~50x faster
-💡 APL processes arrays natively, not element by element"""
-    
-    elif 'sum' in operation.lower():
-        # Large array summation
-        size = 1000000
-        start_time = time.time()
-        
-        data = [random.random() for _ in range(size)]
-        total = sum(data)
-        
-        apl_time = time.time() - start_time
-        
-        return f"""⚡ Array Summation Benchmark Results:
-📊 Array size: {size:,} elements
-🏆 APL-style sum: {apl_time:.3f} seconds
-📈 Result: {total:.6f}
-🚀 Memory efficient: Single pass through data
-💡 APL '+/' operator is vectorized at machine level"""
-    
-    else:
-        return f"Benchmark type '{operation}' not recognized. Try 'matrix' or 'sum'."
+    def __setattr__(self, name, value):
+        pass
 
-def show_help():
-    """Show available commands"""
-    return """📖 New APL Commands:
+_NULL_SPAN = _NullSpan()
 
-🔧 Data Operations:
-  load data "filename.csv"              - Load and analyze CSV data
-  analyze data "file.csv" trend predict - Advanced analysis with insights
-  calculate metrics from "file.csv"     - Statistical calculations
+def _process_peak_bytes():
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
 
-📊 APL Programs:
-  show examples                         - List available examples
-  run "filename.apl"                    - Execute APL program
-  explain "filename.apl"                - Get code explanation
+class Profiler:
+    """Collects spans for every command while profiling is enabled"""
 
-⚡ Performance:
-  benchmark matrix                      - Test matrix operations
-  benchmark sum                         - Test array summation
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.spans = deque(maxlen=PROFILER_MAX_SPANS)
+        self._local = threading.local()
+        self._origin = time.perf_counter()
 
-💡 Examples:
-  load data "sales_data.csv"
-  analyze data "customer_data.csv" trend predict visualize  
-  run "sales_analysis.apl"
-  benchmark matrix
+    def enable(self, trace_memory=False):
+        import tracemalloc
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        import tracemalloc
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def clear(self):
+        self.spans.clear()
+        self._local.__dict__.pop('last', None)
+
+    def span(self, name, category='phase', track_peak=False):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _SpanContext(self, name, category, track_peak)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, span):
+        self.spans.append(span)
+        inner = getattr(self._local, 'inner', None)
+        if inner is None:
+            inner = self._local.inner = []
+        if span.depth:
+            inner.append(span)
+        else:
+            self._local.last = (span, sorted(inner, key=lambda s: s.start))
+            self._local.inner = []
+
+    def adopt(self, spans):
+        """Record spans returned by a pool worker below the current span of this thread"""
+        depth = len(self._stack())
+        for span in spans:
+            span.depth += depth
+            self._record(span)
+
+    def last_command(self):
+        """Spans of this thread's most recent top-level command, in start order"""
+        return getattr(self._local, 'last', (None, []))
+
+    def report(self):
+        """Per-phase table for the most recent command"""
+        command, inner = self.last_command()
+        if command is None:
+            return "⏱️ No profiled commands yet"
+        phases = OrderedDict()
+        for span in inner:
+            key = ('  ' * (span.depth - 1)) + span.name
+            entry = phases.setdefault(key, [0, 0.0, 0, 0, 0])
+            entry[0] += 1
+            entry[1] += span.duration
+            entry[2] += span.rows
+            entry[3] += span.nbytes
+            entry[4] = max(entry[4], span.peak)
+        result = f"⏱️ Profile: {command.name} — {command.duration * 1000:,.2f} ms"
+        if command.peak:
+            result += f", peak memory {command.peak / (1024 * 1024):,.1f} MB"
+            result += " (traced)" if self.trace_memory else " (process RSS)"
+        result += (f"\n{'phase':<36}{'calls':>6}{'ms':>11}{'%':>7}{'rows/s':>15}"
+                   f"{'MB/s':>9}{'peak MB':>9}\n")
+        for name, (calls, seconds, rows, nbytes, peak) in phases.items():
+            share = 100 * seconds / command.duration if command.duration else 0
+            rate = f"{rows / seconds:,.0f}" if rows and seconds else ''
+            throughput = f"{nbytes / seconds / 1e6:,.1f}" if nbytes and seconds else ''
+            high = f"{peak / (1024 * 1024):,.1f}" if peak else ''
+            result += (f"{name[:35]:<36}{calls:>6}{seconds * 1000:>11,.2f}{share:>7.1f}"
+                       f"{rate:>15}{throughput:>9}{high:>9}".rstrip() + "\n")
+        return result.rstrip()
+
+    def export(self, path, chrome=False):
+        """Write all spans as a JSON report or Chrome trace events"""
+        if chrome:
+            document = {'traceEvents': [
+                {'name': s.name, 'cat': s.category, 'ph': 'X', 'pid': s.pid, 'tid': s.tid,
+                 'ts': round(s.start * 1e6, 3), 'dur': round(s.duration * 1e6, 3),
+                 'args': {'rows': s.rows, 'bytes': s.nbytes, 'peak_bytes': s.peak}}
+                for s in self.spans], 'displayTimeUnit': 'ms'}
+        else:
+            document = {'timestamp': datetime.now().isoformat(timespec='seconds'),
+                        'memory': 'traced' if self.trace_memory else 'process RSS',
+                        'spans': [s.as_dict() for s in self.spans]}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=None if chrome else 2)
+        return len(self.spans)
+
+class _SpanContext:
+    __slots__ = ('profiler', 'span')
+
+    def __init__(self, profiler, name, category, track_peak):
+        self.profiler = profiler
+        stack = profiler._stack()
+        self.span = ProfileSpan(name, category, len(stack), track_peak or not stack)
+
+    def __enter__(self):
+        profiler, span = self.profiler, self.span
+        profiler._stack().append(span)
+        if span.track_peak and profiler.trace_memory:
+            import tracemalloc
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+        span.start = time.perf_counter() - profiler._origin
+        return span
+
+    def __exit__(self, *exc):
+        profiler, span = self.profiler, self.span
+        span.duration = time.perf_counter() - profiler._origin - span.start
+        stack = profiler._stack()
+        stack.pop()
+        if span.track_peak:
+            if profiler.trace_memory:
+                import tracemalloc
+                span.peak = max(tracemalloc.get_traced_memory()[1], span.children_peak)
+            else:
+                span.peak = _process_peak_bytes()
+            if stack:
+                stack[-1].children_peak = max(stack[-1].children_peak, span.peak)
+        profiler._record(span)
+        return False
+
+PROFILER = Profiler()
+
+def profile_command(action, argument=''):
+    """Turn profiling on/off, show the last report or export spans"""
+    if action == 'on':
+        PROFILER.enable(trace_memory='memory' in argument.lower())
+        return ("⏱️ Profiling on" +
+                (" with traced memory (slower)" if PROFILER.trace_memory else "") +
+                ": every command now prints per-phase timings")
+    if action == 'off':
+        PROFILER.disable()
+        return "⏱️ Profiling off"
+    if action == 'clear':
+        PROFILER.clear()
+        return "🧹 Profile spans cleared"
+    if action == 'export':
+        target = re.search(r'"([^"]+)"', argument)
+        if not target:
+            return '❌ Usage: profile export [json|chrome] "file.json"'
+        chrome = 'chrome' in argument.lower()
+        count = PROFILER.export(target.group(1), chrome)
+        kind = 'Chrome trace events' if chrome else 'JSON report'
+        return f"💾 Exported {count} spans to {target.group(1)} ({kind})"
+    return PROFILER.report()
+
+# ---------------------------------------------------------------------------
+# Background jobs
+#
+# A command ending in "&" runs on a daemon thread while the prompt stays
+# responsive: "jobs" lists them, "wait N" blocks for one and prints its
+# output, "cancel N" stops one. At most JOB_WORKERS run at once and the rest
+# wait queued. Threads rather than processes keep the dataset and program
+# caches shared with the session (CSV parsing still fans out to its own
+# process pool). Loaders and the APL evaluator call job_checkpoint at chunk
+# boundaries - every CSV chunk and byte range, every APL statement - which
+# counts the rows and bytes processed and stops a cancelled job there.
+# ---------------------------------------------------------------------------
+
+JOB_WORKERS = int(os.getenv('NEW_APL_JOB_WORKERS', '0')) or max(2, (os.cpu_count() or 1) // 2)
+JOBS = []
+_JOBS_LOCK = threading.Lock()
+_JOB_SLOTS = threading.BoundedSemaphore(JOB_WORKERS)
+_JOB_LOCAL = threading.local()
+
+class JobCancelled(BaseException):
+    """Raised at a checkpoint of a cancelled job.
+
+    A BaseException, like KeyboardInterrupt, so the commands' own
+    "except Exception" handlers do not turn it into an error message.
+    """
+
+class Job:
+    """One command queued or running on a background thread"""
+
+    def __init__(self, number, command):
+        self.number = number
+        self.command = command
+        self.future = Future()
+        self.cancel_requested = threading.Event()
+        self.started = None
+        self.finished = None
+        self.rows = 0
+        self.nbytes = 0
+        self.output = ''
+        self.notified = False
+
+    @property
+    def status(self):
+        if not self.future.done():
+            if self.cancel_requested.is_set():
+                return 'cancelling'
+            return 'running' if self.started else 'queued'
+        error = self.future.exception()
+        if isinstance(error, JobCancelled):
+            return 'cancelled'
+        return 'failed' if error is not None else 'done'
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def progress(self):
+        """Rows and bytes processed so far, with throughput"""
+        if not self.rows and not self.nbytes:
+            return 'no rows reported'
+        seconds = max(self.elapsed, 1e-9)
+        text = f"{self.rows:,} rows ({self.rows / seconds:,.0f} rows/s"
+        if self.nbytes:
+            text += f", {self.nbytes / seconds / (1024 * 1024):,.1f} MB/s"
+        return text + ')'
+
+    def describe(self):
+        return f"#{self.number} {self.status} {self.elapsed:.1f}s · {self.progress()} · {self.command}"
+
+def job_checkpoint(rows=0, nbytes=0):
+    """Count progress for the job on this thread; raise JobCancelled if it was cancelled"""
+    job = getattr(_JOB_LOCAL, 'job', None)
+    if job is None:
+        return
+    job.rows += rows
+    job.nbytes += nbytes
+    if job.cancel_requested.is_set():
+        raise JobCancelled(f"job #{job.number} cancelled")
+
+def _run_job(job):
+    with _JOB_SLOTS:
+        if job.cancel_requested.is_set():
+            job.finished = time.time()
+            job.future.set_exception(JobCancelled(f"job #{job.number} cancelled"))
+            return
+        job.started = time.time()
+        _JOB_LOCAL.job = job
+        sys.stdout.capture()
+        result, error = None, None
+        try:
+            result = parse_natural_syntax(job.command)
+        except BaseException as e:
+            error = e
+        finally:
+            job.output = sys.stdout.release()
+            job.finished = time.time()
+            _JOB_LOCAL.job = None
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+def start_job(command):
+    """Run a command on a background thread; returns a message with its job number"""
+    if not command:
+        return "❌ Nothing to run: put a command before '&'"
+    if not isinstance(sys.stdout, _ThreadOutput):
+        # job threads capture their prints; everything else still reaches the terminal
+        sys.stdout = _ThreadOutput(sys.stdout)
+    with _JOBS_LOCK:
+        job = Job(len(JOBS) + 1, command)
+        JOBS.append(job)
+    threading.Thread(target=_run_job, args=(job,), name=f"job-{job.number}", daemon=True).start()
+    return (f"🧵 Job #{job.number} started: {command}\n"
+            f"   'jobs' shows progress, 'wait {job.number}' its result, 'cancel {job.number}' stops it")
+
+def _find_job(argument):
+    number = int(argument)
+    if not 1 <= number <= len(JOBS):
+        return None
+    return JOBS[number - 1]
+
+def jobs_command():
+    """List background jobs with their progress"""
+    if not JOBS:
+        return "🧵 No jobs: end a command with '&' to run it in the background"
+    result = "🧵 Jobs:\n"
+    for job in JOBS:
+        result += f"   {job.describe()}\n"
+    return result.rstrip()
+
+def _job_result(job):
+    status = job.status
+    if status == 'cancelled':
+        return f"⏹️ Job #{job.number} cancelled after {job.elapsed:.1f}s · {job.progress()}"
+    if status == 'failed':
+        return f"❌ Job #{job.number} failed: {job.future.exception()}"
+    output = f"{job.output.rstrip()}\n\n" if job.output.strip() else ''
+    return (f"✅ Job #{job.number} finished in {job.elapsed:.1f}s · {job.progress()}\n"
+            f"   {job.command}\n\n{output}{job.future.result()}")
+
+def wait_command(argument=''):
+    """Block until one job (or every job) finishes and show its result"""
+    if argument.strip():
+        job = _find_job(argument)
+        if job is None:
+            return f"❌ No job #{argument} (1-{len(JOBS)})" if JOBS else "❌ No jobs"
+        waiting = [job]
+    else:
+        waiting = list(JOBS)
+        if not waiting:
+            return "🧵 No jobs to wait for"
+    try:
+        for job in waiting:
+            job.future.exception()
+    except KeyboardInterrupt:
+        return f"⏸️ Stopped waiting; {sum(not job.future.done() for job in waiting)} job(s) still running"
+    for job in waiting:
+        job.notified = True
+    return '\n\n'.join(_job_result(job) for job in waiting)
+
+def cancel_command(argument):
+    """Ask a job to stop at its next chunk boundary"""
+    job = _find_job(argument)
+    if job is None:
+        return f"❌ No job #{argument} (1-{len(JOBS)})" if JOBS else "❌ No jobs"
+    if job.future.done():
+        return f"ℹ️ Job #{job.number} already {job.status}"
+    job.cancel_requested.set()
+    return f"⏹️ Cancelling job #{job.number}: it stops at its next chunk boundary"
+
+def job_notices():
+    """One line per job that finished since the last notice"""
+    notices = []
+    for job in JOBS:
+        if job.future.done() and not job.notified:
+            job.notified = True
+            notices.append(f"🔔 Job #{job.number} {job.status} after {job.elapsed:.1f}s "
+                           f"('wait {job.number}' shows the result)")
+    return notices
+
+# ---------------------------------------------------------------------------
+# Array backends
+#
+# The numeric kernels shared by the data commands and the APL evaluator
+# (reductions, scans, elementwise arithmetic, sort/grade, matrix product and
+# the moments behind every statistic) go through BACKEND. PythonBackend needs
+# nothing beyond array('d'); NumpyBackend views the same buffers with
+# numpy.frombuffer and is picked automatically when NumPy is installed.
+# Inputs shorter than NUMPY_MIN_LENGTH stay on the Python kernels, where the
+# conversion would cost more than it saves. Override with --backend=python,
+# NEW_APL_BACKEND=python or the "backend python" command. Kernels look the
+# backend up with active_backend(), so "benchmark ... backend X" can time
+# another backend on its own thread without switching it for the session.
+# ---------------------------------------------------------------------------
+
+NUMPY_MIN_LENGTH = 256
+NUMPY_INNER_MIN = 32768
+INNER_PRODUCT_TILE = 64
+
+_BACKEND_OPS = {'+': operator.add, '-': operator.sub, '×': operator.mul,
+                '÷': operator.truediv, '⌈': max, '⌊': min}
+
+def _inner_tiles(rows, cols, cell, tile=INNER_PRODUCT_TILE):
+    """cell(row, col) for every pair, one block of columns at a time"""
+    m, p = len(rows), len(cols)
+    out = [None] * (m * p)
+    for j in range(0, p, tile):
+        block = cols[j:j + tile]
+        for i, row in enumerate(rows):
+            out[i * p + j:i * p + j + len(block)] = [cell(row, col) for col in block]
+    return out
+
+class PythonBackend:
+    """Numeric kernels over array('d') using only the standard library"""
+    name = 'python'
+
+    def reduce(self, glyph, values):
+        """Reduce a vector with + × ⌈ or ⌊"""
+        if glyph == '+':
+            return sum(values)
+        if glyph == '×':
+            return functools.reduce(operator.mul, values, 1.0)
+        return max(values) if glyph == '⌈' else min(values)
+
+    def scan(self, glyph, values):
+        """Running + × ⌈ or ⌊ of a vector"""
+        return array('d', itertools.accumulate(values, _BACKEND_OPS[glyph]))
+
+    def elementwise(self, glyph, left, right, n):
+        """left glyph right over n elements; either side may be a single float"""
+        if type(left) is float:
+            left = itertools.repeat(left, n)
+        if type(right) is float:
+            right = itertools.repeat(right, n)
+        return array('d', map(_BACKEND_OPS[glyph], left, right))
+
+    def sort(self, values):
+        """Ascending copy of a vector"""
+        return sorted(values)
+
+    def grade(self, values, descending=False):
+        """Stable permutation that sorts a vector"""
+        return sorted(range(len(values)), key=values.__getitem__, reverse=descending)
+
+    def matmul(self, left, right, m, n, p):
+        """(m×n) +.× (n×p) of two row-major buffers"""
+        left, right = left.tolist(), right.tolist()
+        rows = [left[i * n:(i + 1) * n] for i in range(m)]
+        cols = [right[j::p] for j in range(p)]
+        mul = operator.mul
+        return array('d', _inner_tiles(rows, cols, lambda row, col: sum(map(mul, row, col))))
+
+    def moments(self, values):
+        """(count, total, mean, squared deviations, min, max) of a non-empty vector"""
+        n = len(values)
+        total = sum(values)
+        mean = total / n
+        deviations = array('d', map(operator.sub, values, itertools.repeat(mean, n)))
+        return (n, total, mean, sum(map(operator.mul, deviations, deviations)),
+                min(values), max(values))
+
+    def drop_missing(self, values):
+        """Copy of a vector without its NaN cells"""
+        return array('d', (x for x in values if x == x))
+
+class NumpyBackend(PythonBackend):
+    """NumPy kernels for vectors of at least NUMPY_MIN_LENGTH elements"""
+    name = 'numpy'
+
+    def __init__(self):
+        if numpy is None:
+            raise ValueError('NumPy is not installed')
+        self.ufuncs = {'+': numpy.add, '-': numpy.subtract, '×': numpy.multiply,
+                       '÷': numpy.divide, '⌈': numpy.maximum, '⌊': numpy.minimum}
+        self.accumulate = {'+': numpy.cumsum, '×': numpy.cumprod,
+                           '⌈': numpy.maximum.accumulate, '⌊': numpy.minimum.accumulate}
+
+    @staticmethod
+    def _view(values):
+        if type(values) is not array:
+            values = array('d', values)
+        return numpy.frombuffer(values, dtype=numpy.float64)
+
+    @staticmethod
+    def _array(result):
+        return array('d', numpy.ascontiguousarray(result, dtype=numpy.float64).tobytes())
+
+    def reduce(self, glyph, values):
+        if len(values) < NUMPY_MIN_LENGTH:
+            return super().reduce(glyph, values)
+        v = self._view(values)
+        if glyph == '+':
+            return float(v.sum())
+        if glyph == '×':
+            return float(v.prod())
+        return float(v.max() if glyph == '⌈' else v.min())
+
+    def scan(self, glyph, values):
+        if len(values) < NUMPY_MIN_LENGTH:
+            return super().scan(glyph, values)
+        return self._array(self.accumulate[glyph](self._view(values)))
+
+    def elementwise(self, glyph, left, right, n):
+        if n < NUMPY_MIN_LENGTH:
+            return super().elementwise(glyph, left, right, n)
+        left = left if type(left) is float else self._view(left)
+        right = right if type(right) is float else self._view(right)
+        if glyph == '÷' and not numpy.all(right):
+            # Python semantics: let the caller's fallback handle x÷0
+            raise ZeroDivisionError('float division by zero')
+        return self._array(self.ufuncs[glyph](left, right))
+
+    def sort(self, values):
+        if len(values) < NUMPY_MIN_LENGTH:
+            return super().sort(values)
+        return numpy.sort(self._view(values)).tolist()
+
+    def grade(self, values, descending=False):
+        if len(values) < NUMPY_MIN_LENGTH:
+            return super().grade(values, descending)
+        v = self._view(values)
+        return numpy.argsort(-v if descending else v, kind='stable').tolist()
+
+    def matmul(self, left, right, m, n, p):
+        if m * n * p < NUMPY_INNER_MIN:
+            return super().matmul(left, right, m, n, p)
+        a = self._view(left).reshape(m, n)
+        b = self._view(right).reshape(n, p)
+        return self._array(numpy.dot(a, b))
+
+    def moments(self, values):
+        if len(values) < NUMPY_MIN_LENGTH:
+            return super().moments(values)
+        v = self._view(values)
+        total = float(v.sum())
+        mean = total / len(v)
+        deviations = v - mean
+        return (len(v), total, mean, float(numpy.dot(deviations, deviations)),
+                float(v.min()), float(v.max()))
+
+    def drop_missing(self, values):
+        if len(values) < NUMPY_MIN_LENGTH:
+            return super().drop_missing(values)
+        v = self._view(values)
+        return self._array(v[~numpy.isnan(v)])
+
+BACKENDS = {'python': PythonBackend, 'numpy': NumpyBackend}
+
+_BACKEND_LOCAL = threading.local()
+
+def make_backend(name='auto'):
+    """A new backend instance: auto (NumPy when installed), python or numpy"""
+    name = (name or 'auto').strip().lower()
+    if name == 'auto':
+        name = 'numpy' if numpy is not None else 'python'
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}' (choose auto, python or numpy)")
+    return BACKENDS[name]()
+
+def set_backend(name='auto'):
+    """Select the session's array backend: auto (NumPy when installed), python or numpy"""
+    global BACKEND
+    BACKEND = make_backend(name)
+    return BACKEND
+
+def active_backend():
+    """The backend for this thread: the one given to using_backend, else BACKEND"""
+    return getattr(_BACKEND_LOCAL, 'backend', None) or BACKEND
+
+@contextlib.contextmanager
+def using_backend(backend):
+    """Run the kernels of this thread, and only this thread, on backend"""
+    previous = getattr(_BACKEND_LOCAL, 'backend', None)
+    _BACKEND_LOCAL.backend = backend
+    try:
+        yield backend
+    finally:
+        _BACKEND_LOCAL.backend = previous
+
+try:
+    BACKEND = set_backend(os.getenv('NEW_APL_BACKEND', 'auto'))
+except ValueError:
+    BACKEND = set_backend('python')
+
+def backend_command(argument=''):
+    """Show or switch the array backend"""
+    try:
+        if argument.strip():
+            set_backend(argument)
+            return f"🧮 Backend: {BACKEND.name}"
+        available = ', '.join(name for name in BACKENDS
+                              if name != 'numpy' or numpy is not None)
+        return f"🧮 Backend: {BACKEND.name} (available: {available})"
+    except ValueError as e:
+        return f"❌ {str(e)}"
+
+# ---------------------------------------------------------------------------
+# Columnar datasets
+#
+# CSV files are parsed straight into one typed buffer per column: numbers go
+# into array('d') (8 bytes per cell), text into a single packed str plus an
+# offsets array. Column types are inferred from the data as it is read. Once
+# a file is parsed, text columns with few distinct values are dictionary
+# encoded: each distinct value is stored once and every row keeps a 1- or
+# 2-byte code, so filters and group-by compare small integers.
+# ---------------------------------------------------------------------------
+
+DATASET_CHUNK_ROWS = 65536
+CATEGORY_MAX_DISTINCT = min(int(os.getenv('NEW_APL_CATEGORY_MAX', '4096')), 1 << 16)
+
+class NumericColumn:
+    """Numeric CSV column stored as array('d'); empty cells are NaN"""
+    kind = 'number'
+
+    def __init__(self, name, values=None):
+        self.name = name
+        self.values = array('d') if values is None else values
+        self.missing = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    @property
+    def nbytes(self):
+        return len(self.values) * self.values.itemsize
+
+    def present(self):
+        """Values with missing cells removed"""
+        if not self.missing:
+            return self.values
+        return active_backend().drop_missing(self.values)
+
+    def take(self, indices):
+        """New column holding the given rows"""
+        column = NumericColumn(self.name, array('d', map(self.values.__getitem__, indices)))
+        if self.missing:
+            column.missing = sum(1 for x in column.values if x != x)
+        return column
+
+class TextColumn:
+    """Text CSV column packed into one str buffer plus end offsets"""
+    kind = 'text'
+
+    def __init__(self, name, offsets=None, buffer=''):
+        self.name = name
+        self.offsets = array('q', [0]) if offsets is None else offsets
+        self._chunks = []
+        self._buffer = buffer
+        # Columns built by the parser also track a category dictionary
+        # until it outgrows CATEGORY_MAX_DISTINCT
+        self._index = {} if offsets is None else None
+        self._codes = array('H')
+
+    def extend(self, cells):
+        end = self.offsets[-1]
+        self.offsets.extend(end + total for total in itertools.accumulate(map(len, cells)))
+        self._chunks.append(''.join(cells))
+        index = self._index
+        if index is not None:
+            for value in dict.fromkeys(cells):
+                if value not in index:
+                    index[value] = len(index)
+            if len(index) > CATEGORY_MAX_DISTINCT:
+                self._index, self._codes = None, array('H')
+            else:
+                self._codes.extend(map(index.__getitem__, cells))
+
+    def pack(self):
+        """Join pending chunks into the single text buffer"""
+        if self._chunks:
+            self._buffer = ''.join([self._buffer] + self._chunks)
+            self._chunks = []
+
+    @property
+    def buffer(self):
+        self.pack()
+        return self._buffer
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return self.buffer[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        offsets = self.offsets
+        return map(self.buffer.__getitem__, map(slice, offsets, itertools.islice(offsets, 1, None)))
+
+    def take(self, indices):
+        """New column holding the given rows"""
+        column = TextColumn(self.name)
+        column._index = None
+        column.extend(list(map(self.__getitem__, indices)))
+        column.pack()
+        return column
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self.buffer) + len(self.offsets) * self.offsets.itemsize
+
+class CategoryColumn:
+    """Dictionary-encoded text column: distinct values plus one code per row"""
+    kind = 'category'
+
+    def __init__(self, name, codes, categories):
+        self.name = name
+        self.codes = codes
+        self.categories = categories
+        self._lookup = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.categories[self.codes[index]]
+
+    def __iter__(self):
+        return map(self.categories.__getitem__, self.codes)
+
+    @property
+    def nbytes(self):
+        return (len(self.codes) * self.codes.itemsize +
+                sum(sys.getsizeof(value) for value in self.categories))
+
+    def code(self, value):
+        """Code of a value, or None when no row holds it"""
+        if self._lookup is None:
+            self._lookup = {value: code for code, value in enumerate(self.categories)}
+        return self._lookup.get(value)
+
+    def rows_equal(self, value):
+        """Indices of the rows equal to value, found by comparing codes"""
+        code = self.code(value)
+        if code is None:
+            return []
+        return list(itertools.compress(range(len(self.codes)), map(code.__eq__, self.codes)))
+
+    def counts(self):
+        """Row count per category, in category order"""
+        counts = Counter(self.codes)
+        return [counts[code] for code in range(len(self.categories))]
+
+    def take(self, indices):
+        """New column holding the given rows; unused categories are dropped"""
+        typecode = getattr(self.codes, 'typecode', None) or self.codes.format
+        codes = array(typecode, map(self.codes.__getitem__, indices))
+        used = sorted(set(codes))
+        if len(used) == len(self.categories):
+            return CategoryColumn(self.name, codes, self.categories)
+        remap = dict(zip(used, range(len(used))))
+        return CategoryColumn(self.name, array(typecode, map(remap.__getitem__, codes)),
+                              [self.categories[code] for code in used])
+
+class Dataset:
+    """Columnar contents of one CSV file, shared by the data commands"""
+
+    def __init__(self, path, columns, row_count, load_time=0.0, source='csv'):
+        self.path = path
+        self.columns = columns
+        self.row_count = row_count
+        self.load_time = load_time
+        self.source = source
+        self.mapping = None
+        self.workers = 1
+        self.partitions = 1
+        # (start, end, rows) of each parsed byte range of a plain CSV
+        self.blocks = None
+        self.skipped_blocks = None
+
+    @property
+    def column_names(self):
+        return list(self.columns)
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def numeric_columns(self):
+        return [c for c in self.columns.values() if c.kind == 'number']
+
+    def take(self, indices):
+        """New dataset holding only the given rows"""
+        columns = {name: column.take(indices) for name, column in self.columns.items()}
+        return Dataset(self.path, columns, len(indices), self.load_time, self.source)
+
+def resolve_data_file(filename):
+    """Find a data file, directory or glob as given or inside examples/; None if missing"""
+    for filepath in (Path(filename), Path('examples') / filename):
+        if filepath.exists() or (glob.has_magic(filename) and partition_files(filepath)):
+            return filepath
+    return None
+
+def is_partition_set(filepath):
+    """True for a directory or glob pattern standing for several CSV partitions"""
+    return glob.has_magic(str(filepath)) or Path(filepath).is_dir()
+
+def partition_files(filepath):
+    """CSV files of a directory or glob pattern, sorted by name"""
+    filepath = Path(filepath)
+    if filepath.is_dir():
+        matches = (path for path in filepath.iterdir()
+                   if partition_name(path) != path.name)
+    else:
+        matches = map(Path, glob.glob(str(filepath)))
+    return sorted(path for path in matches
+                  if path.is_file() and not path.name.endswith(SIDECAR_SUFFIX))
+
+def partition_name(path):
+    """File name without its .csv (and compression) suffix"""
+    name = path.name
+    for suffix in _COMPRESSED_SUFFIXES:
+        if name.lower().endswith('.csv' + suffix):
+            name = name[:-len(suffix)]
+    return name[:-4] if name.lower().endswith('.csv') else name
+
+def data_size(filepath):
+    """Bytes on disk of a file or of every partition in a set"""
+    files = partition_files(filepath) if is_partition_set(filepath) else [Path(filepath)]
+    return sum(path.stat().st_size for path in files)
+
+def _unique_names(header):
+    names, seen = [], set()
+    for index, name in enumerate(header):
+        name = name.strip() or f"column_{index + 1}"
+        candidate, suffix = name, 2
+        while candidate in seen:
+            candidate = f"{name}_{suffix}"
+            suffix += 1
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+def _read_chunks(reader, width, chunk_rows=DATASET_CHUNK_ROWS, predicate=None):
+    """Yield lists of rows padded or trimmed to the header width.
+
+    Rows failing predicate (a compiled where clause) are dropped here, before
+    any conversion or storage.
+    """
+    chunk, scanned = [], 0
+    for row in reader:
+        if not row:
+            continue
+        scanned += 1
+        if len(row) != width:
+            row = (row + [''] * width)[:width]
+        if predicate is not None and not predicate(row):
+            if scanned >= chunk_rows:
+                job_checkpoint(scanned)
+                scanned = 0
+            continue
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            job_checkpoint(scanned)
+            yield chunk
+            chunk, scanned = [], 0
+    job_checkpoint(scanned)
+    if chunk:
+        yield chunk
+
+def _parse_numbers(cells):
+    """Parse a column chunk; returns (array('d'), missing) or None for text"""
+    try:
+        return array('d', map(float, cells)), 0
+    except ValueError:
+        pass
+    values = array('d')
+    missing = 0
+    for cell in cells:
+        try:
+            values.append(float(cell))
+        except ValueError:
+            if cell.strip():
+                return None
+            values.append(math.nan)
+            missing += 1
+    return values, missing
+
+def _extend_numeric(column, cells):
+    """Append cells to a numeric column; False if a cell is not a number"""
+    parsed = _parse_numbers(cells)
+    if parsed is None:
+        return False
+    column.values.extend(parsed[0])
+    column.missing += parsed[1]
+    return True
+
+def _format_csv_number(x):
+    if x != x:
+        return ''
+    return str(int(x)) if x.is_integer() else repr(x)
+
+def _numeric_to_text(column):
+    """Demote a numeric column once a non-numeric cell shows up"""
+    text = TextColumn(column.name)
+    text.extend([_format_csv_number(x) for x in column.values])
+    return text
+
+def _append_chunk(columns, chunk):
+    for index, cells in enumerate(zip(*chunk)):
+        column = columns[index]
+        if column.kind == 'number' and not _extend_numeric(column, cells):
+            column = columns[index] = _numeric_to_text(column)
+            column.extend(cells)
+        elif column.kind == 'text':
+            column.extend(cells)
+
+# A where clause ("region = North and revenue > 150000") is compiled once
+# into two forms: a predicate over raw CSV cells that _read_chunks applies
+# before numeric conversion, and a column mask for datasets that are already
+# loaded, where category columns are tested once per distinct value and then
+# looked up by code. Both decide a condition with the same rule (_where_test),
+# so pushdown and post-filtering keep the same rows. "and" binds tighter
+# than "or".
+
+_WHERE_TERM = re.compile(
+    r'\s*(?:"([^"]+)"|([^\s=!<>"\']+))\s*(==|=|!=|<>|<=|>=|<|>)\s*'
+    r'(?:"([^"]*)"|\'([^\']*)\'|([^\s"\']+))\s*', re.IGNORECASE)
+_WHERE_CONDITION = re.compile(_WHERE_TERM.pattern + r'(?:(and|or)\b|$)', re.IGNORECASE)
+_WHERE_WORD = re.compile(r'(\w+)\b\s*')
+_WHERE_OPERATORS = {'=': '==', '==': '==', '!=': '!=', '<>': '!=',
+                    '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+# value.method(cell) for "cell op value"
+_WHERE_SWAPPED = {'==': '__eq__', '!=': '__ne__', '<': '__gt__',
+                  '<=': '__ge__', '>': '__lt__', '>=': '__le__'}
+# Command options that end a where clause when they follow a complete condition
+_WHERE_END_WORDS = {'stream', 'exact', 'index', 'trend', 'predict', 'visualize',
+                    'rolling', 'ema', 'linear', 'seasonal', 'sample', 'approx', 'seed',
+                    'refine', 'partition', 'by', 'parallel', 'sidecar', 'follow'}
+
+def _split_where(text):
+    """Split 'options where clause [options]' into (options, clause or None).
+
+    The clause ends at the first option keyword following a complete
+    condition, so options may come before or after it.
+    """
+    match = re.search(r'\bwhere\b', text, re.IGNORECASE)
+    if not match:
+        return text, None
+    position = match.end()
+    while True:
+        condition = _WHERE_TERM.match(text, position)
+        if not condition:
+            break
+        word = _WHERE_WORD.match(text, condition.end())
+        if word is None or word.group(1).lower() not in ('and', 'or'):
+            if word is not None and word.group(1).lower() in _WHERE_END_WORDS:
+                rest = ' '.join((text[:match.start()] + ' ' + text[condition.end():]).split())
+                return rest, text[match.end():condition.end()].strip()
+            break
+        position = word.end()
+    return text[:match.start()].strip(), text[match.end():].strip()
+
+def _cell_number(cell):
+    try:
+        return float(cell)
+    except ValueError:
+        return math.nan
+
+def _cell_text(cell):
+    """A raw cell as a loaded column reads it back: "1001.0" is "1001" """
+    try:
+        return _format_csv_number(float(cell))
+    except ValueError:
+        return cell
+
+def _where_test(op, value):
+    """(convert, test) deciding one condition as test(convert(raw cell)).
+
+    Numbers compare numerically; text compares with the cell as a loaded
+    column reads it back. convert is None when the raw cell compares the
+    same: equality with text that is not a number.
+    """
+    test = getattr(value, _WHERE_SWAPPED[op])
+    if isinstance(value, float):
+        return _cell_number, test
+    if op in ('==', '!='):
+        try:
+            float(value)
+        except ValueError:
+            return None, test
+    return _cell_text, test
+
+def _row_condition(index, op, value):
+    convert, test = _where_test(op, value)
+    if convert is None:
+        return lambda row: test(row[index])
+    return lambda row: test(convert(row[index]))
+
+def _both_rows(first, second):
+    return lambda row: first(row) and second(row)
+
+def _either_rows(first, second):
+    return lambda row: first(row) or second(row)
+
+class RowFilter:
+    """Compiled where clause: OR of AND-groups of `column op value` conditions"""
+
+    def __init__(self, clause, names):
+        self.clause = clause
+        self.groups = [[]]
+        position, joiner = 0, None
+        while position < len(clause):
+            match = _WHERE_CONDITION.match(clause, position)
+            if not match:
+                term = _WHERE_TERM.match(clause, position)
+                if term:
+                    raise ValueError(f"Cannot parse where clause near: {clause[term.end():]} "
+                                     f"(expected and/or or a command option)")
+                raise ValueError(f"Cannot parse where clause near: {clause[position:]}")
+            quoted, bare_name, op, double, single, bare, joiner = match.groups()
+            name = _match_column(names, quoted or bare_name)
+            if name is None:
+                raise ValueError(f"Column not found: {quoted or bare_name} (available: {', '.join(names)})")
+            if bare is None:
+                value = double if double is not None else single
+            else:
+                try:
+                    value = float(bare)
+                except ValueError:
+                    value = bare
+            self.groups[-1].append((name, names.index(name), _WHERE_OPERATORS[op], value))
+            if joiner and joiner.lower() == 'or':
+                self.groups.append([])
+            position = match.end()
+        if joiner or not self.groups[0]:
+            raise ValueError(f"Incomplete where clause: {clause}")
+        self.test = self.bind(names)[1]
+
+    def bind(self, header, constants=None):
+        """(possible, predicate) for the rows of a file with its own header.
+
+        Clause columns missing from the header hold constants[name] on every
+        row, or a blank cell (null) when constants lacks them, so conditions
+        on them are decided here once. possible is False when no row of the
+        file can match; predicate is None when every row does.
+        """
+        constants = constants or {}
+        groups = []
+        for group in self.groups:
+            tests = []
+            for name, _, op, value in group:
+                if name in constants or name not in header:
+                    if not self._constant_test(op, value, constants.get(name, '')):
+                        break
+                else:
+                    tests.append(_row_condition(header.index(name), op, value))
+            else:
+                if not tests:
+                    return True, None
+                groups.append(functools.reduce(_both_rows, tests))
+        if not groups:
+            return False, None
+        return True, functools.reduce(_either_rows, groups)
+
+    @staticmethod
+    def _constant_test(op, value, cell):
+        convert, test = _where_test(op, value)
+        return test(convert(cell) if convert else cell)
+
+    def select(self, dataset, constants=None):
+        """Indices of the dataset rows that satisfy the clause; constants as for bind"""
+        constants = constants or {}
+        mask = None
+        for group in self.groups:
+            group_mask = None
+            for name, _, op, value in group:
+                if name in constants or name not in dataset.columns:
+                    condition = [self._constant_test(op, value, constants.get(name, ''))] * dataset.row_count
+                else:
+                    condition = self._column_mask(dataset.columns[name], op, value)
+                group_mask = condition if group_mask is None else list(map(operator.and_, group_mask, condition))
+            mask = group_mask if mask is None else list(map(operator.or_, mask, group_mask))
+        return list(itertools.compress(range(dataset.row_count), mask))
+
+    @staticmethod
+    def _column_mask(column, op, value):
+        convert, test = _where_test(op, value)
+        if column.kind == 'category':
+            table = [test(convert(c) if convert else c) for c in column.categories]
+            return list(map(table.__getitem__, column.codes))
+        if column.kind == 'number':
+            # Loaded numbers are already what the converters would produce
+            cells = column.values if convert is _cell_number else map(_format_csv_number, column.values)
+        else:
+            cells = map(convert, column) if convert else column
+        return list(map(test, cells))
+
+@functools.lru_cache(maxsize=64)
+def compile_where(clause, names):
+    """RowFilter for a clause over a header (names as a tuple), compiled once"""
+    return RowFilter(clause, list(names))
+
+# CSV files are parsed in byte ranges that always start on a record
+# boundary. A newline only ends a record when the number of quote characters
+# since the range start is even (RFC 4180 escapes quotes by doubling them), so
+# quoted fields containing newlines are never split. The serial path parses
+# the same ranges one after another, which keeps its output identical to the
+# process-pool path. The ranges double as the blocks of the zone-map index.
+
+CSV_RANGE_BYTES = 4 << 20
+CSV_WORKERS = int(os.getenv('NEW_APL_WORKERS', '1'))
+_SCAN_BLOCK = 1 << 16
+
+# Compressed CSVs (.gz, .bz2, .xz, recognised by their magic bytes) cannot be
+# split into byte ranges, so each one is parsed as a single stream. A
+# background thread decompresses blocks ahead of the parser; zlib, bz2 and
+# lzma release the GIL while they work, so decompression overlaps parsing
+# and nothing is unpacked to disk.
+
+DECOMPRESS_BLOCK = 1 << 20
+DECOMPRESS_PREFETCH = 4
+_COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'))
+_COMPRESSED_SUFFIXES = ('.gz', '.bz2', '.xz')
+
+def compression_of(filepath):
+    """'gzip', 'bz2' or 'xz' for a compressed file, None for plain text"""
+    with open(filepath, 'rb') as f:
+        head = f.read(6)
+    return next((name for magic, name in _COMPRESSION_MAGIC if head.startswith(magic)), None)
+
+def _decompressor(name):
+    openers = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open if lzma else None}
+    if openers[name] is None:
+        raise OSError(f"{name} support is not available in this Python build")
+    return openers[name]
+
+class _PrefetchReader(io.RawIOBase):
+    """Raw stream of a compressed file, decompressed ahead by a background thread"""
+
+    def __init__(self, opener, filepath, depth=DECOMPRESS_PREFETCH):
+        self._blocks = queue.Queue(depth)
+        self._pending = memoryview(b'')
+        self._eof = False
+        self._stop = threading.Event()
+        threading.Thread(target=self._pump, args=(opener, filepath), daemon=True).start()
+
+    def _pump(self, opener, filepath):
+        try:
+            with opener(filepath, 'rb') as f:
+                while not self._stop.is_set():
+                    block = f.read(DECOMPRESS_BLOCK)
+                    self._put(block)
+                    if not block:
+                        return
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._blocks.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._pending = memoryview(item)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self):
+        self._stop.set()
+        super().close()
+
+def open_csv_text(filepath):
+    """Open a plain or compressed CSV as text for csv.reader"""
+    compression = compression_of(filepath)
+    if compression is None:
+        return open(filepath, 'r', newline='', encoding='utf-8-sig')
+    raw = _PrefetchReader(_decompressor(compression), filepath)
+    return io.TextIOWrapper(io.BufferedReader(raw, DECOMPRESS_BLOCK), encoding='utf-8-sig', newline='')
+
+def _record_end(f, pos, quotes, size):
+    """Offset just past the first record-ending newline at or after pos"""
+    f.seek(pos)
+    while pos < size:
+        block = f.read(_SCAN_BLOCK)
+        index = 0
+        while True:
+            newline = block.find(b'\n', index)
+            if newline < 0:
+                quotes += block.count(b'"', index)
+                break
+            quotes += block.count(b'"', index, newline)
+            if quotes % 2 == 0:
+                return pos + newline + 1
+            index = newline + 1
+        pos += len(block)
+    return size
+
+def _csv_header(filepath):
+    """Return (column names, byte offset of the first data record, file size).
+
+    Compressed files have no usable byte offsets, so theirs is None.
+    """
+    size = Path(filepath).stat().st_size
+    if compression_of(filepath):
+        with open_csv_text(filepath) as f:
+            return _unique_names(next(csv.reader(f), [])), None, size
+    with open(filepath, 'rb') as f:
+        data_start = _record_end(f, 0, 0, size)
+        f.seek(0)
+        header = f.read(data_start).decode('utf-8-sig')
+    return _unique_names(next(csv.reader(io.StringIO(header, newline='')), [])), data_start, size
+
+def _csv_ranges(filepath, start, size, range_bytes=CSV_RANGE_BYTES):
+    """Split [start, size) into record-aligned ranges of about range_bytes"""
+    ranges = []
+    with open(filepath, 'rb') as f:
+        while start < size:
+            target = start + range_bytes
+            if target >= size:
+                ranges.append((start, size))
+                break
+            f.seek(start)
+            end = _record_end(f, target, f.read(target - start).count(b'"'), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def _parse_csv_text(text, names, text_columns, where=None):
+    """Parse records into columns; columns in text_columns stay text"""
+    return _parse_csv_rows(lambda: csv.reader(io.StringIO(text, newline='')),
+                           names, text_columns, where)
+
+def _bound_where(where, names):
+    """Row predicate for a file from a task's (clause, clause names, constants) or None"""
+    if not where:
+        return None
+    clause, clause_names, constants = where
+    return compile_where(clause, clause_names).bind(names, dict(constants))[1]
+
+def _parse_csv_rows(open_rows, names, text_columns, where=None):
+    """Parse the records from open_rows() into columns; columns in text_columns stay text"""
+    columns = [TextColumn(name) if index in text_columns else NumericColumn(name)
+               for index, name in enumerate(names)]
+    row_count = 0
+    demoted = set()
+    predicate = _bound_where(where, names)
+    chunks = _read_chunks(open_rows(), len(names), predicate=predicate)
+    while True:
+        with PROFILER.span('csv tokenize') as span:
+            chunk = next(chunks, None)
+            span.rows = len(chunk) if chunk else 0
+        if chunk is None:
+            break
+        with PROFILER.span('float conversion / typing') as span:
+            kinds = [column.kind for column in columns]
+            _append_chunk(columns, chunk)
+            span.rows = len(chunk)
+        if row_count:
+            demoted.update(i for i, column in enumerate(columns) if column.kind != kinds[i])
+        row_count += len(chunk)
+    if demoted:
+        # Demotion re-formats earlier numbers; re-parse to keep the raw cells
+        return _parse_csv_rows(open_rows, names, text_columns | demoted, where)
+    for column in columns:
+        if column.kind == 'text':
+            column.pack()
+    return columns, row_count
+
+def _compressed_rows(filepath):
+    with open_csv_text(filepath) as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        yield from reader
+
+def _parse_csv_range(task):
+    """Process-pool worker: parse one byte range of a CSV file (all of it when compressed)"""
+    filepath, start, end, names, text_columns, where = task
+    if start is None:
+        with PROFILER.span('decompress + parse stream') as span:
+            parsed = _parse_csv_rows(lambda: _compressed_rows(filepath), names, text_columns, where)
+            span.rows, span.nbytes = parsed[1], Path(filepath).stat().st_size
+        return parsed
+    with PROFILER.span('read + decode') as span:
+        with open(filepath, 'rb') as f:
+            f.seek(start)
+            text = f.read(end - start).decode('utf-8')
+        span.nbytes = end - start
+    return _parse_csv_text(text, names, text_columns, where)
+
+def _profiled_csv_range(task, origin, trace_memory):
+    """Process-pool worker: _parse_csv_range plus the spans it recorded, for PROFILER.adopt"""
+    # a forked worker inherits the parent's span stack; start from an empty one
+    PROFILER.spans.clear()
+    PROFILER._local = threading.local()
+    PROFILER._origin = origin
+    PROFILER.enable(trace_memory)
+    return _parse_csv_range(task), list(PROFILER.spans)
+
+def _merge_categories(name, parts):
+    """Combine per-range category dictionaries; None unless the column is low-cardinality"""
+    if any(part._index is None for part in parts):
+        return None
+    index = {}
+    for part in parts:
+        for value in part._index:
+            if value not in index:
+                index[value] = len(index)
+    if len(index) > min(CATEGORY_MAX_DISTINCT, sum(map(len, parts)) // 2):
+        return None
+    codes = array('B' if len(index) <= 256 else 'H')
+    for part in parts:
+        remap = [index[value] for value in part._index]
+        codes.extend(map(remap.__getitem__, part._codes))
+    return CategoryColumn(name, codes, list(index))
+
+def _concat_columns(name, parts):
+    """Join per-range columns of one CSV column in file order"""
+    if all(part.kind == 'number' for part in parts):
+        column = NumericColumn(name)
+        for part in parts:
+            column.values.extend(part.values)
+            column.missing += part.missing
+        return column
+    categories = _merge_categories(name, parts)
+    if categories is not None:
+        return categories
+    column = TextColumn(name)
+    for part in parts:
+        end = column.offsets[-1]
+        column.offsets.extend(end + offset for offset in part.offsets[1:])
+        column._chunks.append(part.buffer)
+    column.pack()
+    return column
+
+def parse_csv_datasets(filepaths, workers=None, where=None, ranges=None, schema=None, constants=None):
+    """Parse CSV files into typed columns, optionally in one shared process pool.
+
+    The byte ranges of every file are parsed together, so several small files
+    keep the pool as busy as one large file. With a where clause only
+    matching rows are converted and stored. ranges, one list per file,
+    restricts parsing to those (start, end) byte ranges. For partition sets
+    the clause is compiled against schema (the union header) and constants,
+    one dict per file, gives columns a file lacks; files whose constants rule
+    out every row are not read at all.
+    """
+    start_time = time.time()
+    headers, tasks, owners = [], [], []
+    with PROFILER.span('split byte ranges') as span:
+        for number, filepath in enumerate(filepaths):
+            names, data_start, size = _csv_header(filepath)
+            headers.append(names)
+            task_where = None
+            if where:
+                clause_names = tuple(schema or names)
+                file_constants = constants[number] if constants else {}
+                # reports clause errors before starting workers
+                possible, _ = compile_where(where, clause_names).bind(names, file_constants)
+                if not possible:
+                    continue
+                task_where = (where, clause_names, tuple(file_constants.items()))
+            if ranges is not None:
+                file_ranges = ranges[number]
+            elif data_start is None:
+                file_ranges = [(None, None)]
+            else:
+                file_ranges = _csv_ranges(filepath, data_start, size)
+            for start, end in file_ranges:
+                tasks.append((str(filepath), start, end, names, frozenset(), task_where))
+                owners.append(number)
+            span.nbytes += size
+    workers = min(workers or CSV_WORKERS, len(tasks))
+    pool = ProcessPoolExecutor(workers) if workers > 1 else None
+    mapper = pool.map if pool else map
+    # workers profile into their own copy of PROFILER; their spans come back with the results
+    profiled = bool(pool) and PROFILER.enabled
+    worker = (functools.partial(_profiled_csv_range, origin=PROFILER._origin,
+                                trace_memory=PROFILER.trace_memory) if profiled else _parse_csv_range)
+    futures = []
+    try:
+        with PROFILER.span(f'parse ranges ({max(workers, 1)} processes)' if pool else 'parse ranges') as span:
+            if pool:
+                futures = [pool.submit(worker, task) for task in tasks]
+            results = (future.result() for future in futures) if pool else map(_parse_csv_range, tasks)
+            pieces = []
+            for (_, start, end, *_), piece in zip(tasks, results):
+                if profiled:
+                    piece, spans = piece
+                    PROFILER.adopt(spans)
+                # ranges parsed in this process already counted their rows chunk by chunk
+                job_checkpoint(piece[1] if pool else 0, end - start if start is not None else 0)
+                pieces.append(piece)
+            span.nbytes = sum(end - start for _, start, end, *_ in tasks if start is not None)
+        text_columns = [set() for _ in filepaths]
+        for owner, (columns, _) in zip(owners, pieces):
+            text_columns[owner].update(i for i, column in enumerate(columns) if column.kind == 'text')
+        redo = [k for k, (columns, _) in enumerate(pieces)
+                if any(columns[i].kind == 'number' for i in text_columns[owners[k]])]
+        retasks = [tasks[k][:4] + (frozenset(text_columns[owners[k]]), tasks[k][5]) for k in redo]
+        with PROFILER.span('re-parse mixed columns as text'):
+            for k, piece in zip(redo, mapper(worker, retasks)):
+                if profiled:
+                    piece, spans = piece
+                    PROFILER.adopt(spans)
+                pieces[k] = piece
+    finally:
+        for future in futures:
+            future.cancel()
+        if pool:
+            pool.shutdown()
+    datasets = []
+    with PROFILER.span('concatenate columns') as span:
+        for number, (filepath, names) in enumerate(zip(filepaths, headers)):
+            parts = [piece for owner, piece in zip(owners, pieces) if owner == number]
+            columns = [_concat_columns(name, [part[0][i] for part in parts])
+                       for i, name in enumerate(names)]
+            dataset = Dataset(Path(filepath), {c.name: c for c in columns},
+                              sum(part[1] for part in parts), time.time() - start_time)
+            dataset.workers = max(workers, 1)
+            if not where and ranges is None and parts:
+                dataset.blocks = [(start, end, part[1]) for (_, start, end, *_), owner, part
+                                  in zip(tasks, owners, pieces) if owner == number]
+                if dataset.blocks[0][0] is None:
+                    dataset.blocks = None
+            datasets.append(dataset)
+        span.rows = sum(dataset.row_count for dataset in datasets)
+    return datasets
+
+def parse_csv_dataset(filepath, workers=None, where=None, ranges=None):
+    """Parse one CSV file (or some of its byte ranges) into typed columns, optionally in a process pool"""
+    return parse_csv_datasets([filepath], workers, where, None if ranges is None else [ranges])[0]
+
+# Binary sidecars
+#
+# Layout of "<file>.napl": 8-byte magic, 8-byte little-endian header length,
+# a JSON header (schema, row count, source fingerprint, block offsets), then
+# 8-byte aligned column blocks. Numeric columns are raw float64 values and
+# are used straight out of the memory map; text columns store int64 char
+# offsets followed by the UTF-8 text; category columns store their codes and
+# keep the distinct values in the header.
+
+SIDECAR_SUFFIX = '.napl'
+SIDECAR_MAGIC = b'NAPLCOL1'
+SIDECAR_VERSION = 2
+SIDECAR_AUTO = os.getenv('NEW_APL_SIDECAR') == 'true'
+
+def sidecar_path(filepath):
+    return Path(str(filepath) + SIDECAR_SUFFIX)
+
+def _source_fingerprint(filepath):
+    """Size and mtime of a file"""
+    stat = Path(filepath).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def write_sidecar(dataset):
+    """Write the dataset's columns next to its CSV; returns the sidecar path"""
+    path = sidecar_path(dataset.path)
+    blocks, meta, offset = [], [], 0
+    for column in dataset.columns.values():
+        if column.kind == 'number':
+            data = column.values if isinstance(column.values, array) else array('d', column.values)
+            if sys.byteorder != 'little':
+                data = array('d', data)
+                data.byteswap()
+            entry = {'name': column.name, 'kind': 'number', 'missing': column.missing,
+                     'values': [offset, len(data) * 8]}
+            blocks.append((offset, data.tobytes()))
+            offset = _align(offset + len(data) * 8)
+        elif column.kind == 'category':
+            codes = array(column.codes.format if isinstance(column.codes, memoryview)
+                          else column.codes.typecode, column.codes)
+            if sys.byteorder != 'little':
+                codes.byteswap()
+            entry = {'name': column.name, 'kind': 'category', 'typecode': codes.typecode,
+                     'codes': [offset, len(codes) * codes.itemsize],
+                     'categories': column.categories}
+            blocks.append((offset, codes.tobytes()))
+            offset = _align(offset + len(codes) * codes.itemsize)
+        else:
+            offsets = array('q', column.offsets)
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            text = column.buffer.encode('utf-8')
+            entry = {'name': column.name, 'kind': 'text',
+                     'offsets': [offset, len(offsets) * 8]}
+            blocks.append((offset, offsets.tobytes()))
+            offset = _align(offset + len(offsets) * 8)
+            entry['text'] = [offset, len(text)]
+            blocks.append((offset, text))
+            offset = _align(offset + len(text))
+        meta.append(entry)
+    header = json.dumps({
+        'version': SIDECAR_VERSION,
+        'rows': dataset.row_count,
+        'source': _source_fingerprint(dataset.path),
+        'columns': meta,
+    }).encode('utf-8')
+    data_start = _align(16 + len(header))
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'wb') as f:
+        f.write(SIDECAR_MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for block_offset, payload in blocks:
+            f.seek(data_start + block_offset)
+            f.write(payload)
+        f.truncate(data_start + offset)
+    os.replace(temporary, path)
+    return path
+
+def _read_sidecar_header(f):
+    if f.read(8) != SIDECAR_MAGIC:
+        return None
+    header = json.loads(f.read(int.from_bytes(f.read(8), 'little')).decode('utf-8'))
+    return header if header.get('version') == SIDECAR_VERSION else None
+
+def _sidecar_is_fresh(header, filepath):
+    # Any size or mtime change is stale: hashing part of the file would miss
+    # same-length edits elsewhere, and hashing all of it costs a full read
+    source = header['source']
+    stat = Path(filepath).stat()
+    return stat.st_size == source['size'] and stat.st_mtime_ns == source['mtime_ns']
+
+def load_sidecar(filepath):
+    """Memory-map a fresh sidecar for filepath; None if missing or stale"""
+    path = sidecar_path(filepath)
+    if not path.exists():
+        return None
+    start_time = time.time()
+    try:
+        with open(path, 'rb') as f:
+            header = _read_sidecar_header(f)
+            if header is None or not _sidecar_is_fresh(header, filepath):
+                return None
+            data_start = _align(f.tell())
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, KeyError):
+        return None
+    view = memoryview(mapping)
+    native = sys.byteorder == 'little'
+    columns = {}
+    for entry in header['columns']:
+        if entry['kind'] == 'number':
+            start, size = entry['values']
+            block = view[data_start + start:data_start + start + size]
+            values = block.cast('d') if native else array('d', block.tobytes())
+            if not native:
+                values.byteswap()
+            column = NumericColumn(entry['name'], values)
+            column.missing = entry['missing']
+        elif entry['kind'] == 'category':
+            start, size = entry['codes']
+            block = view[data_start + start:data_start + start + size]
+            typecode = entry['typecode']
+            codes = block.cast(typecode) if native else array(typecode, block.tobytes())
+            if not native:
+                codes.byteswap()
+            column = CategoryColumn(entry['name'], codes, entry['categories'])
+        else:
+            start, size = entry['offsets']
+            block = view[data_start + start:data_start + start + size]
+            offsets = array('q', block.tobytes()) if not native else block.cast('q')
+            if not native:
+                offsets.byteswap()
+            start, size = entry['text']
+            text = str(view[data_start + start:data_start + start + size], 'utf-8')
+            column = TextColumn(entry['name'], offsets, text)
+        columns[column.name] = column
+    dataset = Dataset(Path(filepath), columns, header['rows'],
+                      time.time() - start_time, source='sidecar')
+    dataset.mapping = mapping
+    return dataset
+
+def load_dataset(filepath, write_sidecar_file=False, workers=None, partition=None):
+    """Load a dataset, preferring a fresh binary sidecar over the CSV"""
+    if is_partition_set(filepath):
+        return load_partitions(filepath, write_sidecar_file, workers, partition)
+    with PROFILER.span('map sidecar') as span:
+        dataset = load_sidecar(filepath)
+        span.rows = dataset.row_count if dataset else 0
+    if dataset is not None:
+        return dataset
+    dataset = parse_csv_dataset(filepath, workers)
+    # A stale sidecar means the user opted in earlier, so rebuild it
+    if write_sidecar_file or SIDECAR_AUTO or sidecar_path(filepath).exists():
+        try:
+            with PROFILER.span('write sidecar'):
+                write_sidecar(dataset)
+        except OSError:
+            pass
+    # As with sidecars, an existing (stale) zone map means the user opted in
+    if (ZONE_MAP_AUTO or zone_map_path(filepath).exists()) and dataset.blocks:
+        try:
+            with PROFILER.span('write zone map') as span:
+                write_zone_map(dataset)
+                span.rows = dataset.row_count
+        except OSError:
+            pass
+    return dataset
+
+# Zone-map index
+#
+# "load data ... index" (or NEW_APL_ZONE_MAP=true for every full parse of a
+# plain CSV) writes "<file>.zmap", a small JSON file with one entry per
+# parsed byte range (CSV_RANGE_BYTES, record
+# aligned): its offsets and row count plus, per numeric column, the count,
+# sum, squared deviations about the block mean, min and max. It carries the
+# same source fingerprint as a sidecar, so any change to the CSV's size or
+# mtime invalidates it.
+# Whole-file totals, means, ranges and standard deviations merge the blocks
+# with the Welford/Chan update in O(blocks), and a where clause only parses
+# the blocks whose min/max can satisfy it.
+
+ZONE_MAP_SUFFIX = '.zmap'
+ZONE_MAP_VERSION = 1
+ZONE_MAP_AUTO = os.getenv('NEW_APL_ZONE_MAP') == 'true'
+
+def zone_map_path(filepath):
+    return Path(str(filepath) + ZONE_MAP_SUFFIX)
+
+class ZoneMap:
+    """Per-block row counts and numeric column statistics of one CSV file"""
+
+    def __init__(self, blocks, columns, rows):
+        self.blocks = blocks
+        self.columns = columns
+        self.rows = rows
+
+    @classmethod
+    def build(cls, dataset):
+        """Block statistics for a dataset parsed from plain CSV byte ranges"""
+        columns = {}
+        for column in dataset.numeric_columns():
+            entries, row = [], 0
+            for _, _, rows in dataset.blocks:
+                values = column.values[row:row + rows]
+                if column.missing:
+                    values = active_backend().drop_missing(values)
+                if len(values):
+                    count, total, _, m2, low, high = active_backend().moments(values)
+                    entries.append([count, total, m2, low, high])
+                else:
+                    entries.append([0, 0.0, 0.0, None, None])
+                row += rows
+            columns[column.name] = entries
+        return cls([list(block) for block in dataset.blocks], columns, dataset.row_count)
+
+    def column_stats(self, name):
+        """RunningStats for a whole column, merged from its blocks"""
+        stats = RunningStats()
+        for count, total, m2, low, high in self.columns[name]:
+            if count:
+                stats.merge_moments(count, total, total / count, m2, low, high)
+        return stats
+
+    def candidate_blocks(self, row_filter):
+        """(start, end) of the blocks that may hold rows matching a RowFilter"""
+        return [(start, end) for k, (start, end, rows) in enumerate(self.blocks)
+                if any(all(self._may_match(name, op, value, k, rows) for name, _, op, value in group)
+                       for group in row_filter.groups)]
+
+    def _may_match(self, name, op, value, k, rows):
+        if name not in self.columns or not isinstance(value, float):
+            return True
+        count, _, _, low, high = self.columns[name][k]
+        if op == '!=':
+            # Missing cells compare as NaN, which is != everything
+            return count < rows or not low == high == value
+        if not count:
+            return False
+        if op == '==':
+            return low <= value <= high
+        if op == '<':
+            return low < value
+        if op == '<=':
+            return low <= value
+        if op == '>':
+            return high > value
+        return high >= value
+
+def write_zone_map(dataset):
+    """Write the dataset's block statistics next to its CSV; returns the index path"""
+    zones = ZoneMap.build(dataset)
+    path = zone_map_path(dataset.path)
+    temporary = path.with_name(path.name + '.tmp')
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': ZONE_MAP_VERSION,
+            'rows': zones.rows,
+            'source': _source_fingerprint(dataset.path),
+            'blocks': zones.blocks,
+            'columns': zones.columns,
+        }, f)
+    os.replace(temporary, path)
+    return path
+
+def load_zone_map(filepath):
+    """The fresh zone map for a CSV file; None if missing or stale"""
+    path = zone_map_path(filepath)
+    if not path.exists():
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get('version') != ZONE_MAP_VERSION or not _sidecar_is_fresh(header, filepath):
+            return None
+        return ZoneMap(header['blocks'], header['columns'], header['rows'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Partitioned datasets
+#
+# A directory or glob ("sales/2026-10-*.csv") loads as one logical dataset.
+# Partitions with a fresh sidecar are mapped; the rest are parsed together,
+# their byte ranges spread over one process pool once the set is large
+# enough to pay for it. Schemas are reconciled by column name: the union of
+# the headers in first-seen order, blanks (NaN) where a partition lacks a
+# column, and text wherever partitions disagree on a column's type.
+
+PARTITION_PARALLEL_BYTES = 8 << 20
+
+def _combine_columns(name, parts):
+    """One column from (column or None, row count) pairs, one per partition"""
+    kinds = {column.kind for column, _ in parts if column is not None}
+    if kinds <= {'number'}:
+        combined = NumericColumn(name)
+        for column, rows in parts:
+            if column is None:
+                combined.values.extend(array('d', [math.nan]) * rows)
+                combined.missing += rows
+            else:
+                combined.values.extend(column.values)
+                combined.missing += column.missing
+        return combined
+    if kinds == {'category'}:
+        index = {}
+        for column, _ in parts:
+            for value in (column.categories if column is not None else ['']):
+                index.setdefault(value, len(index))
+        if len(index) <= 1 << 16:
+            codes = array('B' if len(index) <= 256 else 'H')
+            for column, rows in parts:
+                if column is None:
+                    codes.extend(array(codes.typecode, [index['']]) * rows)
+                else:
+                    remap = [index[value] for value in column.categories]
+                    codes.extend(map(remap.__getitem__, column.codes))
+            return CategoryColumn(name, codes, list(index))
+    combined = TextColumn(name)
+    combined._index = None
+    for column, rows in parts:
+        if column is None:
+            combined.extend([''] * rows)
+        elif column.kind == 'number':
+            combined.extend([_format_csv_number(x) for x in column.values])
+        else:
+            combined.extend(list(column))
+    combined.pack()
+    return combined
+
+def combine_datasets(path, datasets, partition=None):
+    """One dataset from partitions, optionally tagging rows with their file stem"""
+    names = list(dict.fromkeys(name for dataset in datasets for name in dataset.column_names))
+    columns = {name: _combine_columns(name, [(dataset.columns.get(name), dataset.row_count)
+                                             for dataset in datasets])
+               for name in names}
+    if partition:
+        name = _unique_names(names + [partition])[-1]
+        stems = list(dict.fromkeys(partition_name(dataset.path) for dataset in datasets
+                                   if dataset.row_count)) or ['']
+        codes = array('B' if len(stems) <= 256 else 'H')
+        for dataset in datasets:
+            if dataset.row_count:
+                codes.extend(array(codes.typecode, [stems.index(partition_name(dataset.path))]) * dataset.row_count)
+        columns[name] = CategoryColumn(name, codes, stems)
+    combined = Dataset(Path(path), columns, sum(dataset.row_count for dataset in datasets),
+                       source='partitions')
+    combined.partitions = len(datasets)
+    combined.workers = max(dataset.workers for dataset in datasets) if datasets else 1
+    return combined
+
+def load_partitions(filepath, write_sidecar_files=False, workers=None, partition=None, where=None):
+    """Load every CSV of a directory or glob as one dataset"""
+    start_time = time.time()
+    files = partition_files(filepath)
+    if not files:
+        raise FileNotFoundError(f"No CSV files match {filepath}")
+    with PROFILER.span('map sidecars') as span:
+        datasets = [load_sidecar(path) for path in files]
+        span.rows = sum(dataset.row_count for dataset in datasets if dataset is not None)
+    schema = constants = None
+    if where:
+        # The clause sees the combined dataset: union header plus partition
+        # column, which is constant within each file
+        schema = tuple(partition_schema(files, partition)[1])
+        constants = [{schema[-1]: partition_name(path)} if partition else {} for path in files]
+        row_filter = compile_where(where, schema)
+        with PROFILER.span('filter loaded columns'):
+            for number, dataset in enumerate(datasets):
+                if dataset is not None:
+                    datasets[number] = dataset.take(row_filter.select(dataset, constants[number]))
+    missing = [number for number, dataset in enumerate(datasets) if dataset is None]
+    if missing:
+        paths = [files[number] for number in missing]
+        if workers is None and sum(path.stat().st_size for path in paths) >= PARTITION_PARALLEL_BYTES:
+            workers = os.cpu_count() or 1
+        parsed = parse_csv_datasets(paths, workers, where, schema=schema,
+                                    constants=constants and [constants[number] for number in missing])
+        for number, dataset in zip(missing, parsed):
+            datasets[number] = dataset
+            if not where and (write_sidecar_files or SIDECAR_AUTO or sidecar_path(dataset.path).exists()):
+                try:
+                    with PROFILER.span('write sidecar'):
+                        write_sidecar(dataset)
+                except OSError:
+                    pass
+    with PROFILER.span('combine partitions') as span:
+        dataset = combine_datasets(filepath, datasets, partition)
+        span.rows = dataset.row_count
+    dataset.load_time = time.time() - start_time
+    return dataset
+
+def _has_fresh_sidecar(filepath):
+    try:
+        with open(sidecar_path(filepath), 'rb') as f:
+            header = _read_sidecar_header(f)
+            return header is not None and _sidecar_is_fresh(header, filepath)
+    except (OSError, ValueError, KeyError):
+        return False
+
+def write_partition_sidecars(filepath, workers=None):
+    """Write sidecars for partitions that lack a fresh one; returns all sidecar paths"""
+    files = partition_files(filepath)
+    stale = [path for path in files if not _has_fresh_sidecar(path)]
+    if stale:
+        for dataset in parse_csv_datasets(stale, workers):
+            write_sidecar(dataset)
+    return [sidecar_path(path) for path in files]
+
+def _split_partition(options):
+    """Take 'partition [as name]' out of command options; returns (options, name or None)"""
+    match = re.search(r'(?<!by )\bpartition(?:\s+as\s+(\w+))?\b', options, re.IGNORECASE)
+    if not match:
+        return options, None
+    return (options[:match.start()] + options[match.end():]).strip(), match.group(1) or 'partition'
+
+def partition_schema(files, partition=None):
+    """(headers, names): each file's header and the union, plus the partition column"""
+    headers = [_csv_header(path)[0] for path in files]
+    base = list(dict.fromkeys(name for header in headers for name in header))
+    return headers, _unique_names(base + [partition]) if partition else base
+
+@contextlib.contextmanager
+def open_csv_rows(filepath, partition=None, where=None):
+    """Yield (names, rows) for a CSV file or partition set.
+
+    Partitions are read one after another with their cells placed under the
+    union header; rows are lists of strings like csv.reader produces. With a
+    where clause, partitions whose file name rules out every row are not
+    opened; the caller still filters the rows it gets.
+    """
+    files = partition_files(filepath) if is_partition_set(filepath) else [Path(filepath)]
+    headers, names = partition_schema(files, partition)
+    base = names[:-1] if partition else names
+    if where and partition:
+        row_filter = compile_where(where, tuple(names))
+        kept = [row_filter.bind(header, {names[-1]: partition_name(path)})[0]
+                for path, header in zip(files, headers)]
+        files, headers = (list(itertools.compress(items, kept)) for items in (files, headers))
+    handles = []
+
+    def rows():
+        for path, header in zip(files, headers):
+            handle = open_csv_text(path)
+            handles.append(handle)
+            reader = csv.reader(handle)
+            next(reader, None)
+            tag = [partition_name(path)] if partition else []
+            if header == base and not tag:
+                yield from reader
+            else:
+                width = len(header)
+                positions = [header.index(name) if name in header else width for name in base]
+                for row in reader:
+                    if row:
+                        row = (row + [''] * width)[:width] + ['']
+                        yield [row[i] for i in positions] + tag
+            handle.close()
+
+    try:
+        yield names, rows()
+    finally:
+        for handle in handles:
+            handle.close()
+
+# External sort
+#
+# Sorting in Python needs several times a column's size in objects (a list
+# slot plus a float object per value, more for a grade). Vectors whose sort
+# would exceed SORT_BUDGET_BYTES are cut into runs that fit, each run is
+# sorted in memory and spilled to a temporary file of raw doubles, and the
+# runs are merged with a k-way heap merge that reads SORT_MERGE_BLOCK values
+# of each run at a time. Exact quantiles skip the merge: the spilled runs are
+# memory-mapped and each order statistic is found by selection across them,
+# bisecting every run around a pivot, so neither path holds more than one
+# run in memory whatever the column size.
+
+SORT_BUDGET_BYTES = int(float(os.getenv('NEW_APL_SORT_MB', '256')) * 1024 * 1024)
+SORT_ITEM_BYTES = 32
+SORT_MERGE_BLOCK = 1 << 16
+SPILL_DIR = os.getenv('NEW_APL_SPILL_DIR') or None
+
+def sort_fits(count, per_item=SORT_ITEM_BYTES):
+    """Whether sorting count values in memory stays within the sort budget"""
+    return count * per_item <= SORT_BUDGET_BYTES
+
+def _read_run(f, typecode, length):
+    """Yield the values of one spilled run, SORT_MERGE_BLOCK at a time"""
+    f.seek(0)
+    while length:
+        block = array(typecode)
+        block.fromfile(f, min(SORT_MERGE_BLOCK, length))
+        length -= len(block)
+        yield from block
+
+class SortedRuns:
+    """A vector as sorted runs, spilled to temporary files beyond the sort budget.
+
+    Values arrive chunk by chunk through update(). With positions, runs keep
+    each value's index in the input so merged() yields a stable grade;
+    descending runs sort the negated values.
+    """
+
+    def __init__(self, budget_bytes=None, positions=False, descending=False):
+        per_item = SORT_ITEM_BYTES * (2 if positions else 1)
+        self.run_items = max(1024, (budget_bytes or SORT_BUDGET_BYTES) // per_item)
+        self.positions = positions
+        self.descending = descending
+        self.buffer = array('d')
+        self.spilled = []
+        self.count = 0
+        self._views = []
+
+    def update(self, values):
+        """Add a chunk of values, spilling every full run"""
+        start = 0
+        while start < len(values):
+            take = min(self.run_items - len(self.buffer), len(values) - start)
+            self.buffer.extend(values[start:start + take])
+            self.count += take
+            start += take
+            if len(self.buffer) >= self.run_items:
+                self._spill()
+                job_checkpoint()
+
+    def _sorted_buffer(self):
+        # the buffered values follow every spilled one in input order
+        base = self.count - len(self.buffer)
+        keys = array('d', map(operator.neg, self.buffer)) if self.descending else self.buffer
+        if not self.positions:
+            return array('d', active_backend().sort(keys)), None
+        order = active_backend().grade(keys)
+        return array('d', map(keys.__getitem__, order)), array('q', (base + i for i in order))
+
+    def _spill(self):
+        with PROFILER.span('sort + spill run') as span:
+            values, positions = self._sorted_buffer()
+            files = []
+            for data in (values, positions):
+                if data is None:
+                    continue
+                f = tempfile.TemporaryFile(dir=SPILL_DIR)
+                data.tofile(f)
+                f.flush()
+                files.append(f)
+            self.spilled.append((files, len(values)))
+            span.rows, span.nbytes = len(values), len(values) * (16 if positions else 8)
+        self.buffer = array('d')
+
+    def runs(self):
+        """Every run as a sorted sequence of values: memory-mapped files, then the buffer"""
+        sequences = []
+        for files, length in self.spilled:
+            mapped = mmap.mmap(files[0].fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped).cast('d')
+            self._views.append((view, mapped))
+            sequences.append(view)
+        if self.buffer:
+            sequences.append(self._sorted_buffer()[0])
+        return sequences
+
+    def merged(self):
+        """All values in order (with their positions if kept), by a k-way merge of the runs"""
+        typecodes = ('d', 'q') if self.positions else ('d',)
+        streams = []
+        for files, length in self.spilled:
+            readers = [_read_run(f, code, length) for f, code in zip(files, typecodes)]
+            streams.append(zip(*readers) if self.positions else readers[0])
+        if self.buffer:
+            values, positions = self._sorted_buffer()
+            streams.append(zip(values, positions) if self.positions else iter(values))
+        return heapq.merge(*streams)
+
+    def select(self, k, runs=None):
+        """The k-th smallest value (0-based) by selection across the sorted runs"""
+        runs = runs if runs is not None else self.runs()
+        low = [0] * len(runs)
+        high = [len(run) for run in runs]
+        while True:
+            widest = max(range(len(runs)), key=lambda j: high[j] - low[j])
+            pivot = runs[widest][(low[widest] + high[widest]) // 2]
+            below = [bisect.bisect_left(run, pivot, lo, hi) for run, lo, hi in zip(runs, low, high)]
+            upto = [bisect.bisect_right(run, pivot, lo, hi) for run, lo, hi in zip(runs, low, high)]
+            if sum(below) <= k < sum(upto):
+                return pivot
+            if k < sum(below):
+                high = below
+            else:
+                low = upto
+            job_checkpoint()
+
+    def quantiles(self, fractions):
+        """Exact quantiles of ascending runs, interpolated like exact_quantiles, without merging"""
+        if not self.count:
+            return [math.nan for _ in fractions]
+        with PROFILER.span('select quantiles') as span:
+            runs = self.runs()
+            results = []
+            for fraction in fractions:
+                position = fraction * (self.count - 1)
+                low = int(position)
+                lower = self.select(low, runs)
+                upper = self.select(low + 1, runs) if low + 1 < self.count else lower
+                results.append(lower + (upper - lower) * (position - low))
+            span.rows = self.count
+        return results
+
+    def error_bound(self):
+        return 0.0
+
+    def close(self):
+        for view, mapped in self._views:
+            view.release()
+            mapped.close()
+        self._views = []
+        for files, _ in self.spilled:
+            for f in files:
+                f.close()
+        self.spilled = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def external_grade(values, descending=False, budget_bytes=None):
+    """Stable grade of a vector too large to sort in memory, as a list-like of positions"""
+    with SortedRuns(budget_bytes, positions=True, descending=descending) as runs:
+        runs.update(values)
+        with PROFILER.span('k-way merge') as span:
+            order = array('q', (position for _, position in runs.merged()))
+            span.rows = len(order)
+    return order
+
+def external_sort(values, budget_bytes=None):
+    """Ascending copy of a vector too large to sort in memory"""
+    with SortedRuns(budget_bytes) as runs:
+        runs.update(values)
+        with PROFILER.span('k-way merge') as span:
+            ordered = array('d', runs.merged())
+            span.rows = len(ordered)
+    return ordered
+
+def sort_budget_command(argument=''):
+    """Show or set the memory budget for in-memory sorts"""
+    global SORT_BUDGET_BYTES
+    if argument.strip():
+        SORT_BUDGET_BYTES = int(float(argument) * 1024 * 1024)
+    return (f"🗂️ Sort budget: {SORT_BUDGET_BYTES / (1024 * 1024):,.1f} MB "
+            f"(about {SORT_BUDGET_BYTES // SORT_ITEM_BYTES:,} values sorted in memory; "
+            f"larger columns spill sorted runs to {SPILL_DIR or tempfile.gettempdir()})")
+
+# Streaming statistics
+
+QUANTILE_SKETCH_K = 2048
+
+class RunningStats:
+    """Count, sum, min, max, mean and variance accumulated chunk by chunk.
+
+    Each chunk's mean and squared deviations are merged into the running
+    totals with the Welford/Chan update, so the data is read exactly once
+    and the variance stays numerically stable.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def update(self, values):
+        if len(values):
+            self.merge_moments(*active_backend().moments(values))
+
+    def merge_moments(self, n, total, mean, m2, minimum, maximum):
+        combined = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / combined
+        self.m2 += m2 + delta * delta * self.count * n / combined
+        self.count = combined
+        self.total += total
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def merge(self, other):
+        if other.count:
+            self.merge_moments(other.count, other.total, other.mean, other.m2,
+                               other.minimum, other.maximum)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance)
+
+class QuantileSketch:
+    """Bounded-memory quantile sketch built from a hierarchy of compactors.
+
+    Level h holds values of weight 2**h. When a level reaches k values it is
+    sorted and every other value (random start) moves up one level. Each
+    compaction at level h shifts any rank by at most 2**h and level h is
+    compacted at most n / (k * 2**h) times, so the rank error of a query is
+    at most n * log2(n / k) / k: about 0.92% of n (18.9 / 2048) for a billion
+    rows at the default k = 2048. Memory is k * log2(n / k) values (under 400 KB).
+    """
+
+    def __init__(self, k=QUANTILE_SKETCH_K, seed=None):
+        self.k = k
+        self.count = 0
+        self.levels = [array('d')]
+        self._random = random.Random(seed)
+
+    def update(self, values):
+        self.count += len(values)
+        self.levels[0].extend(values)
+        self._compress()
+
+    def merge(self, other):
+        self.count += other.count
+        for h, level in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(array('d'))
+            self.levels[h].extend(level)
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) >= self.k:
+                values = sorted(self.levels[h])
+                kept = values.pop() if len(values) % 2 else None
+                if h + 1 == len(self.levels):
+                    self.levels.append(array('d'))
+                self.levels[h + 1].extend(values[self._random.randint(0, 1)::2])
+                self.levels[h] = array('d', () if kept is None else (kept,))
+            h += 1
+
+    def error_bound(self):
+        """Worst-case rank error as a fraction of the count"""
+        if self.count <= self.k:
+            return 0.0
+        return math.log2(self.count / self.k) / self.k
+
+    def quantiles(self, fractions):
+        if len(self.levels) == 1:
+            return exact_quantiles(self.levels[0], fractions) if self.count else [math.nan for _ in fractions]
+        weighted = sorted((x, 1 << h) for h, level in enumerate(self.levels) for x in level)
+        total = sum(weight for _, weight in weighted)
+        results = []
+        for fraction in fractions:
+            target, seen = fraction * total, 0
+            for value, weight in weighted:
+                seen += weight
+                if seen >= target:
+                    break
+            results.append(value)
+        return results
+
+    @property
+    def nbytes(self):
+        return sum(len(level) for level in self.levels) * 8
+
+def exact_quantiles(values, fractions):
+    """Quantiles with linear interpolation between closest ranks"""
+    if not sort_fits(len(values)):
+        with SortedRuns() as runs:
+            runs.update(values)
+            return runs.quantiles(fractions)
+    ordered = active_backend().sort(values)
+    results = []
+    for fraction in fractions:
+        position = fraction * (len(ordered) - 1)
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        results.append(ordered[low] + (ordered[high] - ordered[low]) * (position - low))
+    return results
+
+def stream_column_stats(filepath, chunk_rows=DATASET_CHUNK_ROWS, where=None, exact=False,
+                        partition=None):
+    """Scan a CSV (or partition set) once in chunks, keeping per-column stats and sketches.
+
+    With exact, each column keeps SortedRuns (sharing the sort budget) instead
+    of a sketch; the caller closes them.
+    """
+    with open_csv_rows(filepath, partition, where) as (names, reader):
+        predicate = compile_where(where, tuple(names)).test if where else None
+        budget = SORT_BUDGET_BYTES // max(len(names), 1)
+        columns = {name: (RunningStats(), SortedRuns(budget) if exact else QuantileSketch())
+                   for name in names}
+        row_count = 0
+        for chunk in _read_chunks(reader, len(names), chunk_rows, predicate):
+            row_count += len(chunk)
+            for name, cells in zip(names, zip(*chunk)):
+                if name not in columns:
+                    continue
+                parsed = _parse_numbers(cells)
+                if parsed is None:
+                    if exact:
+                        columns[name][1].close()
+                    del columns[name]
+                    continue
+                values = parsed[0] if not parsed[1] else array('d', (x for x in parsed[0] if x == x))
+                columns[name][0].update(values)
+                columns[name][1].update(values)
+    return columns, row_count
+
+class GroupedStats:
+    """RunningStats per key for each numeric column, built by hash partitioning.
+
+    Each chunk is split into per-key buckets in one pass over its rows, and
+    only the keys that occur in the chunk are folded into their running
+    stats, so the cost is O(rows) however many groups there are. Keys are
+    compared as _cell_text reads them, so "1" and "1.0" are one group.
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.counts = []
+        self.columns = {}
+        self._raw = {}
+
+    def update(self, keys, columns, categories=None):
+        """Add one chunk: a key per row plus {name: values} (NaN = missing).
+
+        With categories, keys are integer codes into that list and are used
+        as group ids directly whenever the category order matches.
+        """
+        index, raw = self.index, self._raw
+        for k in dict.fromkeys(keys if categories is None else categories):
+            if k not in raw:
+                raw[k] = index.setdefault(_cell_text(k), len(index))
+        if categories is None:
+            ids = list(map(raw.__getitem__, keys))
+        else:
+            remap = [raw[k] for k in categories]
+            ids = keys if remap == list(range(len(remap))) else [remap[k] for k in keys]
+        groups = len(index)
+        self.counts.extend([0] * (groups - len(self.counts)))
+        for group, n in Counter(ids).items():
+            self.counts[group] += n
+        for name, values in columns.items():
+            stats = self.columns.setdefault(name, [])
+            stats.extend(RunningStats() for _ in range(groups - len(stats)))
+            if groups <= len(ids):
+                # a bucket per group costs no more than the chunk itself
+                buckets = [array('d') for _ in range(groups)]
+                appends = [bucket.append for bucket in buckets]
+                for group, x in zip(ids, values):
+                    if x == x:
+                        appends[group](x)
+                buckets = enumerate(buckets)
+            else:
+                buckets = defaultdict(functools.partial(array, 'd'))
+                for group, x in zip(ids, values):
+                    if x == x:
+                        buckets[group].append(x)
+                buckets = buckets.items()
+            for group, bucket in buckets:
+                if bucket:
+                    stats[group].update(bucket)
+
+    def drop(self, name):
+        self.columns.pop(name, None)
+
+    def groups(self):
+        """(key, row count) pairs in first-seen order"""
+        return list(zip(self.index, self.counts))
+
+def stream_grouped_stats(filepath, key_name, chunk_rows=DATASET_CHUNK_ROWS, where=None,
+                         partition=None):
+    """Scan a CSV (or partition set) once, grouping numeric columns by the key column"""
+    with open_csv_rows(filepath, partition, where) as (names, reader):
+        predicate = compile_where(where, tuple(names)).test if where else None
+        key_index = names.index(key_name)
+        grouped = GroupedStats()
+        numeric = set(names) - {key_name}
+        row_count = 0
+        for chunk in _read_chunks(reader, len(names), chunk_rows, predicate):
+            row_count += len(chunk)
+            cells = list(zip(*chunk))
+            columns = {}
+            for name, column_cells in zip(names, cells):
+                if name not in numeric:
+                    continue
+                parsed = _parse_numbers(column_cells)
+                if parsed is None:
+                    numeric.discard(name)
+                    grouped.drop(name)
+                else:
+                    columns[name] = parsed[0]
+            grouped.update(cells[key_index], columns)
+    return grouped, row_count
+
+DATASET_CACHE_BUDGET_MB = float(os.getenv('NEW_APL_CACHE_MB', '512'))
+
+def _file_signature(filepath):
+    """Cache key for a file: resolved path, size and mtime (per partition for sets)"""
+    if is_partition_set(filepath):
+        files = partition_files(filepath)
+        return str(Path(filepath).resolve()), tuple(map(_file_signature, files))
+    resolved = Path(filepath).resolve()
+    stat = resolved.stat()
+    return str(resolved), stat.st_size, stat.st_mtime_ns
+
+class DatasetCache:
+    """Process-wide LRU cache of loaded datasets bounded by a memory budget"""
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def nbytes(self):
+        return sum(dataset.nbytes for _, dataset in self._entries.values())
+
+    def get(self, filepath, loader=None, variant=None):
+        """Return (dataset, cached) for a file, loading it on a miss"""
+        signature = _file_signature(filepath)
+        path = signature[0] if variant is None else f"{signature[0]}#{variant}"
+        with self._lock:
+            loading = self._loading.setdefault(path, threading.Lock())
+        # Concurrent misses on one file (server mode, background jobs) wait
+        # for a single load; a waiting job can still be cancelled
+        while not loading.acquire(timeout=0.1):
+            job_checkpoint()
+        try:
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is not None and entry[0] == signature:
+                    self._entries.move_to_end(path)
+                    self.hits += 1
+                    return entry[1], True
+                self._entries.pop(path, None)
+                self.misses += 1
+            dataset = (loader or load_dataset)(filepath)
+            with self._lock:
+                if dataset.nbytes <= self.budget_bytes:
+                    self._entries[path] = (signature, dataset)
+                    self._evict()
+        finally:
+            loading.release()
+        return dataset, False
+
+    def _evict(self):
+        while self._entries and self.nbytes > self.budget_bytes:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, filepath, variant=None):
+        """The cached dataset for a file if it is current, without loading"""
+        signature = _file_signature(filepath)
+        with self._lock:
+            entry = self._entries.get(signature[0] if variant is None else f"{signature[0]}#{variant}")
+        return entry[1] if entry is not None and entry[0] == signature else None
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+        return count
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': [Path(path).name for path in self._entries],
+                'bytes': self.nbytes,
+                'budget_bytes': self.budget_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+DATASET_CACHE = DatasetCache(int(DATASET_CACHE_BUDGET_MB * 1024 * 1024))
+
+def get_dataset(filepath, workers=None, partition=None, write_sidecar_file=False):
+    """Load a dataset through the process-wide cache; returns (dataset, cached)"""
+    if workers or partition or write_sidecar_file:
+        loader = functools.partial(load_dataset, write_sidecar_file=write_sidecar_file,
+                                   workers=workers, partition=partition)
+        return DATASET_CACHE.get(filepath, loader, partition)
+    return DATASET_CACHE.get(filepath)
+
+def query_dataset(filepath, where=None, workers=None, partition=None):
+    """(dataset, cached) for a file, keeping only the rows matching a where clause.
+
+    A dataset already in the cache, or a fresh sidecar, is filtered column by
+    column; otherwise the clause is pushed into the CSV scan. Filtered
+    results are not cached.
+    """
+    if not where:
+        return get_dataset(filepath, workers, partition)
+    start_time = time.time()
+    dataset = DATASET_CACHE.peek(filepath, partition)
+    if dataset is None and is_partition_set(filepath):
+        dataset = load_partitions(filepath, workers=workers, partition=partition, where=where)
+        dataset.source = 'pushdown'
+        return dataset, False
+    dataset = dataset or load_sidecar(filepath)
+    if dataset is None:
+        zones = load_zone_map(filepath)
+        ranges = None
+        if zones is not None:
+            with PROFILER.span('zone map block skipping'):
+                ranges = zones.candidate_blocks(compile_where(where, tuple(_csv_header(filepath)[0])))
+        with PROFILER.span('scan with where pushdown') as span:
+            dataset = parse_csv_dataset(filepath, workers, where, ranges)
+            span.rows = dataset.row_count
+        dataset.source = 'pushdown'
+        if zones is not None:
+            dataset.skipped_blocks = (len(zones.blocks) - len(ranges), len(zones.blocks))
+        return dataset, False
+    with PROFILER.span('filter loaded columns') as span:
+        selected = compile_where(where, tuple(dataset.column_names)).select(dataset)
+        span.rows = dataset.row_count
+        dataset = dataset.take(selected)
+    dataset.load_time = time.time() - start_time
+    dataset.source = 'filtered'
+    return dataset, False
+
+def cache_command(action, argument=''):
+    """Show, clear or resize the dataset cache"""
+    if action == 'clear':
+        count = DATASET_CACHE.clear()
+        with _PROGRAM_CACHE_LOCK:
+            programs = len(_PROGRAM_CACHE)
+            _PROGRAM_CACHE.clear()
+        return f"🧹 Caches cleared ({count} datasets, {programs} compiled programs released)"
+    if action == 'budget':
+        if not argument:
+            return "❌ Usage: cache budget <megabytes>"
+        DATASET_CACHE.set_budget(int(float(argument) * 1024 * 1024))
+    stats = DATASET_CACHE.stats()
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = 100 * stats['hits'] / lookups if lookups else 0
+    result = "🗄️ Dataset cache:\n"
+    result += f"   Entries: {len(stats['entries'])}"
+    if stats['entries']:
+        result += f" ({', '.join(stats['entries'])})"
+    result += "\n"
+    result += f"   Memory: {stats['bytes'] / 1024:,.1f} KB of {stats['budget_bytes'] / (1024 * 1024):,.1f} MB budget\n"
+    result += f"   Hits: {stats['hits']} | Misses: {stats['misses']} | Hit rate: {hit_rate:.0f}%\n"
+    result += f"   Evictions: {stats['evictions']}\n"
+    result += f"📦 Compiled programs: {len(_PROGRAM_CACHE)} in memory"
+    result += f", disk cache {APL_CACHE_DIR}" if PROGRAM_CACHE_DISK else ", disk cache off"
+    return result
+
+def _describe_column(column):
+    if column.kind == 'category':
+        return f"{column.name} (category, {len(column.categories):,} values)"
+    return f"{column.name} ({column.kind})"
+
+def load_data_file(filename, options=''):
+    """Load and analyze CSV data file"""
+    filepath = resolve_data_file(filename)
+    if filepath is None:
+        return f"❌ Data file not found: {filename}"
+    
+    try:
+        options, where = _split_where(options)
+        options, partition = _split_partition(options)
+        parallel = re.search(r'parallel\s*(\d*)', options.lower())
+        workers = (int(parallel.group(1) or 0) or os.cpu_count() or 1) if parallel else None
+        with PROFILER.span('load dataset') as span:
+            dataset, cached = query_dataset(filepath, where, workers, partition)
+            span.rows = dataset.row_count
+        load_time = 0.0 if cached else dataset.load_time
+        sidecars = []
+        if 'sidecar' in options.lower() and not where:
+            with PROFILER.span('write sidecar'):
+                if is_partition_set(filepath):
+                    sidecars = write_partition_sidecars(filepath, workers)
+                else:
+                    sidecars = [write_sidecar(dataset)]
+        zone_map = None
+        if re.search(r'\bindex\b', options, re.IGNORECASE) and not where and not is_partition_set(filepath):
+            with PROFILER.span('write zone map'):
+                # Cached and sidecar datasets carry no byte ranges to index
+                indexed = dataset if dataset.blocks else parse_csv_dataset(filepath, workers)
+                if indexed.blocks:
+                    zone_map = write_zone_map(indexed)
+        
+        # Quick analysis
+        num_rows = dataset.row_count
+        num_cols = len(dataset.columns)
+        columns = dataset.column_names
+        numeric = dataset.numeric_columns()
+        numeric_bytes = sum(column.nbytes for column in numeric)
+        numeric_cells = sum(len(column) for column in numeric)
+        
+        # Generate APL representation
+        apl_code = f'''⍝ Data loaded: {filepath.name}
+ROWS ← {num_rows}
+COLS ← {num_cols}
+COLUMNS ← {repr(columns)}
+
+⍝ Sample operations available:
+⍝ TOTAL ← +/NUMERIC_COLUMN
+⍝ AVERAGE ← (+/DATA) ÷ ≢DATA  
+⍝ TRENDS ← 1↓DATA - ¯1↓DATA'''
+        
+        result = f"✅ Loaded: {filepath.name}\n"
+        result += f"📊 Data: {num_rows} rows, {num_cols} columns\n"
+        result += f"📈 Columns: {', '.join(_describe_column(c) for c in dataset.columns.values())}\n"
+        result += f"💾 Memory: {dataset.nbytes / 1024:,.1f} KB"
+        if numeric_cells:
+            result += f" ({numeric_bytes / numeric_cells:.0f} bytes per numeric cell)"
+        result += "\n"
+        source = ' (cached)' if cached else ' (sidecar)' if dataset.source == 'sidecar' else ''
+        if dataset.workers > 1 and not cached:
+            source += f" on {dataset.workers} processes"
+        result += f"⚡ Load time: {load_time:.3f} seconds{source}\n"
+        if dataset.partitions > 1 or is_partition_set(filepath):
+            result += f"📂 Partitions: {dataset.partitions} files"
+            result += f", tagged in column '{partition}'\n" if partition else "\n"
+        if where:
+            how = 'filtered loaded columns' if dataset.source == 'filtered' else 'applied while parsing'
+            if dataset.skipped_blocks:
+                how += f", zone map skipped {dataset.skipped_blocks[0]} of {dataset.skipped_blocks[1]} blocks"
+            result += f"🔎 Where {where}: {num_rows:,} matching rows ({how})\n"
+        if len(sidecars) == 1:
+            result += f"🗃️ Sidecar: {sidecars[0].name} ({sidecars[0].stat().st_size / 1024:,.1f} KB)\n"
+        elif sidecars:
+            total = sum(path.stat().st_size for path in sidecars)
+            result += f"🗃️ Sidecars: {len(sidecars)} partitions ({total / 1024:,.1f} KB)\n"
+        if zone_map is not None:
+            result += f"🗂️ Zone map: {zone_map.name} ({zone_map.stat().st_size / 1024:,.1f} KB)\n"
+        result += "\n"
+        result += f"Generated APL:\n{apl_code}"
+        
+        return result
+        
+    except Exception as e:
+        return f"❌ Error loading data: {str(e)}"
+
+# Sampling
+#
+# "sample N" / "approx" answer from a uniform sample instead of every row.
+# A plain CSV is block sampled: seeded random SAMPLE_WINDOW_BYTES windows
+# are read at their offsets, so only about N rows worth of bytes are
+# touched. A line belongs to the window holding its first byte and is read
+# through to its end even past the window, so every line sits in exactly
+# one window and each is equally likely to be drawn, however long. Files that cannot be seeked safely
+# (compressed, partition sets, or quoted fields that could hide newlines)
+# are reservoir sampled (Algorithm L) in one streaming pass, which also
+# gives the exact row count. Sampled rows keep their file order.
+
+SAMPLE_ROWS = 100_000
+SAMPLE_SEED = int(os.getenv('NEW_APL_SAMPLE_SEED', '42'))
+SAMPLE_WINDOW_BYTES = 4096
+SAMPLE_Z = 1.96  # 95% confidence
+
+def _split_sample(text):
+    """Split sampling options out of text: (rest, rows or None, seed, refine)"""
+    rows = seed = None
+    match = re.search(r'\bsample\s+([\d_,]+)\b', text, re.IGNORECASE)
+    if match:
+        rows = int(match.group(1).replace(',', '').replace('_', ''))
+    elif re.search(r'\bapprox\b', text, re.IGNORECASE):
+        rows = SAMPLE_ROWS
+    match = re.search(r'\bseed\s+(\d+)\b', text, re.IGNORECASE)
+    if match:
+        seed = int(match.group(1))
+    refine = bool(re.search(r'\brefine\b', text, re.IGNORECASE))
+    rest = re.sub(r'\b(?:sample\s+[\d_,]+|approx|seed\s+\d+|refine)\b', ' ', text, flags=re.IGNORECASE)
+    return ' '.join(rest.split()), rows, SAMPLE_SEED if seed is None else seed, refine
+
+def _open_random(rng):
+    """Uniform in (0, 1)"""
+    return rng.random() or 0.5
+
+def reservoir_sample(items, size, rng):
+    """(count, sample) for a uniform sample of size items in one pass (Algorithm L).
+
+    Each sample entry is (position, item); instead of drawing a number per
+    item, the gap to the next replacement is drawn directly.
+    """
+    counter = itertools.count()
+    indexed = zip(counter, items)
+    reservoir = list(itertools.islice(indexed, size))
+    if len(reservoir) < size:
+        return len(reservoir), reservoir
+    w = math.exp(math.log(_open_random(rng)) / size)
+    while True:
+        gap = int(math.log(_open_random(rng)) / math.log(1 - w))
+        item = next(itertools.islice(indexed, gap, None), None)
+        if item is None:
+            break
+        reservoir[rng.randrange(size)] = item
+        w *= math.exp(math.log(_open_random(rng)) / size)
+    # zip drew one more number from the counter before the rows ran out
+    return next(counter) - 1, reservoir
+
+def _window_rows(f, start, width, first):
+    """CSV lines starting in the window at start, read to their ends; None if they hold a quote"""
+    # Read one byte before the window: a line starts at start when it is a newline
+    lead = 0 if first else 1
+    f.seek(start - lead)
+    data = f.read(SAMPLE_WINDOW_BYTES + lead)
+    begin = 0 if first else data.find(b'\n') + 1
+    if (begin == 0 and not first) or begin >= len(data):
+        return [], 0
+    if not data.endswith(b'\n'):
+        # the last line started inside the window: finish it (EOF may end it unterminated)
+        data += f.readline()
+    end = len(data)
+    if b'"' in data[begin:end]:
+        return None
+    text = data[begin:end].decode('utf-8', errors='replace')
+    return [row for chunk in _read_chunks(csv.reader(io.StringIO(text, newline='')), width)
+            for row in chunk], end - begin
+
+def _block_sample(filepath, names, data_start, size, rows, rng, predicate=None):
+    """(rows of each window, estimated row count) from random windows; None when windows are unsafe.
+
+    Windows are drawn until they hold the requested rows (rows passing
+    predicate, when given), then rows are dropped at random down to exactly
+    that many. The row count is estimated for the rows passing predicate.
+    """
+    # the last slot may be partial: lines starting there must be drawable too
+    slots = -(-(size - data_start) // SAMPLE_WINDOW_BYTES)
+    with open(filepath, 'rb') as f:
+        probe = _window_rows(f, data_start, len(names), True)
+        if probe is None or not probe[0]:
+            return None
+        bytes_per_row = probe[1] / len(probe[0])
+        wanted = math.ceil(rows * bytes_per_row / SAMPLE_WINDOW_BYTES)
+        if wanted * 2 >= slots:
+            return None
+        chosen = set(rng.sample(range(slots), wanted))
+        pending = sorted(chosen)
+        windows, scanned, read, kept = [], 0, 0, 0
+        while True:
+            for slot in pending:
+                window = _window_rows(f, data_start + slot * SAMPLE_WINDOW_BYTES, len(names), slot == 0)
+                if window is None:
+                    return None
+                cells, nbytes = window
+                scanned += nbytes
+                read += len(cells)
+                if predicate is not None:
+                    cells = [row for row in cells if predicate(row)]
+                if cells:
+                    windows.append((slot, cells))
+                    kept += len(cells)
+            if kept >= rows:
+                break
+            # Top up with as many new windows as the yield so far says are missing
+            extra = math.ceil((rows - kept) * len(chosen) / kept) if kept else len(chosen)
+            extra = min(extra, slots // 2 - len(chosen))
+            if extra <= 0:
+                return None
+            pending = []
+            while len(pending) < extra:
+                slot = rng.randrange(slots)
+                if slot not in chosen:
+                    chosen.add(slot)
+                    pending.append(slot)
+            pending.sort()
+    population = round((size - data_start) * read / scanned) if scanned else 0
+    if predicate is not None:
+        population = round(population * kept / read) if read else 0
+    windows.sort(key=operator.itemgetter(0))
+    windows = [cells for _, cells in windows]
+    if kept > rows:
+        dropped = set(rng.sample(range(kept), kept - rows))
+        ranks = itertools.count()
+        windows = [[row for row in cells if next(ranks) not in dropped] for cells in windows]
+    return [cells for cells in windows if cells], population
+
+def sample_dataset(filepath, rows=SAMPLE_ROWS, seed=SAMPLE_SEED, where=None, partition=None):
+    """Dataset parsed from a uniform row sample; dataset.sample describes how it was drawn"""
+    start_time = time.time()
+    rng = random.Random(seed)
+    block = None
+    with PROFILER.span('draw sample') as span:
+        names, data_start, size = (None, None, 0) if is_partition_set(filepath) else _csv_header(filepath)
+        if data_start is not None:
+            predicate = compile_where(where, tuple(names)).test if where else None
+            block = _block_sample(filepath, names, data_start, size, rows, rng, predicate)
+        clusters = None
+        if block is not None:
+            windows, population = block
+            zones = None if where else load_zone_map(filepath)
+            exact_population = zones is not None
+            if exact_population:
+                population = zones.rows
+            method = 'block'
+            sample = [row for window in windows for row in window]
+            clusters = [len(window) for window in windows]
+        else:
+            with open_csv_rows(filepath, partition, where) as (names, reader):
+                predicate = compile_where(where, tuple(names)).test if where else None
+                filtered = itertools.chain.from_iterable(_read_chunks(reader, len(names), predicate=predicate))
+                population, drawn = reservoir_sample(filtered, rows, rng)
+            drawn.sort(key=operator.itemgetter(0))
+            sample = [row for _, row in drawn]
+            method, exact_population = 'reservoir', True
+        span.rows = len(sample)
+    with PROFILER.span('parse sample') as span:
+        columns, count = _parse_csv_rows(lambda: iter(sample), names, frozenset())
+        span.rows = count
+    dataset = Dataset(Path(filepath), {c.name: c for c in columns}, count,
+                      time.time() - start_time, source='sample')
+    dataset.sample = {'method': method, 'seed': seed, 'population': population, 'requested': rows,
+                      'exact_population': exact_population, 'clusters': clusters}
+    return dataset
+
+def _cluster_design_effect(values, clusters, mean, variance):
+    """Variance inflation of a mean estimated from whole blocks of adjacent rows.
+
+    Rows next to each other in a file are often alike (sorted ids, dates), so
+    a block sample carries less information than as many independent rows.
+    Uses the ratio-estimator variance over per-block sums and counts.
+    """
+    totals, position = [], 0
+    for size in clusters:
+        present = active_backend().drop_missing(values[position:position + size])
+        if len(present):
+            totals.append((active_backend().reduce('+', present), len(present)))
+        position += size
+    k = len(totals)
+    n = sum(count for _, count in totals)
+    if k < 2 or not variance:
+        return 1.0
+    spread = sum((total - mean * count) ** 2 for total, count in totals) / (k - 1)
+    cluster_variance = spread * k / (n * n)
+    return max(cluster_variance / (variance / n), 1.0)
+
+def sample_estimates(column, population, clusters=None):
+    """Point estimates with 95% confidence half-widths for a sampled numeric column.
+
+    Block samples widen every interval by the design effect of their blocks.
+    """
+    values = column.present()
+    n = len(values)
+    stats = RunningStats()
+    stats.update(values)
+    # Finite population correction: a sample of every row has no error
+    correction = math.sqrt(max(1 - n / population, 0.0)) if population else 1.0
+    if clusters and n > 1:
+        correction *= math.sqrt(_cluster_design_effect(column.values, clusters, stats.mean, stats.variance))
+    error = SAMPLE_Z * stats.stdev / math.sqrt(n) * correction if n > 1 else math.inf
+    ordered = active_backend().sort(values)
+    quantiles = []
+    for fraction in (0.25, 0.5, 0.75):
+        # Order-statistic interval: ranks around p·(n-1) ± z·√(n·p·(1-p))
+        position = fraction * (n - 1)
+        spread = SAMPLE_Z * math.sqrt(n * fraction * (1 - fraction)) * correction
+        low = max(int(math.floor(position - spread)), 0)
+        high = min(int(math.ceil(position + spread)), n - 1)
+        quantiles.append((exact_quantiles(ordered, (fraction,))[0], ordered[low], ordered[high]))
+    stdev_error = stats.stdev * SAMPLE_Z / math.sqrt(2 * (n - 1)) * correction if n > 1 else math.inf
+    return {
+        'stats': stats,
+        'mean': (stats.mean, error),
+        'total': (stats.mean * population, error * population),
+        'stdev': (stats.stdev, stdev_error),
+        'quartiles': quantiles,
+    }
+
+def describe_sample(dataset):
+    """One line saying how a sampled dataset was drawn"""
+    info = dataset.sample
+    population = f"{info['population']:,}" if info['exact_population'] else f"≈{info['population']:,}"
+    method = 'random 4 KB blocks' if info['method'] == 'block' else 'one-pass reservoir'
+    drawn = f"{dataset.row_count:,}"
+    if dataset.row_count < info['requested']:
+        drawn += f" (of {info['requested']:,} requested)"
+    return f"🎲 Sample: {drawn} of {population} rows ({method}, seed {info['seed']})"
+
+def _refine_options(options, where=None, partition=None):
+    """Command options for the exact rerun of a sampled command"""
+    parts = [options, f"partition as {partition}" if partition else '', f"where {where}" if where else '']
+    return ' '.join(part for part in parts if part)
+
+# Exact answers for sampled runs are computed on a background thread when
+# "refine" is given; "refine" lists them and "refine N" shows one. The
+# threads are daemons, so exiting never waits for a refinement.
+
+REFINEMENTS = []
+
+def start_refinement(label, compute):
+    """Run compute() on a daemon thread; returns the refinement number"""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(compute())
+        except Exception as e:
+            future.set_exception(e)
+    REFINEMENTS.append((label, future, time.time()))
+    threading.Thread(target=run, name=f"refine-{len(REFINEMENTS)}", daemon=True).start()
+    return len(REFINEMENTS)
+
+def refine_command(argument=''):
+    """List background refinements or show one result"""
+    if not REFINEMENTS:
+        return "🔄 No refinements: add 'refine' to a sampled analyze or calculate command"
+    if argument.strip():
+        number = int(argument)
+        if not 1 <= number <= len(REFINEMENTS):
+            return f"❌ No refinement #{number} (1-{len(REFINEMENTS)})"
+        label, future, started = REFINEMENTS[number - 1]
+        if not future.done():
+            return f"⏳ Refinement #{number} ({label}) still running, {time.time() - started:.1f}s so far"
+        return f"✅ Exact result #{number} ({label}):\n\n{future.result()}"
+    result = "🔄 Refinements:\n"
+    for number, (label, future, started) in enumerate(REFINEMENTS, 1):
+        status = 'done' if future.done() else f"running {time.time() - started:.1f}s"
+        result += f"   #{number} {label}: {status}\n"
+    return result.rstrip()
+
+# Time-series analytics
+#
+# Each option is a single O(n) pass over a column. Rolling sums keep a
+# running window total with Neumaier compensation for every value added and
+# dropped, re-anchored with math.fsum every ROLLING_RESYNC windows (prefix-sum
+# differences lose digits once the prefix dwarfs the window, and an inf or
+# NaN would poison them for good). Rolling min/max keep a monotonic deque
+# of candidate positions, the EMA is one running accumulate, and the
+# least-squares line needs only the column moments plus Σ(x - x̄)·y.
+# Seasonal indices are the mean detrended value at each phase of the period.
+
+SEASONAL_PERIOD = 12
+EMA_ALPHA = 0.3
+ROLLING_RESYNC = 4096
+
+def rolling_sums(values, window):
+    """Sum of every window of `window` adjacent values, compensated"""
+    n = len(values)
+    if window > n:
+        return array('d')
+    out = array('d')
+    append = out.append
+    resync = max(ROLLING_RESYNC, window)
+    total = compensation = 0.0
+    bad = -2 - window  # position of the latest inf or NaN
+    for i in range(window - 1, n):
+        start = i - window + 1
+        if not math.isfinite(values[i]):
+            bad = i
+        if bad >= start - 1:
+            # An inf or NaN is in (or just left) the window: sum it afresh
+            window_values = values[start:i + 1]
+            total, compensation = sum(window_values) if bad >= start else math.fsum(window_values), 0.0
+        elif start % resync == 0:
+            window_values = values[start:i + 1]
+            total = math.fsum(window_values)
+            compensation = math.fsum(list(window_values) + [-total])
+        else:
+            for x in (values[i], -values[i - window]):
+                t = total + x
+                if abs(total) >= abs(x):
+                    compensation += (total - t) + x
+                else:
+                    compensation += (x - t) + total
+                total = t
+        append(total + compensation)
+    return out
+
+def rolling_means(values, window):
+    """Mean of every window of `window` adjacent values"""
+    sums = rolling_sums(values, window)
+    return active_backend().elementwise('÷', sums, float(window), len(sums))
+
+def rolling_extremes(values, window, largest=True):
+    """Max (or min) of every window, from a monotonic deque of candidate positions"""
+    beats = operator.ge if largest else operator.le
+    candidates = deque()
+    out = array('d')
+    for i, x in enumerate(values):
+        while candidates and beats(x, values[candidates[-1]]):
+            candidates.pop()
+        candidates.append(i)
+        if candidates[0] <= i - window:
+            candidates.popleft()
+        if i >= window - 1:
+            out.append(values[candidates[0]])
+    return out
+
+def ema(values, alpha=EMA_ALPHA):
+    """Exponential moving average; the first value seeds the average"""
+    return array('d', itertools.accumulate(values, lambda s, x: s + alpha * (x - s)))
+
+def _least_squares(values):
+    """(slope, intercept, r², squared deviations of values) over row positions 0..n-1"""
+    n, _, mean, m2, _, _ = active_backend().moments(values)
+    if n < 2:
+        return 0.0, mean, 0.0, m2
+    x_mean = (n - 1) / 2
+    x_m2 = n * (n * n - 1) / 12
+    xy = sum(map(operator.mul, map(operator.sub, range(n), itertools.repeat(x_mean, n)), values))
+    slope = xy / x_m2
+    r2 = xy * xy / (x_m2 * m2) if m2 else 1.0
+    return slope, mean - slope * x_mean, r2, m2
+
+def linear_fit(values):
+    """Least-squares line over row positions 0..n-1: (slope, intercept, r²)"""
+    return _least_squares(values)[:3]
+
+def seasonal_indices(values, period=SEASONAL_PERIOD):
+    """Per-phase offsets from the linear trend, and the share of detrended variance they explain"""
+    slope, intercept, r2, m2 = _least_squares(values)
+    means = []
+    for k in range(period):
+        phase = values[k::period]
+        count = len(phase)
+        # Mean residual of the phase: its mean value minus the trend at its mean position
+        x_mean = k + period * (count - 1) / 2
+        means.append((count, active_backend().reduce('+', phase) / count - intercept - slope * x_mean))
+    center = sum(m for _, m in means) / period
+    residual = m2 * (1 - r2)
+    explained = sum(count * m * m for count, m in means)
+    return [m - center for _, m in means], (min(explained / residual, 1.0) if residual else 0.0)
+
+def _format_series_value(x):
+    return f"{x:,.1f}"
+
+def time_series_apl(operations):
+    """Generated APL lines for the time-series options in operations"""
+    ops = operations.lower()
+    lines = []
+    rolling = re.search(r'\brolling\s+(\d+)', ops)
+    if rolling:
+        window = rolling.group(1)
+        lines.append(f"ROLLING ← ({window} +⌿ DATA) ÷ {window}")
+        lines.append(f"HIGHS ← {window} ⌈⌿ DATA")
+    smoothing = re.search(r'\bema\b(?:\s+([\d.]+))?', ops)
+    if smoothing:
+        lines.append(f"SMOOTH ← {smoothing.group(1) or EMA_ALPHA} ⎕EMA DATA[;1]")
+    if re.search(r'\blinear\b', ops):
+        lines.append("FIT ← ⎕LINEAR DATA[;1]")
+    seasonal = re.search(r'\bseasonal\b(?:\s+(\d+))?', ops)
+    if seasonal:
+        lines.append(f"SEASON ← {seasonal.group(1) or SEASONAL_PERIOD} ⎕SEASONAL DATA[;1]")
+    return ''.join(line + '\n' for line in lines)
+
+def time_series_report(numeric_cols, operations):
+    """Rolling, EMA, linear and seasonal sections for analyze data"""
+    ops = operations.lower()
+    result = ""
+    rolling = re.search(r'\brolling\s+(\d+)', ops)
+    if rolling:
+        window = int(rolling.group(1))
+        result += f"\n📉 ROLLING {window} (latest window | highest mean):\n"
+        for col, values in numeric_cols.items():
+            if not window or len(values) < window:
+                result += f"   {col}: needs at least {max(window, 1)} values\n"
+                continue
+            with PROFILER.span(f'rolling {col}') as span:
+                means = rolling_means(values, window)
+                lows = rolling_extremes(values, window, largest=False)
+                highs = rolling_extremes(values, window)
+                span.rows = len(values)
+            result += (f"   {col}: mean {_format_series_value(means[-1])}, "
+                       f"min {_format_series_value(lows[-1])}, max {_format_series_value(highs[-1])} "
+                       f"| {_format_series_value(max(means))}\n")
+    smoothing = re.search(r'\bema\b(?:\s+([\d.]+))?', ops)
+    if smoothing:
+        alpha = float(smoothing.group(1)) if smoothing.group(1) else EMA_ALPHA
+        if not 0 < alpha <= 1:
+            return result + f"\n❌ ema needs 0 < α ≤ 1, got {alpha:g}\n"
+        result += f"\n〰️ EMA (α = {alpha:g}):\n"
+        for col, values in numeric_cols.items():
+            if len(values):
+                with PROFILER.span(f'ema {col}') as span:
+                    smoothed = ema(values, alpha)
+                    span.rows = len(values)
+                result += f"   {col}: {_format_series_value(smoothed[-1])} (latest value {_format_series_value(values[-1])})\n"
+    if re.search(r'\blinear\b', ops):
+        result += "\n📐 LINEAR FIT (least squares over row order):\n"
+        for col, values in numeric_cols.items():
+            if len(values) >= 2:
+                with PROFILER.span(f'linear {col}') as span:
+                    slope, intercept, r2 = linear_fit(values)
+                    span.rows = len(values)
+                result += (f"   {col}: {slope:+,.2f} per row, intercept {_format_series_value(intercept)}, "
+                           f"R² {r2:.3f} → next {_format_series_value(intercept + slope * len(values))}\n")
+    seasonal = re.search(r'\bseasonal\b(?:\s+(\d+))?', ops)
+    if seasonal:
+        period = int(seasonal.group(1)) if seasonal.group(1) else SEASONAL_PERIOD
+        result += f"\n🗓️ SEASONAL (period {period}, offsets from trend):\n"
+        for col, values in numeric_cols.items():
+            if period < 2 or len(values) < 2 * period:
+                result += f"   {col}: needs at least two full periods ({2 * max(period, 2)} values)\n"
+                continue
+            with PROFILER.span(f'seasonal {col}') as span:
+                indices, strength = seasonal_indices(values, period)
+                slope, intercept, _ = linear_fit(values)
+                span.rows = len(values)
+            n = len(values)
+            shown = ' '.join(f"{x:+,.0f}" for x in indices[:12]) + (' …' if period > 12 else '')
+            result += (f"   {col}: {shown} | strength {strength:.2f} "
+                       f"→ next {_format_series_value(intercept + slope * n + indices[n % period])}\n")
+    return result
+
+def analyze_data_advanced(filename, operations):
+    """Perform advanced data analysis"""
+    filepath = resolve_data_file(filename)
+    if filepath is None:
+        return f"❌ Data file not found: {filename}"
+    
+    if 'follow' in operations.lower():
+        return follow_data(filename, operations)
+    
+    try:
+        start_time = time.time()
+        operations, where = _split_where(operations)
+        operations, sample_rows, seed, refine = _split_sample(operations)
+        operations, partition = _split_partition(operations)
+        
+        if sample_rows:
+            dataset = sample_dataset(filepath, sample_rows, seed, where, partition)
+        else:
+            with PROFILER.span('load dataset') as span:
+                dataset, _ = query_dataset(filepath, where, partition=partition)
+                span.rows = dataset.row_count
+        
+        # Numeric columns come typed from the loader
+        with PROFILER.span('numeric filter') as span:
+            numeric_cols = {c.name: c.present() for c in dataset.numeric_columns()}
+            span.rows = dataset.row_count
+        
+        analysis_time = time.time() - start_time
+        
+        result = f"✅ Analysis complete for {filepath.name}\n"
+        result += f"⚡ Processing time: {analysis_time:.3f} seconds\n"
+        result += f"📊 Analyzed {dataset.row_count} records{f' where {where}' if where else ''}\n"
+        if sample_rows:
+            result += describe_sample(dataset) + "\n"
+            result += "   Trends, fits and windows below run over the sampled rows in file order\n"
+            result += "📏 Estimated means (95% CI):\n"
+            for column in dataset.numeric_columns():
+                present = numeric_cols[column.name]
+                if len(present):
+                    population = dataset.sample['population'] * len(present) / dataset.row_count
+                    mean, error = sample_estimates(column, population, dataset.sample['clusters'])['mean']
+                    result += f"   {column.name}: ≈{mean:,.2f} ± {error:,.2f}\n"
+            if refine:
+                exact = _refine_options(operations, where, partition)
+                number = start_refinement(f"analyze {filepath.name} {operations}",
+                                          lambda: analyze_data_advanced(filename, exact))
+                result += f"🔄 Exact refinement #{number} running in the background: 'refine {number}' shows it\n"
+        result += "\n"
+        
+        # Generate insights
+        if 'trend' in operations.lower():
+            result += "📈 TRENDS DETECTED:\n"
+            for col, values in numeric_cols.items():
+                if len(values) > 1:
+                    trend = values[-1] - values[0]
+                    percentage = (trend / values[0]) * 100 if values[0] != 0 else 0
+                    result += f"   {col}: {trend:+.1f} ({percentage:+.1f}%)\n"
+        
+        if 'predict' in operations.lower():
+            result += "\n🔮 PREDICTIONS:\n"
+            for col, values in numeric_cols.items():
+                if len(values) >= 3:
+                    # Consecutive differences telescope to last - first
+                    avg_change = (values[-1] - values[0]) / (len(values)-1)
+                    prediction = values[-1] + avg_change
+                    result += f"   Next {col}: {prediction:.1f}\n"
+        
+        result += time_series_report(numeric_cols, operations)
+        
+        if 'visualize' in operations.lower():
+            result += "\n📊 VISUALIZATION READY:\n"
+            result += "   Charts generated for numeric columns\n"
+            result += "   Trend lines calculated\n"
+            result += "   Distribution analysis complete\n"
+        
+        # Generate equivalent APL code
+        apl_code = f'''⍝ Advanced analysis - Generated APL
+DATA ← {dataset.row_count} {len(numeric_cols)}⍴⍳{dataset.row_count * len(numeric_cols)}
+TRENDS ← 1↓DATA - ¯1↓DATA  
+PREDICTIONS ← (¯1↑DATA) + (+/TRENDS)÷≢TRENDS
+{time_series_apl(operations)}INSIGHTS ← 'Analysis complete in {analysis_time:.3f}s'
+        '''
+        
+        result += f"\nGenerated APL:\n{apl_code}"
+        
+        return result
+        
+    except Exception as e:
+        return f"❌ Analysis error: {str(e)}"
+
+# Follow mode
+#
+# Append-only CSVs are analysed incrementally: the state remembers the byte
+# offset of the first unparsed record plus, per numeric column, the first and
+# last values and RunningStats. A refresh parses only the complete records
+# appended since, so its cost depends on the new data, not the file size.
+# A file that shrank or was replaced (new inode) is re-read from the start.
+
+class FollowState:
+    """Byte offset and running aggregates for one followed CSV file"""
+
+    def __init__(self, filepath):
+        stat = Path(filepath).stat()
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.names, self.offset, _ = _csv_header(filepath)
+        self.row_count = 0
+        self.columns = {name: {'first': None, 'last': None, 'stats': RunningStats()}
+                        for name in self.names}
+
+    def refresh(self, filepath):
+        """Parse records appended since the last refresh; returns (rows, bytes)"""
+        with open(filepath, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        end = len(data)
+        # Stop after the last newline that is outside quotes; a partly
+        # written final record waits for the next refresh
+        while end:
+            end = data.rfind(b'\n', 0, end) + 1
+            if not end or data.count(b'"', 0, end) % 2 == 0:
+                break
+            end -= 1
+        if not end:
+            return 0, 0
+        rows = 0
+        reader = csv.reader(io.StringIO(data[:end].decode('utf-8'), newline=''))
+        for chunk in _read_chunks(reader, len(self.names)):
+            rows += len(chunk)
+            for name, cells in zip(self.names, zip(*chunk)):
+                column = self.columns.get(name)
+                if column is None:
+                    continue
+                parsed = _parse_numbers(cells)
+                if parsed is None:
+                    del self.columns[name]
+                    continue
+                values = parsed[0] if not parsed[1] else array('d', (x for x in parsed[0] if x == x))
+                if values:
+                    if column['first'] is None:
+                        column['first'] = values[0]
+                    column['last'] = values[-1]
+                    column['stats'].update(values)
+        self.offset += end
+        self.row_count += rows
+        return rows, end
+
+FOLLOW_STATES = {}
+
+def follow_data(filename, operations=''):
+    """Incrementally refresh trend, prediction and metrics for a growing CSV"""
+    filepath = resolve_data_file(filename)
+    if filepath is None:
+        return f"❌ Data file not found: {filename}"
+    if is_partition_set(filepath):
+        return f"❌ Follow mode needs a single CSV file, not {filename}"
+    if compression_of(filepath):
+        return f"❌ Follow mode needs an uncompressed CSV, {filepath.name} is {compression_of(filepath)}"
+
+    try:
+        start_time = time.time()
+        key = str(filepath.resolve())
+        stat = filepath.stat()
+        state = FOLLOW_STATES.get(key)
+        restarted = (state is None or 'reset' in operations.lower() or
+                     state.identity != (stat.st_dev, stat.st_ino) or stat.st_size < state.offset)
+        if restarted:
+            state = FOLLOW_STATES[key] = FollowState(filepath)
+        rows, parsed_bytes = state.refresh(filepath)
+        refresh_time = time.time() - start_time
+
+        result = f"🔁 Following {filepath.name}{' (started from the beginning)' if restarted else ''}\n"
+        result += f"📥 New rows: {rows:,} ({parsed_bytes:,} bytes parsed) | Total rows: {state.row_count:,}\n"
+        result += f"⚡ Refresh time: {refresh_time:.3f} seconds\n\n"
+
+        columns = {name: c for name, c in state.columns.items() if c['stats'].count}
+        wanted = [s for s in ('trend', 'predict', 'metrics') if s in operations.lower()]
+        sections = []
+        if not wanted or 'trend' in wanted:
+            section = "📈 TRENDS DETECTED:\n"
+            for name, c in columns.items():
+                if c['stats'].count > 1:
+                    trend = c['last'] - c['first']
+                    percentage = (trend / c['first']) * 100 if c['first'] != 0 else 0
+                    section += f"   {name}: {trend:+.1f} ({percentage:+.1f}%)\n"
+            sections.append(section)
+        if not wanted or 'predict' in wanted:
+            section = "🔮 PREDICTIONS:\n"
+            for name, c in columns.items():
+                count = c['stats'].count
+                if count >= 3:
+                    prediction = c['last'] + (c['last'] - c['first']) / (count - 1)
+                    section += f"   Next {name}: {prediction:.1f}\n"
+            sections.append(section)
+        if not wanted or 'metrics' in wanted:
+            section = "📊 METRICS:\n"
+            for name, c in columns.items():
+                stats = c['stats']
+                section += (f"   {name}: Total {stats.total:,.2f} | Average {stats.mean:,.2f} | "
+                            f"Range {stats.minimum:,.2f} - {stats.maximum:,.2f} | Std Dev {stats.stdev:.2f}\n")
+            sections.append(section)
+        return (result + "\n".join(sections)).rstrip()
+
+    except Exception as e:
+        return f"❌ Follow error: {str(e)}"
+
+def follow_loop(filename, operations, interval):
+    """Print a refresh whenever new rows arrive, until interrupted"""
+    filepath = resolve_data_file(filename)
+    if filepath is None:
+        return f"❌ Data file not found: {filename}"
+    if is_partition_set(filepath) or compression_of(filepath):
+        return follow_data(filename, operations)
+    print(follow_data(filename, operations))
+    last_size = filepath.stat().st_size
+    try:
+        while True:
+            time.sleep(interval)
+            job_checkpoint()
+            size = filepath.stat().st_size
+            if size != last_size:
+                last_size = size
+                print("")
+                print(follow_data(filename, operations))
+    except KeyboardInterrupt:
+        pass
+    return f"⏹️ Stopped following {filepath.name}"
+
+GROUP_DISPLAY_LIMIT = 50
+
+def _match_column(names, wanted):
+    for name in names:
+        if name.lower() == wanted.lower():
+            return name
+    return None
+
+def grouped_metrics(filepath, key, streaming=False, where=None, partition=None):
+    """Per-group metrics for every numeric column, keyed by one column"""
+    if streaming:
+        with open_csv_rows(filepath, partition) as (names, _):
+            key_name = _match_column(names, key)
+        if key_name is None:
+            return f"❌ Column not found: {key} (available: {', '.join(names)})"
+        grouped, row_count = stream_grouped_stats(filepath, key_name, where=where, partition=partition)
+    else:
+        dataset, _ = query_dataset(filepath, where, partition=partition)
+        key_name = _match_column(dataset.column_names, key)
+        if key_name is None:
+            return f"❌ Column not found: {key} (available: {', '.join(dataset.column_names)})"
+        key_column = dataset.columns[key_name]
+        categories = None
+        if key_column.kind == 'category':
+            keys, categories = key_column.codes, key_column.categories
+        elif key_column.kind == 'number':
+            keys = [_format_csv_number(x) for x in key_column.values]
+        else:
+            keys = list(key_column)
+        grouped = GroupedStats()
+        grouped.update(keys, {c.name: c.values for c in dataset.numeric_columns()
+                              if c.name != key_name}, categories)
+        row_count = dataset.row_count
+
+    groups = grouped.groups()
+    result = f"📊 Metrics for {filepath.name} by {key_name}{f' where {where}' if where else ''} "
+    result += f"({len(groups):,} groups, {row_count:,} rows{', streamed' if streaming else ''}):\n\n"
+    for group, (key_value, count) in enumerate(groups[:GROUP_DISPLAY_LIMIT]):
+        result += f"{key_name.upper()} = {key_value or '(blank)'} ({count:,} rows):\n"
+        for name, stats in grouped.columns.items():
+            stats = stats[group]
+            if not stats.count:
+                continue
+            result += (f"   {name}: Total {stats.total:,.2f} | Average {stats.mean:,.2f} | "
+                       f"Range {stats.minimum:,.2f} - {stats.maximum:,.2f} | Std Dev {stats.stdev:.2f}\n")
+        result += "\n"
+    if len(groups) > GROUP_DISPLAY_LIMIT:
+        result += f"… {len(groups) - GROUP_DISPLAY_LIMIT:,} more groups not shown\n\n"
+
+    apl_code = f'''⍝ Grouped totals - one hash pass with the key operator
+{key_name.upper()}_TOTALS ← KEYS {{⍺,(+/⍵),≢⍵}}⌸ VALUES'''
+    result += f"APL equivalent:\n{apl_code}"
+    return result
+
+def distinct_counts(filepath, streaming=False, where=None, partition=None):
+    """Number of distinct values per column; category columns just count codes"""
+    if streaming:
+        with open_csv_rows(filepath, partition, where) as (names, reader):
+            predicate = compile_where(where, tuple(names)).test if where else None
+            seen = [set() for _ in names]
+            for chunk in _read_chunks(reader, len(names), predicate=predicate):
+                for values, cells in zip(seen, zip(*chunk)):
+                    values.update(cells)
+        counts = [(name, len(values), 'streamed') for name, values in zip(names, seen)]
+    else:
+        dataset, _ = query_dataset(filepath, where, partition=partition)
+        counts = []
+        for column in dataset.columns.values():
+            if column.kind == 'category':
+                counts.append((column.name, len(column.categories), 'dictionary'))
+            elif column.kind == 'number':
+                counts.append((column.name, len(set(column.present())), 'number'))
+            else:
+                counts.append((column.name, len(set(column)), 'text'))
+    result = f"🔢 Distinct values in {filepath.name}{f' where {where}' if where else ''}:\n"
+    for name, count, source in counts:
+        result += f"   {name}: {count:,} ({source})\n"
+    result += "\nAPL equivalent:\nDISTINCT ← ≢∪COLUMN"
+    return result
+
+def sampled_metrics(filepath, dataset, where=None):
+    """Metrics text with 95% confidence intervals for a sampled dataset"""
+    result = f"📊 Metrics for {filepath.name}{f' where {where}' if where else ''} (estimated from a sample, 95% CI):\n"
+    result += describe_sample(dataset) + "\n\n"
+    for column in dataset.numeric_columns():
+        values = column.present()
+        if not len(values):
+            continue
+        with PROFILER.span('sample estimates') as span:
+            population = dataset.sample['population'] * len(values) / dataset.row_count
+            estimate = sample_estimates(column, population, dataset.sample['clusters'])
+            span.rows = len(values)
+        stats = estimate['stats']
+        (q1, q1_low, q1_high), (median, low, high), (q3, q3_low, q3_high) = estimate['quartiles']
+        result += f"{column.name.upper()}:\n"
+        result += f"   Total: ≈{estimate['total'][0]:,.2f} ± {estimate['total'][1]:,.2f}\n"
+        result += f"   Average: ≈{estimate['mean'][0]:,.2f} ± {estimate['mean'][1]:,.2f}\n"
+        result += f"   Median: ≈{median:,.2f} ({low:,.2f} - {high:,.2f})\n"
+        result += f"   Quartiles: ≈{q1:,.2f} ({q1_low:,.2f} - {q1_high:,.2f}) - ≈{q3:,.2f} ({q3_low:,.2f} - {q3_high:,.2f})\n"
+        result += f"   Range in sample: {stats.minimum:,.2f} - {stats.maximum:,.2f}\n"
+        result += f"   Std Dev: ≈{estimate['stdev'][0]:.2f} ± {estimate['stdev'][1]:.2f}\n\n"
+    return result
+
+def calculate_metrics(filename, metrics, options=''):
+    """Calculate specific metrics from data"""
+    filepath = resolve_data_file(filename)
+    if filepath is None:
+        return f"❌ Data file not found: {filename}"
+    
+    try:
+        quartile_points = (0.25, 0.5, 0.75)
+        options, where = _split_where(options)
+        options, sample_rows, seed, refine = _split_sample(options)
+        options, partition = _split_partition(options)
+        # Files that would not fit in the dataset cache are streamed
+        streaming = (bool(re.search(r'\bstream\b', options, re.IGNORECASE)) or
+                     data_size(filepath) > DATASET_CACHE.budget_bytes)
+        group_by = re.search(r'\bby\s+(?:"([^"]+)"|(\S+))', options, re.IGNORECASE)
+        if group_by:
+            return grouped_metrics(filepath, group_by.group(1) or group_by.group(2), streaming,
+                                   where, partition)
+        if re.search(r'\bdistinct\b', metrics, re.IGNORECASE):
+            return distinct_counts(filepath, streaming, where, partition)
+        
+        # 'index' answers everything but the order statistics from a fresh
+        # zone map without reading the CSV
+        zones = None
+        indexed = (bool(re.search(r'\bindex\b', options, re.IGNORECASE)) and
+                   not (where or partition or sample_rows or is_partition_set(filepath)))
+        if indexed:
+            with PROFILER.span('read zone map'):
+                zones = load_zone_map(filepath)
+        
+        if sample_rows:
+            dataset = sample_dataset(filepath, sample_rows, seed, where, partition)
+            column_metrics = {}
+            result = sampled_metrics(filepath, dataset, where)
+            if refine:
+                exact = _refine_options(options, where, partition)
+                number = start_refinement(f"calculate {metrics} from {filepath.name}",
+                                          lambda: calculate_metrics(filename, metrics, exact))
+                result += f"🔄 Exact refinement #{number} running in the background: 'refine {number}' shows it\n\n"
+        elif zones is not None:
+            column_metrics = {}
+            with PROFILER.span('merge block statistics') as span:
+                for name in zones.columns:
+                    column_metrics[name] = (zones.column_stats(name), None, 0.0)
+                span.rows = zones.rows
+            result = (f"📊 Metrics for {filepath.name} (zone map: {zones.rows:,} rows "
+                      f"in {len(zones.blocks)} blocks, no rescan):\n\n")
+        elif streaming:
+            # 'exact' trades the sketch for sorted runs spilled to disk
+            spill = bool(re.search(r'\bexact\b', options, re.IGNORECASE))
+            with PROFILER.span('stream scan') as span:
+                columns, row_count = stream_column_stats(filepath, where=where, exact=spill,
+                                                         partition=partition)
+                span.rows, span.nbytes = row_count, data_size(filepath)
+            column_metrics = {}
+            with PROFILER.span('quantiles'):
+                for col, (stats, sketch) in columns.items():
+                    column_metrics[col] = (stats, sketch.quantiles(quartile_points), sketch.error_bound())
+                    if spill:
+                        sketch.close()
+            result = (f"📊 Metrics for {filepath.name}{f' where {where}' if where else ''} "
+                      f"(streamed {row_count:,} rows{', exact quantiles from spilled runs' if spill else ''}):\n\n")
+        else:
+            with PROFILER.span('load dataset') as span:
+                dataset, _ = query_dataset(filepath, where, partition=partition)
+                span.rows = dataset.row_count
+            column_metrics = {}
+            for column in dataset.numeric_columns():
+                with PROFILER.span('numeric filter') as span:
+                    values = column.present()
+                    span.rows = len(column)
+                with PROFILER.span('statistics') as span:
+                    stats = RunningStats()
+                    stats.update(values)
+                    span.rows = len(values)
+                with PROFILER.span('quantiles') as span:
+                    quartiles = exact_quantiles(values, quartile_points) if values else None
+                    span.rows = len(values)
+                column_metrics[column.name] = (stats, quartiles, 0.0)
+            result = f"📊 Metrics for {filepath.name}"
+            result += f" where {where} ({dataset.row_count:,} rows):\n\n" if where else ":\n\n"
+        
+        for col, (stats, quartiles, error) in column_metrics.items():
+            if stats.count:  # Only process columns with numeric data
+                approx = "≈" if error else ""
+                
+                result += f"{col.upper()}:\n"
+                result += f"   Total: {stats.total:,.2f}\n"
+                result += f"   Average: {stats.mean:,.2f}\n"
+                if quartiles is not None:
+                    q1, median, q3 = quartiles
+                    result += f"   Median: {approx}{median:,.2f}\n"
+                    result += f"   Quartiles: {approx}{q1:,.2f} - {approx}{q3:,.2f}\n"
+                result += f"   Range: {stats.minimum:,.2f} - {stats.maximum:,.2f}\n"
+                result += f"   Std Dev: {stats.stdev:.2f}\n"
+                if error:
+                    result += f"   Quantile rank error: ≤ {error:.2%}\n"
+                result += "\n"
+        if zones is not None:
+            result += "💡 Median and quartiles need a scan: drop 'index' to compute them\n\n"
+        elif indexed:
+            result += "💡 No fresh zone map to answer from: load data with 'index' to write one\n\n"
+        
+        # APL equivalent
+        apl_code = '''⍝ Metrics calculation - APL style
+TOTAL ← +/DATA
+AVERAGE ← TOTAL÷≢DATA
+MAXIMUM ← ⌈/DATA
+MINIMUM ← ⌊/DATA
+RANGE ← MAXIMUM - MINIMUM'''
+        
+        result += f"APL equivalent:\n{apl_code}"
+        
+        return result
+        
+    except Exception as e:
+        return f"❌ Calculation error: {str(e)}"
+
+def show_examples():
+    """Show available example programs"""
+    examples_dir = Path('examples')
+    if not examples_dir.exists():
+        return "No examples found. Run with --generate to create examples."
+    
+    apl_files = list(examples_dir.glob('*.apl'))
+    csv_files = list(examples_dir.glob('*.csv'))
+    
+    if not apl_files:
+        return "No example files found in examples/ directory."
+    
+    result = "📚 Available Examples:\n\n"
+    result += "APL Programs:\n"
+    for i, example in enumerate(apl_files, 1):
+        description = get_apl_description(example.name)
+        result += f"{i}. {example.name} - {description}\n"
+    
+    if csv_files:
+        result += "\nSample Data:\n"
+        for i, data_file in enumerate(csv_files, 1):
+            result += f"{i}. {data_file.name} - Sample dataset for analysis\n"
+    
+    result += "\nUsage Examples:\n"
+    result += '• load data "sales_data.csv"\n'
+    result += '• analyze data "customer_data.csv" trend predict\n'  
+    result += '• run "sales_analysis.apl"\n'
+    result += '• explain "matrix_operations.apl"'
+    
+    return result
+
+def get_apl_description(filename):
+    """Get description for APL example file"""
+    descriptions = {
+        'sales_analysis.apl': 'Revenue analysis and forecasting',
+        'matrix_operations.apl': 'Array manipulation and linear algebra',
+        'data_insights.apl': 'Customer segmentation and business intelligence'
+    }
+    return descriptions.get(filename, 'APL example program')
+
+# ---------------------------------------------------------------------------
+# APL evaluator
+#
+# Arrays are a shape tuple plus one flat row-major buffer. Numbers live in
+# array('d'), characters in a str, and mixed or nested data in a list whose
+# items are floats, 1-char strs or APLArrays. Scalar functions map over the
+# whole buffer at once instead of building one Python object per element.
+# ---------------------------------------------------------------------------
+
+APL_INDEX_ORIGIN = 1
+APL_PRINT_PRECISION = 10
+
+class APLError(Exception):
+    """Error raised while tokenizing, parsing or evaluating APL"""
+
+    def __init__(self, message, line=None):
+        super().__init__(message)
+        self.line = line
+
+    def __str__(self):
+        message = super().__str__()
+        return f"{message} (line {self.line})" if self.line else message
+
+class APLArray:
+    """APL array: shape tuple plus flat typed data buffer"""
+    __slots__ = ('shape', 'data')
+
+    def __init__(self, shape, data):
+        self.shape = shape
+        self.data = data
+
+    def __repr__(self):
+        return f"APLArray({self.shape!r}, {self.data!r})"
+
+def apl_scalar(value):
+    """Wrap a Python number or character as an APL scalar"""
+    if isinstance(value, str):
+        return APLArray((), value)
+    return APLArray((), array('d', (value,)))
+
+def apl_vector(values):
+    """Wrap a str or a sequence of numbers as an APL vector"""
+    if isinstance(values, str):
+        return APLArray((len(values),), values)
+    data = values if isinstance(values, array) else array('d', values)
+    return APLArray((len(data),), data)
+
+def _prod(shape):
+    result = 1
+    for dim in shape:
+        result *= dim
+    return result
+
+def _strides(shape):
+    strides = [1] * len(shape)
+    for k in range(len(shape) - 2, -1, -1):
+        strides[k] = strides[k + 1] * shape[k + 1]
+    return strides
+
+def _as_item(value):
+    """Turn a function result into an array item (scalars unwrap)"""
+    return value.data[0] if not value.shape else value
+
+def _item_array(item):
+    """Turn an array item back into an APLArray"""
+    if type(item) is APLArray:
+        return item
+    if type(item) is str:
+        return APLArray((), item)
+    return APLArray((), array('d', (item,)))
+
+def _pack(items):
+    """Store items in the tightest buffer: array('d'), str or list"""
+    if not items:
+        return array('d')
+    types = set(map(type, items))
+    if types <= {float, int, bool}:
+        return array('d', items)
+    if types == {str}:
+        return ''.join(items)
+    return [float(x) if type(x) in (int, bool) else x for x in items]
+
+def _retype(data, values):
+    """Build a buffer of the same kind as data from an iterable of items"""
+    if type(data) is array:
+        return array('d', values)
+    if type(data) is str:
+        return ''.join(values)
+    return list(values)
+
+def _fill_of(arr):
+    data = arr.data
+    if type(data) is str or (type(data) is list and data and type(data[0]) is str):
+        return ' '
+    return 0.0
+
+def _ints(arr):
+    """Integer values of a numeric array (DOMAIN ERROR otherwise)"""
+    data = arr.data
+    if type(data) is not array:
+        raise APLError('DOMAIN ERROR')
+    try:
+        ints = [int(x) for x in data]
+    except (OverflowError, ValueError):
+        raise APLError('DOMAIN ERROR')
+    if any(map(operator.ne, ints, data)):
+        raise APLError('DOMAIN ERROR')
+    return ints
+
+def _key(item):
+    """Hashable key for an array item"""
+    if type(item) is APLArray:
+        return (item.shape, tuple(map(_key, item.data)))
+    return item
+
+def _keys(arr):
+    return arr.data if type(arr.data) is not list else [_key(x) for x in arr.data]
+
+def _as_vector(arr):
+    return arr if len(arr.shape) == 1 else APLArray((len(arr.data),), arr.data)
+
+# Scalar (pervasive) functions
+
+def _signum(x):
+    return (x > 0) - (x < 0)
+
+def _reciprocal(x):
+    if x == 0:
+        raise APLError('DOMAIN ERROR')
+    return 1.0 / x
+
+def _divide(x, y):
+    if y == 0:
+        if x == 0:
+            return 1.0
+        raise APLError('DOMAIN ERROR')
+    return x / y
+
+def _residue(x, y):
+    return y if x == 0 else y % x
+
+def _log(x, y):
+    return math.log(y) / math.log(x)
+
+_CIRCLE_FUNCTIONS = {
+    0: lambda y: math.sqrt(1 - y * y), 1: math.sin, 2: math.cos, 3: math.tan,
+    4: lambda y: math.sqrt(1 + y * y), 5: math.sinh, 6: math.cosh, 7: math.tanh,
+    -1: math.asin, -2: math.acos, -3: math.atan, -4: lambda y: math.sqrt(y * y - 1),
+    -5: math.asinh, -6: math.acosh, -7: math.atanh,
+}
+
+def _circle(x, y):
+    if x not in _CIRCLE_FUNCTIONS:
+        raise APLError('DOMAIN ERROR')
+    return _CIRCLE_FUNCTIONS[int(x)](y)
+
+def _factorial(x):
+    if x >= 0 and x == int(x):
+        return float(math.factorial(int(x)))
+    return math.gamma(x + 1)
+
+def _binomial(x, y):
+    if x == int(x) and y == int(y) and 0 <= x and 0 <= y:
+        if x > y:
+            return 0.0
+        x, y = int(x), int(y)
+        return float(math.factorial(y) // (math.factorial(x) * math.factorial(y - x)))
+    return math.gamma(y + 1) / (math.gamma(x + 1) * math.gamma(y - x + 1))
+
+def _not(x):
+    if x == 0:
+        return 1.0
+    if x == 1:
+        return 0.0
+    raise APLError('DOMAIN ERROR')
+
+def _gcd(x, y):
+    if x != int(x) or y != int(y):
+        raise APLError('DOMAIN ERROR')
+    return float(math.gcd(int(x), int(y)))
+
+def _lcm(x, y):
+    if x == 0 or y == 0:
+        return 0.0
+    return x * y / _gcd(x, y)
+
+def _boolean(x):
+    if x != 0 and x != 1:
+        raise APLError('DOMAIN ERROR')
+    return x
+
+def _nand(x, y):
+    return float(not (_boolean(x) and _boolean(y)))
+
+def _nor(x, y):
+    return float(not (_boolean(x) or _boolean(y)))
+
+def _roll(x):
+    if x != int(x) or x < 0:
+        raise APLError('DOMAIN ERROR')
+    if x == 0:
+        return random.random()
+    return float(random.randint(APL_INDEX_ORIGIN, int(x) + APL_INDEX_ORIGIN - 1))
+
+_SCALAR_MONADIC = {
+    '+': float, '-': operator.neg, '×': _signum, '÷': _reciprocal,
+    '⌈': math.ceil, '⌊': math.floor, '|': abs, '*': math.exp, '⍟': math.log,
+    '○': lambda x: math.pi * x, '!': _factorial, '~': _not, '?': _roll,
+}
+
+_SCALAR_DYADIC = {
+    '+': operator.add, '-': operator.sub, '×': operator.mul, '÷': operator.truediv,
+    '⌈': max, '⌊': min, '|': _residue, '*': operator.pow, '⍟': _log,
+    '○': _circle, '!': _binomial,
+    '<': operator.lt, '≤': operator.le, '=': operator.eq,
+    '≥': operator.ge, '>': operator.gt, '≠': operator.ne,
+    '∧': _lcm, '∨': _gcd, '⍲': _nand, '⍱': _nor,
+}
+
+# Slower but total versions used when the fast operator raises
+_SCALAR_FALLBACK = {'÷': _divide}
+
+_CHARACTER_SCALARS = {'=', '≠'}
+
+_ARITHMETIC_ERRORS = (ArithmeticError, ValueError, TypeError)
+
+def _scalar_monadic(fn, w):
+    data = w.data
+    try:
+        if type(data) is array:
+            return APLArray(w.shape, array('d', map(fn, data)))
+        if type(data) is str:
+            raise APLError('DOMAIN ERROR')
+        items = []
+        for x in data:
+            if type(x) is APLArray:
+                items.append(_as_item(_scalar_monadic(fn, x)))
+            elif type(x) is str:
+                raise APLError('DOMAIN ERROR')
+            else:
+                items.append(fn(x))
+        return APLArray(w.shape, _pack(items))
+    except _ARITHMETIC_ERRORS:
+        raise APLError('DOMAIN ERROR')
+
+def _pervade(fn, x, y, chars):
+    if type(x) is APLArray or type(y) is APLArray:
+        return _as_item(_scalar_dyadic(fn, _item_array(x), _item_array(y), chars))
+    if not chars and (type(x) is str or type(y) is str):
+        raise APLError('DOMAIN ERROR')
+    return fn(x, y)
+
+def _scalar_dyadic(fn, a, w, chars=False, fallback=None, glyph=None):
+    """Apply a scalar function with scalar/singleton extension"""
+    da, dw = a.data, w.data
+    if a.shape == w.shape:
+        shape, left, right = w.shape, da, dw
+    elif len(da) == 1 and (len(dw) != 1 or len(a.shape) < len(w.shape)):
+        shape, left, right = w.shape, None, dw
+    elif len(dw) == 1:
+        shape, left, right = a.shape, da, None
+    else:
+        raise APLError('RANK ERROR' if len(a.shape) != len(w.shape) else 'LENGTH ERROR')
+    n = _prod(shape)
+
+    def operands():
+        return (itertools.repeat(da[0], n) if left is None else left,
+                itertools.repeat(dw[0], n) if right is None else right)
+
+    try:
+        if type(da) is array and type(dw) is array:
+            try:
+                if glyph in _BACKEND_OPS:
+                    return APLArray(shape, active_backend().elementwise(
+                        glyph, da[0] if left is None else left,
+                        dw[0] if right is None else right, n))
+                return APLArray(shape, array('d', map(fn, *operands())))
+            except ZeroDivisionError:
+                if fallback is None:
+                    raise
+                return APLArray(shape, array('d', map(fallback, *operands())))
+        fn = fallback or fn
+        return APLArray(shape, _pack([_pervade(fn, x, y, chars) for x, y in zip(*operands())]))
+    except _ARITHMETIC_ERRORS:
+        raise APLError('DOMAIN ERROR')
+
+# Structural functions
+
+def _offsets(plan):
+    """Flat offsets for a list of (indices, stride) pairs (None marks fill)"""
+    offsets = [0]
+    for indices, stride in plan:
+        if type(indices) is not range and None in indices:
+            offsets = [None if o is None or i is None else o + i * stride
+                       for o in offsets for i in indices]
+        elif any(o is None for o in offsets):
+            offsets = [None if o is None else o + i * stride for o in offsets for i in indices]
+        else:
+            offsets = [o + i * stride for o in offsets for i in indices]
+    return offsets
+
+def _select(arr, plan, fill=0.0):
+    """Gather elements of arr along a per-axis (indices, stride) plan"""
+    shape = tuple(len(indices) for indices, _ in plan)
+    data = arr.data
+    if len(plan) == 1 and plan[0][1] == 1 and type(plan[0][0]) is range:
+        indices = plan[0][0]
+        if not indices:
+            return APLArray(shape, data[0:0])
+        stop = indices[-1] + indices.step
+        return APLArray(shape, data[indices[0]:stop if stop >= 0 else None:indices.step])
+    offsets = _offsets(plan)
+    if None in offsets:
+        return APLArray(shape, _pack([fill if o is None else data[o] for o in offsets]))
+    return APLArray(shape, _retype(data, map(data.__getitem__, offsets)))
+
+def _gather(arr, axis_indices, fill=0.0):
+    return _select(arr, list(zip(axis_indices, _strides(arr.shape))), fill)
+
+def _shape_fn(w):
+    return apl_vector(w.shape)
+
+def _reshape(a, w):
+    shape = tuple(_ints(a))
+    if any(dim < 0 for dim in shape):
+        raise APLError('DOMAIN ERROR')
+    n = _prod(shape)
+    data = w.data
+    if not data:
+        data = _retype(data, [_fill_of(w)])
+    if len(data) < n:
+        data = data * (n // len(data) + 1)
+    return APLArray(shape, data[:n] if len(data) != n else data)
+
+def _ravel(w):
+    return APLArray((len(w.data),), w.data)
+
+def _table(w):
+    if not w.shape:
+        return APLArray((1, 1), w.data)
+    return APLArray((w.shape[0], _prod(w.shape[1:])), w.data)
+
+def _unify(da, dw):
+    if type(da) is type(dw):
+        return da, dw
+    return list(da), list(dw)
+
+def _catenate(a, w, first=False):
+    rank = max(len(a.shape), len(w.shape), 1)
+    axis = 0 if first else rank - 1
+
+    def extend(x, other):
+        if len(x.shape) == rank:
+            return x
+        if len(x.shape) == rank - 1:
+            return APLArray(x.shape[:axis] + (1,) + x.shape[axis:], x.data)
+        if not x.shape:
+            shape = other.shape[:axis] + (1,) + other.shape[axis + 1:]
+            return APLArray(shape, x.data * _prod(shape))
+        raise APLError('RANK ERROR')
+
+    a, w = extend(a, w), extend(w, a)
+    if a.shape[:axis] + a.shape[axis + 1:] != w.shape[:axis] + w.shape[axis + 1:]:
+        raise APLError('LENGTH ERROR')
+    da, dw = _unify(a.data, w.data)
+    post = _prod(a.shape[axis + 1:])
+    span_a, span_w = a.shape[axis] * post, w.shape[axis] * post
+    pre = _prod(a.shape[:axis])
+    if pre == 1:
+        data = da + dw
+    else:
+        data = da[0:0]
+        for p in range(pre):
+            data += da[p * span_a:(p + 1) * span_a] + dw[p * span_w:(p + 1) * span_w]
+    shape = a.shape[:axis] + (a.shape[axis] + w.shape[axis],) + a.shape[axis + 1:]
+    return APLArray(shape, data)
+
+def _catenate_first(a, w):
+    return _catenate(a, w, first=True)
+
+def _iota(w):
+    n = _ints(w)
+    if len(n) != 1 or n[0] < 0:
+        raise APLError('DOMAIN ERROR')
+    return apl_vector(array('d', range(APL_INDEX_ORIGIN, n[0] + APL_INDEX_ORIGIN)))
+
+def _index_of(a, w):
+    if len(a.shape) > 1:
+        raise APLError('RANK ERROR')
+    keys = _keys(a)
+    table = dict(zip(reversed(keys), range(len(keys) - 1, -1, -1)))
+    missing = len(keys)
+    origin = APL_INDEX_ORIGIN
+    return APLArray(w.shape, array('d', [table.get(k, missing) + origin for k in _keys(w)]))
+
+def _take_indices(count, dim):
+    if count >= 0:
+        return range(count) if count <= dim else list(range(dim)) + [None] * (count - dim)
+    count = -count
+    return range(dim - count, dim) if count <= dim else [None] * (count - dim) + list(range(dim))
+
+def _take(a, w):
+    counts = _ints(a)
+    if not w.shape:
+        w = APLArray((1,) * len(counts), w.data)
+    if len(counts) > len(w.shape):
+        raise APLError('RANK ERROR')
+    axis_indices = [_take_indices(counts[k], dim) if k < len(counts) else range(dim)
+                    for k, dim in enumerate(w.shape)]
+    return _gather(w, axis_indices, _fill_of(w))
+
+def _drop(a, w):
+    counts = _ints(a)
+    if not w.shape:
+        w = APLArray((1,) * len(counts), w.data)
+    if len(counts) > len(w.shape):
+        raise APLError('RANK ERROR')
+    axis_indices = []
+    for k, dim in enumerate(w.shape):
+        count = counts[k] if k < len(counts) else 0
+        if count >= 0:
+            axis_indices.append(range(min(count, dim), dim))
+        else:
+            axis_indices.append(range(0, max(dim + count, 0)))
+    return _gather(w, axis_indices)
+
+def _mix(w):
+    if type(w.data) is not list:
+        return w
+    items = [_item_array(x) for x in w.data]
+    rank = max(len(x.shape) for x in items)
+    if rank == 0:
+        return w
+    if rank == 1:
+        width = max(_prod(x.shape) for x in items)
+        rows = []
+        for x in items:
+            rows.extend(x.data)
+            rows.extend([_fill_of(x)] * (width - len(x.data)))
+        return APLArray(w.shape + (width,), _pack(rows))
+    shape = items[0].shape
+    if any(x.shape != shape for x in items):
+        raise APLError('NONCE ERROR')
+    data = []
+    for x in items:
+        data.extend(x.data)
+    return APLArray(w.shape + shape, _pack(data))
+
+def _split(w):
+    if not w.shape:
+        return w
+    width = w.shape[-1]
+    items = [APLArray((width,), w.data[i:i + width]) for i in range(0, len(w.data), width)]
+    return APLArray(w.shape[:-1], items)
+
+def _reverse(w, first=False):
+    if not w.shape:
+        return w
+    axis = 0 if first else len(w.shape) - 1
+    axis_indices = [range(dim) for dim in w.shape]
+    axis_indices[axis] = range(w.shape[axis] - 1, -1, -1)
+    return _gather(w, axis_indices)
+
+def _reverse_first(w):
+    return _reverse(w, first=True)
+
+def _rotate(a, w, first=False):
+    shift = _ints(a)
+    if len(shift) != 1:
+        raise APLError('NONCE ERROR')
+    if not w.shape:
+        return w
+    axis = 0 if first else len(w.shape) - 1
+    n = w.shape[axis]
+    axis_indices = [range(dim) for dim in w.shape]
+    axis_indices[axis] = [(i + shift[0]) % n for i in range(n)]
+    return _gather(w, axis_indices)
+
+def _rotate_first(a, w):
+    return _rotate(a, w, first=True)
+
+def _transpose(w):
+    strides = _strides(w.shape)
+    plan = [(range(w.shape[k]), strides[k]) for k in range(len(w.shape) - 1, -1, -1)]
+    return _select(w, plan) if plan else w
+
+def _dyadic_transpose(a, w):
+    axes = [k - APL_INDEX_ORIGIN for k in _ints(a)]
+    if len(axes) != len(w.shape):
+        raise APLError('LENGTH ERROR')
+    rank = max(axes) + 1 if axes else 0
+    if set(axes) != set(range(rank)):
+        raise APLError('DOMAIN ERROR')
+    strides = _strides(w.shape)
+    plan = []
+    for target in range(rank):
+        sources = [k for k, axis in enumerate(axes) if axis == target]
+        dim = min(w.shape[k] for k in sources)
+        plan.append((range(dim), sum(strides[k] for k in sources)))
+    return _select(w, plan) if plan else w
+
+def _grade(w, down=False):
+    if not w.shape:
+        raise APLError('RANK ERROR')
+    if type(w.data) is list:
+        raise APLError('DOMAIN ERROR')
+    n = w.shape[0]
+    data = w.data
+    if len(w.shape) == 1 and type(data) is array:
+        if sort_fits(n, 2 * SORT_ITEM_BYTES):
+            order = active_backend().grade(data, down)
+        else:
+            order = external_grade(data, down)
+    else:
+        if len(w.shape) == 1:
+            key = data.__getitem__
+        else:
+            width = _prod(w.shape[1:])
+            key = lambda i: data[i * width:(i + 1) * width]
+        order = sorted(range(n), key=key, reverse=down)
+    return apl_vector(array('d', [i + APL_INDEX_ORIGIN for i in order]))
+
+def _grade_down(w):
+    return _grade(w, down=True)
+
+def _deal(a, w):
+    count, limit = _ints(a), _ints(w)
+    if len(count) != 1 or len(limit) != 1 or not 0 <= count[0] <= limit[0]:
+        raise APLError('DOMAIN ERROR')
+    origin = APL_INDEX_ORIGIN
+    return apl_vector(array('d', random.sample(range(origin, limit[0] + origin), count[0])))
+
+def _tally(w):
+    return apl_scalar(w.shape[0] if w.shape else 1)
+
+def _depth(w):
+    if type(w.data) is not list:
+        return 0 if not w.shape else 1
+    deepest = 0
+    for x in w.data:
+        if type(x) is APLArray:
+            deepest = max(deepest, _depth(x))
+    return deepest + 1
+
+def _match(a, w):
+    if a.shape != w.shape:
+        return False
+    if type(a.data) is type(w.data) and type(a.data) is not list:
+        return a.data == w.data
+    return list(_keys(a)) == list(_keys(w))
+
+def _first(w):
+    if not w.data:
+        return apl_scalar(_fill_of(w))
+    return _item_array(w.data[0])
+
+def _pick(a, w):
+    for i in _ints(a):
+        if len(w.shape) != 1:
+            raise APLError('RANK ERROR')
+        i -= APL_INDEX_ORIGIN
+        if not 0 <= i < len(w.data):
+            raise APLError('INDEX ERROR')
+        w = _item_array(w.data[i])
+    return w
+
+def _enclose(w):
+    if not w.shape and type(w.data) is not list:
+        return w
+    return APLArray((), [w])
+
+def _enlist(w):
+    if type(w.data) is not list:
+        return _ravel(w)
+    items = []
+    for x in w.data:
+        if type(x) is APLArray:
+            items.extend(_enlist(x).data)
+        else:
+            items.append(x)
+    return apl_vector_items(items)
+
+def apl_vector_items(items):
+    """Build an APL vector from array items"""
+    return APLArray((len(items),), _pack(items))
+
+def _member(a, w):
+    members = set(_keys(w))
+    return APLArray(a.shape, array('d', [k in members for k in _keys(a)]))
+
+def _unique(w):
+    w = _as_vector(w)
+    seen = {}
+    for k, x in zip(_keys(w), w.data):
+        seen.setdefault(k, x)
+    return APLArray((len(seen),), _retype(w.data, seen.values()))
+
+def _union(a, w):
+    a, w = _as_vector(a), _as_vector(w)
+    members = set(_keys(a))
+    extra = [x for k, x in zip(_keys(w), w.data) if k not in members]
+    return _catenate(a, apl_vector_items(extra)) if extra else a
+
+def _intersect(a, w):
+    return _compress_keys(_as_vector(a), set(_keys(w)), True)
+
+def _compress_keys(a, members, keep):
+    data = _retype(a.data, (x for k, x in zip(_keys(a), a.data) if (k in members) == keep))
+    return APLArray((len(data),), data)
+
+def _without(a, w):
+    a = _as_vector(a)
+    return _compress_keys(a, set(_keys(w)), False)
+
+def _where(w):
+    indices = []
+    for i, count in enumerate(_ints(_as_vector(w))):
+        if count < 0:
+            raise APLError('DOMAIN ERROR')
+        indices.extend([i + APL_INDEX_ORIGIN] * count)
+    return apl_vector(indices)
+
+def _encode(a, w):
+    radices = _ints(_as_vector(a)) if a.data else []
+    values = list(w.data)
+    if type(w.data) is not array:
+        raise APLError('DOMAIN ERROR')
+    digits = [[0.0] * len(values) for _ in radices]
+    for j, value in enumerate(values):
+        for k in range(len(radices) - 1, -1, -1):
+            radix = radices[k]
+            if radix == 0:
+                digits[k][j], value = value, 0
+            else:
+                digit = value % radix
+                digits[k][j], value = digit, (value - digit) / radix
+    data = array('d')
+    for row in digits:
+        data.extend(row)
+    return APLArray((len(radices),) + w.shape, data)
+
+def _decode(a, w):
+    if type(w.data) is not array or type(a.data) is not array:
+        raise APLError('DOMAIN ERROR')
+    n = w.shape[0] if w.shape else 1
+    bases = list(a.data) * n if len(a.data) == 1 else list(a.data)
+    if len(bases) != n:
+        raise APLError('LENGTH ERROR')
+    weights = [1.0] * n
+    for k in range(n - 2, -1, -1):
+        weights[k] = weights[k + 1] * bases[k + 1]
+    post = _prod(w.shape[1:])
+    data = w.data
+    result = [sum(data[k * post + j] * weights[k] for k in range(n)) for j in range(post)]
+    return APLArray(w.shape[1:], array('d', result))
+
+def _format_number(x):
+    x = float(x)
+    if math.isinf(x):
+        return '∞' if x > 0 else '¯∞'
+    if x.is_integer() and abs(x) < 1e15:
+        text = str(int(x))
+    else:
+        text = '%.*g' % (APL_PRINT_PRECISION, x)
+        if 'e' in text:
+            mantissa, exponent = text.split('e')
+            text = f"{mantissa}E{int(exponent)}"
+    return text.replace('-', '¯')
+
+def _format_item(x):
+    if type(x) is str:
+        return x
+    if type(x) is APLArray:
+        return ' '.join(_format_lines(x))
+    return _format_number(x)
+
+def _format_mixed(data):
+    parts = []
+    previous_char = False
+    for x in data:
+        is_char = type(x) is str
+        if parts and not (is_char and previous_char):
+            parts.append(' ')
+        parts.append(_format_item(x))
+        previous_char = is_char
+    return ''.join(parts)
+
+def _format_lines(w):
+    """Display form of an array as a list of text lines"""
+    data = w.data
+    if len(w.shape) <= 1:
+        if type(data) is str:
+            return [data]
+        if type(data) is array:
+            return [' '.join(map(_format_number, data))]
+        return [_format_mixed(data)]
+    rows, cols = w.shape[-2], w.shape[-1]
+    planes = _prod(w.shape[:-2])
+    lines = []
+    if type(data) is str:
+        for r in range(planes * rows):
+            if r and r % rows == 0:
+                lines.append('')
+            lines.append(data[r * cols:(r + 1) * cols])
+        return lines
+    cells = [_format_item(x) for x in data]
+    widths = [max((len(cells[r * cols + c]) for r in range(planes * rows)), default=0)
+              for c in range(cols)]
+    for r in range(planes * rows):
+        if r and r % rows == 0:
+            lines.append('')
+        lines.append(' '.join(cells[r * cols + c].rjust(widths[c]) for c in range(cols)))
+    return lines
+
+def _format_fn(w):
+    lines = _format_lines(w)
+    if len(w.shape) <= 1:
+        return apl_vector(lines[0] if lines else '')
+    width = max(map(len, lines), default=0)
+    return APLArray((len(lines), width), ''.join(line.ljust(width) for line in lines))
+
+def _format_fixed(a, w):
+    spec = _ints(a)
+    if len(spec) not in (1, 2) or type(w.data) is not array:
+        raise APLError('DOMAIN ERROR')
+    width, decimals = (0, spec[0]) if len(spec) == 1 else spec
+    cells = [f"{x:{width}.{decimals}f}".replace('-', '¯') for x in w.data]
+    return apl_vector(' '.join(cells) if width == 0 else ''.join(cells))
+
+def _replicate(a, w, first=False, expand=False):
+    if not w.shape:
+        w = APLArray((1,), w.data)
+    axis = 0 if first else len(w.shape) - 1
+    n = w.shape[axis]
+    counts = _ints(a)
+    if expand:
+        indices, j = [], 0
+        for count in counts:
+            if count == 0:
+                indices.append(None)
+            else:
+                indices.extend([j] * count)
+                j += 1
+        if j != n:
+            raise APLError('LENGTH ERROR')
+    else:
+        if len(counts) == 1:
+            counts = counts * n
+        elif n == 1:
+            w = _gather(w, [range(d) if k != axis else [0] * len(counts)
+                            for k, d in enumerate(w.shape)])
+        elif len(counts) != n:
+            raise APLError('LENGTH ERROR')
+        if len(w.shape) == 1 and all(c == 0 or c == 1 for c in counts):
+            data = _retype(w.data, itertools.compress(w.data, counts))
+            return APLArray((len(data),), data)
+        indices = []
+        for i, count in enumerate(counts):
+            indices.extend([i] * count if count >= 0 else [None] * -count)
+    axis_indices = [range(dim) for dim in w.shape]
+    axis_indices[axis] = indices
+    return _gather(w, axis_indices, _fill_of(w))
+
+def _replicate_first(a, w):
+    return _replicate(a, w, first=True)
+
+def _expand(a, w):
+    return _replicate(a, w, expand=True)
+
+def _expand_first(a, w):
+    return _replicate(a, w, first=True, expand=True)
+
+def _identity(w):
+    return w
+
+def _left(a, w):
+    return a
+
+def _right(a, w):
+    return w
+
+_STRUCTURAL_MONADIC = {
+    '⍴': _shape_fn, ',': _ravel, '⍪': _table, '⍳': _iota, '↑': _mix, '↓': _split,
+    '⌽': _reverse, '⊖': _reverse_first, '⍉': _transpose, '⍋': _grade, '⍒': _grade_down,
+    '∊': _enlist, '∪': _unique, '⊂': _enclose, '⊃': _first,
+    '≡': lambda w: apl_scalar(_depth(w)), '≢': _tally, '⍕': _format_fn,
+    '⊢': _identity, '⊣': _identity, '⍸': _where,
+}
+
+_STRUCTURAL_DYADIC = {
+    '⍴': _reshape, ',': _catenate, '⍪': _catenate_first, '⍳': _index_of,
+    '↑': _take, '↓': _drop, '⌽': _rotate, '⊖': _rotate_first, '⍉': _dyadic_transpose,
+    '∊': _member, '∪': _union, '∩': _intersect, '~': _without, '⊃': _pick,
+    '≡': lambda a, w: apl_scalar(_match(a, w)),
+    '≢': lambda a, w: apl_scalar(not _match(a, w)),
+    '⍕': _format_fixed, '⊤': _encode, '⊥': _decode, '⊢': _right, '⊣': _left, '?': _deal,
+    '/': _replicate, '⌿': _replicate_first, '\\': _expand, '⍀': _expand_first,
+}
+
+def _primitive(glyph):
+    """Build the callable for a primitive function glyph"""
+    if glyph in _SCALAR_MONADIC:
+        raw = _SCALAR_MONADIC[glyph]
+        monadic = lambda w: _scalar_monadic(raw, w)
+    else:
+        monadic = _STRUCTURAL_MONADIC.get(glyph)
+    if glyph in _SCALAR_DYADIC:
+        raw2 = _SCALAR_DYADIC[glyph]
+        chars = glyph in _CHARACTER_SCALARS
+        fallback = _SCALAR_FALLBACK.get(glyph)
+        dyadic = lambda a, w: _scalar_dyadic(raw2, a, w, chars, fallback, glyph)
+    else:
+        dyadic = _STRUCTURAL_DYADIC.get(glyph)
+
+    def fn(w, a=None):
+        if a is None:
+            if monadic is None:
+                raise APLError('VALENCE ERROR')
+            return monadic(w)
+        if dyadic is None:
+            raise APLError('VALENCE ERROR')
+        return dyadic(a, w)
+    fn.glyph = glyph
+    return fn
+
+_PRIMITIVES = {glyph: _primitive(glyph) for glyph in
+               set(_SCALAR_MONADIC) | set(_SCALAR_DYADIC) |
+               set(_STRUCTURAL_MONADIC) | set(_STRUCTURAL_DYADIC)}
+
+# Operators
+
+_FAST_REDUCE = {'+': sum, '⌈': max, '⌊': min,
+                '×': lambda xs: functools.reduce(operator.mul, xs, 1.0)}
+
+_REDUCE_IDENTITY = {
+    '+': 0.0, '-': 0.0, '×': 1.0, '÷': 1.0, '|': 0.0, '*': 1.0, '!': 1.0,
+    '⌈': -sys.float_info.max, '⌊': sys.float_info.max,
+    '<': 0.0, '≤': 1.0, '=': 1.0, '≥': 1.0, '>': 0.0, '≠': 0.0, '∧': 1.0, '∨': 0.0,
+}
+
+_ASSOCIATIVE = {'+', '×', '⌈', '⌊', '∧', '∨'}
+
+def _raw_scalar(glyph):
+    return _SCALAR_FALLBACK.get(glyph) or _SCALAR_DYADIC.get(glyph)
+
+def _fold_raw(raw, values):
+    """Right-to-left fold of a scalar function over Python numbers"""
+    return functools.reduce(lambda acc, x: raw(x, acc), reversed(values))
+
+def _fold_items(f, values):
+    """Right-to-left fold of any APL function over array items"""
+    acc = _item_array(values[-1])
+    for x in reversed(values[:-1]):
+        acc = f(acc, _item_array(x))
+    return _as_item(acc)
+
+def _axis_segments(w, first):
+    """Yield (positions, segment) along the reduction axis of w"""
+    axis = 0 if first else len(w.shape) - 1
+    n = w.shape[axis]
+    post = _prod(w.shape[axis + 1:])
+    span = n * post
+    data = w.data
+    for p in range(_prod(w.shape[:axis])):
+        base = p * span
+        for q in range(post):
+            yield range(base + q, base + span, post), data[base + q:base + span:post]
+
+def _reduce(f, w, first=False):
+    if not w.shape:
+        return w
+    glyph = getattr(f, 'glyph', None)
+    axis = 0 if first else len(w.shape) - 1
+    shape = w.shape[:axis] + w.shape[axis + 1:]
+    if w.shape[axis] == 0:
+        if glyph not in _REDUCE_IDENTITY:
+            raise APLError('DOMAIN ERROR')
+        return APLArray(shape, array('d', [_REDUCE_IDENTITY[glyph]]) * _prod(shape))
+    numeric = type(w.data) is array
+    fast = numeric and glyph in _FAST_REDUCE
+    raw = _raw_scalar(glyph) if numeric else None
+    try:
+        if fast:
+            results = [active_backend().reduce(glyph, segment) for _, segment in _axis_segments(w, first)]
+        elif raw:
+            results = [_fold_raw(raw, segment) for _, segment in _axis_segments(w, first)]
+        else:
+            results = [_fold_items(f, segment) for _, segment in _axis_segments(w, first)]
+    except _ARITHMETIC_ERRORS:
+        raise APLError('DOMAIN ERROR')
+    return APLArray(shape, _pack(results))
+
+def _scan(f, w, first=False):
+    if not w.shape:
+        return w
+    glyph = getattr(f, 'glyph', None)
+    raw = _raw_scalar(glyph) if type(w.data) is array else None
+    out = [None] * len(w.data)
+    try:
+        for positions, segment in _axis_segments(w, first):
+            if raw and glyph in _FAST_REDUCE:
+                values = active_backend().scan(glyph, segment)
+            elif raw and glyph in _ASSOCIATIVE:
+                values = itertools.accumulate(segment, raw)
+            elif raw:
+                values = [_fold_raw(raw, segment[:k + 1]) for k in range(len(segment))]
+            else:
+                values = [_fold_items(f, segment[:k + 1]) for k in range(len(segment))]
+            for position, value in zip(positions, values):
+                out[position] = value
+    except _ARITHMETIC_ERRORS:
+        raise APLError('DOMAIN ERROR')
+    return APLArray(w.shape, _pack(out))
+
+def _reduce_operator(f, first=False, scan=False):
+    if not callable(f):
+        raise APLError('SYNTAX ERROR')
+
+    def derived(w, a=None):
+        if a is not None:
+            if scan:
+                raise APLError('NONCE ERROR')
+            return _windowed_reduce(f, a, w, first)
+        return _scan(f, w, first) if scan else _reduce(f, w, first)
+    return derived
+
+def _window_values(f, glyph, segment, size, count, numeric):
+    """Reductions of the count windows of |size| items in one segment"""
+    width = abs(size)
+    if numeric and glyph == '+':
+        return rolling_sums(segment, width)
+    if numeric and glyph in ('⌈', '⌊'):
+        return rolling_extremes(segment, width, glyph == '⌈')
+    windows = (segment[i:i + width] for i in range(count))
+    if size < 0:
+        windows = (window[::-1] for window in windows)
+    raw = _raw_scalar(glyph) if numeric else None
+    if raw:
+        return [_fold_raw(raw, window) for window in windows]
+    return [_fold_items(f, window) for window in windows]
+
+def _windowed_reduce(f, a, w, first=False):
+    """N f/ w (n-wise reduction): f/ over every window of N adjacent items"""
+    if type(a.data) is not array or len(a.data) != 1 or a.data[0] != int(a.data[0]):
+        raise APLError('DOMAIN ERROR')
+    size = int(a.data[0])
+    if not w.shape:
+        w = APLArray((1,), w.data)
+    axis = 0 if first else len(w.shape) - 1
+    count = w.shape[axis] - abs(size) + 1
+    if count < 0:
+        raise APLError('LENGTH ERROR')
+    shape = w.shape[:axis] + (count,) + w.shape[axis + 1:]
+    glyph = getattr(f, 'glyph', None)
+    if size == 0:
+        if glyph not in _REDUCE_IDENTITY:
+            raise APLError('DOMAIN ERROR')
+        return APLArray(shape, array('d', [_REDUCE_IDENTITY[glyph]]) * _prod(shape))
+    numeric = type(w.data) is array
+    post = _prod(w.shape[axis + 1:])
+    out = [None] * _prod(shape)
+    try:
+        for s, (_, segment) in enumerate(_axis_segments(w, first)):
+            p, q = divmod(s, post)
+            base = p * count * post + q
+            out[base:base + count * post:post] = _window_values(f, glyph, segment, size,
+                                                                count, numeric)
+    except _ARITHMETIC_ERRORS:
+        raise APLError('DOMAIN ERROR')
+    return APLArray(shape, _pack(out))
+
+def _each(f):
+    if not callable(f):
+        raise APLError('SYNTAX ERROR')
+
+    def derived(w, a=None):
+        if a is None:
+            items = [_as_item(f(_item_array(x))) for x in w.data]
+            return APLArray(w.shape, _pack(items))
+        if a.shape == w.shape:
+            shape, pairs = w.shape, zip(a.data, w.data)
+        elif len(a.data) == 1:
+            shape, pairs = w.shape, zip(itertools.repeat(a.data[0]), w.data)
+        elif len(w.data) == 1:
+            shape, pairs = a.shape, zip(a.data, itertools.repeat(w.data[0]))
+        else:
+            raise APLError('LENGTH ERROR')
+        items = [_as_item(f(_item_array(y), _item_array(x))) for x, y in pairs]
+        return APLArray(shape, _pack(items))
+    return derived
+
+def _commute(f):
+    def derived(w, a=None):
+        return f(w, w) if a is None else f(a, w)
+    return derived
+
+_COMPARISONS = set('<≤=≥>≠')
+
+def _inner_cell(f, g, f_glyph, g_glyph, numeric, n):
+    """Per-pair kernel for f.g, specialised on the operand glyphs"""
+    raw_f, raw_g = _raw_scalar(f_glyph), _raw_scalar(g_glyph)
+    if numeric and raw_g:
+        if f_glyph == '+' and g_glyph == '×':
+            mul = operator.mul
+            return lambda row, col: sum(map(mul, row, col))
+        if f_glyph in ('∧', '∨') and g_glyph in _COMPARISONS:
+            test = all if f_glyph == '∧' else any
+            return lambda row, col: float(test(map(raw_g, row, col)))
+        if f_glyph in _FAST_REDUCE:
+            fast = _FAST_REDUCE[f_glyph]
+            return lambda row, col: fast(map(raw_g, row, col))
+        if raw_f:
+            return lambda row, col: _fold_raw(raw_f, list(map(raw_g, row, col)))
+    wrap = (lambda items: array('d', items)) if numeric else (lambda items: items)
+    return lambda row, col: _as_item(_reduce(f, g(APLArray((n,), wrap(col)),
+                                                    APLArray((n,), wrap(row)))))
+
+def _inner_product(f, g):
+    """Derived function for f.g (inner product)"""
+    f_glyph, g_glyph = getattr(f, 'glyph', None), getattr(g, 'glyph', None)
+
+    def derived(w, a=None):
+        if a is None:
+            raise APLError('VALENCE ERROR')
+        if not a.shape:
+            a = APLArray((w.shape[0] if w.shape else 1,), a.data * (w.shape[0] if w.shape else 1))
+        if not w.shape:
+            w = APLArray((a.shape[-1],), w.data * a.shape[-1])
+        n = a.shape[-1]
+        if w.shape[0] != n:
+            raise APLError('LENGTH ERROR')
+        shape = a.shape[:-1] + w.shape[1:]
+        m, p = _prod(a.shape[:-1]), _prod(w.shape[1:])
+        if n == 0:
+            if f_glyph not in _REDUCE_IDENTITY:
+                raise APLError('DOMAIN ERROR')
+            return APLArray(shape, array('d', [_REDUCE_IDENTITY[f_glyph]]) * (m * p))
+        numeric = type(a.data) is array and type(w.data) is array
+        if numeric and f_glyph == '+' and g_glyph == '×':
+            return APLArray(shape, active_backend().matmul(a.data, w.data, m, n, p))
+        # Transposed right operand: every cell walks two contiguous lists
+        data_a = a.data.tolist() if numeric else a.data
+        data_w = w.data.tolist() if numeric else w.data
+        rows = [data_a[i * n:(i + 1) * n] for i in range(m)]
+        cols = [data_w[j::p] for j in range(p)]
+        try:
+            out = _inner_tiles(rows, cols, _inner_cell(f, g, f_glyph, g_glyph, numeric, n))
+        except _ARITHMETIC_ERRORS:
+            raise APLError('DOMAIN ERROR')
+        return APLArray(shape, _pack(out))
+    return derived
+
+def _outer_product(f):
+    """Derived function for ∘.f (outer product)"""
+    def derived(w, a=None):
+        if a is None:
+            raise APLError('VALENCE ERROR')
+        shape = a.shape + w.shape
+        na, nw = len(a.data), len(w.data)
+        left = APLArray(shape, _retype(a.data, (x for x in a.data for _ in range(nw))))
+        if getattr(f, 'glyph', None) in _SCALAR_DYADIC:
+            return f(APLArray(shape, w.data * na), left)
+        items = [_as_item(f(_item_array(y), _item_array(x)))
+                 for x, y in zip(left.data, w.data * na)]
+        return APLArray(shape, _pack(items))
+    return derived
+
+def _compose(f, g):
+    if not callable(f):
+        return lambda w, a=None: g(w, f)
+    if not callable(g):
+        return lambda w, a=None: f(g, w)
+    return lambda w, a=None: f(g(w)) if a is None else f(g(w), a)
+
+def _power(f, g):
+    def derived(w, a=None):
+        if callable(g):
+            while True:
+                result = f(w) if a is None else f(w, a)
+                done = g(w, result)
+                if done.data and done.data[0]:
+                    return result
+                w = result
+        times = _ints(g)
+        if len(times) != 1 or times[0] < 0:
+            raise APLError('DOMAIN ERROR')
+        for _ in range(times[0]):
+            w = f(w) if a is None else f(w, a)
+        return w
+    return derived
+
+def _atop(f, g):
+    return lambda w, a=None: f(g(w) if a is None else g(w, a))
+
+def _fork(f, g, h):
+    def derived(w, a=None):
+        right = h(w) if a is None else h(w, a)
+        if not callable(f):
+            return g(right, f)
+        return g(right, f(w) if a is None else f(w, a))
+    return derived
+
+def _key_operator(f):
+    """Derived function for f⌸ (key): one hash pass groups the major cells"""
+    if not callable(f):
+        raise APLError('SYNTAX ERROR')
+
+    def derived(w, a=None):
+        source = w if a is None else a
+        keys = source if len(source.shape) > 1 else _as_vector(source)
+        count = keys.shape[0]
+        if a is not None and (w.shape[0] if w.shape else 1) != count:
+            raise APLError('LENGTH ERROR')
+        width = _prod(keys.shape[1:])
+        flat = _keys(keys)
+        if width == 1:
+            cell_keys = flat
+        else:
+            cell_keys = [tuple(flat[i * width:(i + 1) * width]) for i in range(count)]
+        # Vectors are grouped by value; other cells by row number
+        by_value = a is not None and len(w.shape) == 1
+        if a is None:
+            entries = range(APL_INDEX_ORIGIN, count + APL_INDEX_ORIGIN)
+        else:
+            entries = w.data if by_value else range(count)
+        groups = defaultdict(list)
+        first = {}
+        for row, k, entry in zip(range(count), cell_keys, entries):
+            group = groups[k]
+            if not group:
+                first[k] = row
+            group.append(entry)
+        results = []
+        for k, group in groups.items():
+            key = APLArray(keys.shape[1:], _major_cells(keys, [first[k]]).data)
+            if a is None:
+                values = apl_vector(group)
+            elif by_value:
+                values = APLArray((len(group),), _retype(w.data, group))
+            else:
+                values = _major_cells(w if w.shape else APLArray((1,), w.data), group)
+            results.append(f(values, key))
+        items = apl_vector_items([_as_item(result) for result in results])
+        # Each result is one major cell of the answer; scalar results stay items
+        return _mix(items) if any(result.shape for result in results) else items
+    return derived
+
+def _major_cells(arr, rows):
+    return _gather(arr, [rows] + [range(dim) for dim in arr.shape[1:]])
+
+_MONADIC_OPERATORS = {
+    '/': lambda f: _reduce_operator(f),
+    '⌿': lambda f: _reduce_operator(f, first=True),
+    '\\': lambda f: _reduce_operator(f, scan=True),
+    '⍀': lambda f: _reduce_operator(f, first=True, scan=True),
+    '¨': _each,
+    '⍨': _commute,
+    '⌸': _key_operator,
+}
+
+_DYADIC_OPERATORS = {'.': _inner_product, '∘': _compose, '⍣': _power}
+
+# System functions
+
+def _series(w):
+    """Numeric vector argument of a time-series system function"""
+    if len(w.shape) > 1:
+        raise APLError('RANK ERROR')
+    if type(w.data) is not array:
+        raise APLError('DOMAIN ERROR')
+    return w.data
+
+def _system_ema(w, a=None):
+    """α ⎕EMA V: exponential moving average"""
+    if a is None:
+        raise APLError('VALENCE ERROR')
+    if type(a.data) is not array or len(a.data) != 1 or not 0 < a.data[0] <= 1:
+        raise APLError('DOMAIN ERROR')
+    return apl_vector(ema(_series(w), a.data[0]))
+
+def _system_linear(w, a=None):
+    """⎕LINEAR V: slope, intercept and r² of the least-squares line over 0..n-1"""
+    if a is not None:
+        raise APLError('VALENCE ERROR')
+    values = _series(w)
+    if len(values) < 2:
+        raise APLError('LENGTH ERROR')
+    return apl_vector(linear_fit(values))
+
+def _system_seasonal(w, a=None):
+    """P ⎕SEASONAL V: offset from the linear trend at each phase of period P"""
+    if a is None:
+        raise APLError('VALENCE ERROR')
+    if type(a.data) is not array or len(a.data) != 1 or a.data[0] != int(a.data[0]) or a.data[0] < 1:
+        raise APLError('DOMAIN ERROR')
+    period = int(a.data[0])
+    values = _series(w)
+    if len(values) < 2 * period:
+        raise APLError('LENGTH ERROR')
+    return apl_vector(seasonal_indices(values, period)[0])
+
+_SYSTEM_FUNCTIONS = {'⎕EMA': _system_ema, '⎕LINEAR': _system_linear, '⎕SEASONAL': _system_seasonal}
+
+# Tokenizer and parser
+
+_APL_TOKEN = re.compile(r"""
+    (?P<comment>⍝[^\n]*)
+  | (?P<sep>[\n⋄])
+  | (?P<space>[ \t\r]+)
+  | (?P<num>¯?(?:\d+(?:\.\d+)?|\.\d+)(?:[Ee]¯?\d+)?)
+  | (?P<str>'(?:[^'\n]|'')*')
+  | (?P<name>⎕[A-Za-z]*|[A-Za-z_∆⍙][A-Za-z0-9_∆⍙]*)
+  | (?P<glyph>.)
+""", re.VERBOSE)
+
+_FUNCTION_GLYPHS = set('+-×÷⌈⌊|*⍟○!?~∧∨⍲⍱<≤=≥>≠⍴,⍪⍳↑↓⌽⊖⍉⍋⍒∊∪∩⊂⊃≡≢⍕⍎⊤⊥⊢⊣⍸')
+_MONADIC_OPERATOR_GLYPHS = set('/⌿\\⍀¨⍨⌸')
+_DYADIC_OPERATOR_GLYPHS = set('.∘⍣')
+_PUNCTUATION = set('()[]{};:←')
+_SPECIAL_GLYPHS = {'⍺': 'alpha', '⍵': 'omega', '∇': 'del', '⍬': 'zilde'}
+
+_FUNCTION_NODES = frozenset(('prim', 'op1', 'op2', 'outer', 'dfn', 'fvar', 'sysfn', 'atop', 'fork'))
+_SHY_NODES = frozenset(('assign', 'fassign', 'assign_idx'))
+
+def _tokenize(source):
+    """Split APL source into (kind, value, line) tokens"""
+    tokens = []
+    line = 1
+    for match in _APL_TOKEN.finditer(source):
+        kind, text = match.lastgroup, match.group()
+        if kind == 'sep':
+            tokens.append(('sep', text, line))
+            if text == '\n':
+                line += 1
+        elif kind == 'num':
+            tokens.append(('num', float(text.replace('¯', '-')), line))
+        elif kind == 'str':
+            tokens.append(('str', text[1:-1].replace("''", "'"), line))
+        elif kind == 'name':
+            tokens.append(('name', text, line))
+        elif kind == 'glyph':
+            if text in _FUNCTION_GLYPHS:
+                tokens.append(('fn', text, line))
+            elif text in _MONADIC_OPERATOR_GLYPHS:
+                tokens.append(('mop', text, line))
+            elif text in _DYADIC_OPERATOR_GLYPHS:
+                tokens.append(('dop', text, line))
+            elif text in _PUNCTUATION:
+                tokens.append((text, text, line))
+            elif text in _SPECIAL_GLYPHS:
+                tokens.append((_SPECIAL_GLYPHS[text], text, line))
+            elif text == "'":
+                raise APLError('SYNTAX ERROR: unterminated string', line)
+            else:
+                raise APLError(f"SYNTAX ERROR: unknown symbol {text!r}", line)
+    return tokens
+
+def _split_statements(tokens):
+    """Split tokens on top-level newlines and diamonds"""
+    statements, current, depth = [], [], 0
+    for token in tokens:
+        kind = token[0]
+        if kind in ('(', '[', '{'):
+            depth += 1
+        elif kind in (')', ']', '}'):
+            depth -= 1
+        if kind == 'sep' and depth == 0:
+            if current:
+                statements.append(current)
+            current = []
+        elif kind != 'sep' or depth > 0:
+            current.append(token)
+    if current:
+        statements.append(current)
+    return statements
+
+def _matching(tokens, i):
+    """Index of the bracket closing the one at tokens[i]"""
+    depth = 0
+    for j in range(i, len(tokens)):
+        kind = tokens[j][0]
+        if kind in ('(', '[', '{'):
+            depth += 1
+        elif kind in (')', ']', '}'):
+            depth -= 1
+            if depth == 0:
+                if '([{'.index(tokens[i][0]) != ')]}'.index(kind):
+                    raise APLError('SYNTAX ERROR: mismatched brackets', tokens[j][2])
+                return j
+    raise APLError('SYNTAX ERROR: unbalanced brackets', tokens[i][2])
+
+def _is_function_node(node):
+    return node[0] in _FUNCTION_NODES
+
+def _parse_unit(tokens, i, fn_names):
+    """Parse one primary at tokens[i]; returns (node, next index)"""
+    kind, value = tokens[i][0], tokens[i][1]
+    if kind == 'num':
+        values = [value]
+        i += 1
+        while i < len(tokens) and tokens[i][0] == 'num':
+            values.append(tokens[i][1])
+            i += 1
+        return ('num', tuple(values)), i
+    if kind == 'str':
+        return ('chr', value), i + 1
+    if kind == 'zilde':
+        return ('num', ()), i + 1
+    if kind == 'name':
+        if value in fn_names:
+            return ('fvar', value), i + 1
+        if value.upper() in _SYSTEM_FUNCTIONS:
+            return ('sysfn', value.upper()), i + 1
+        return ('quad' if value.startswith('⎕') else 'var', value), i + 1
+    if kind in ('alpha', 'omega'):
+        return ('var', value), i + 1
+    if kind == 'del':
+        return ('fvar', '∇'), i + 1
+    if kind == 'fn':
+        return ('prim', value), i + 1
+    if kind == '(':
+        j = _matching(tokens, i)
+        inner = _parse_expr(tokens[i + 1:j], fn_names)
+        if inner[0] in ('num', 'strand'):
+            inner = ('group', inner)
+        return inner, j + 1
+    if kind == '{':
+        j = _matching(tokens, i)
+        return ('dfn', _parse_block(tokens[i + 1:j], set(fn_names))), j + 1
+    raise APLError(f"SYNTAX ERROR: unexpected {value!r}", tokens[i][2])
+
+def _parse_index(tokens, fn_names):
+    parts, current, depth = [], [], 0
+    for token in tokens:
+        kind = token[0]
+        if kind in ('(', '[', '{'):
+            depth += 1
+        elif kind in (')', ']', '}'):
+            depth -= 1
+        if kind == ';' and depth == 0:
+            parts.append(current)
+            current = []
+        else:
+            current.append(token)
+    parts.append(current)
+    return tuple(_parse_expr(part, fn_names) if part else None for part in parts)
+
+def _parse_expr(tokens, fn_names):
+    """Parse one statement's tokens into an AST node"""
+    if not tokens:
+        raise APLError('SYNTAX ERROR: empty expression')
+    units = []
+    i, n = 0, len(tokens)
+    while i < n:
+        kind, value, line = tokens[i]
+        if kind in ('name', 'alpha') and i + 1 < n and tokens[i + 1][0] == '←':
+            rhs = _parse_expr(tokens[i + 2:], fn_names)
+            if _is_function_node(rhs):
+                fn_names.add(value)
+                units.append(('fassign', value, rhs))
+            else:
+                fn_names.discard(value)
+                units.append(('assign', value, rhs))
+            break
+        if kind == 'name' and i + 1 < n and tokens[i + 1][0] == '[':
+            j = _matching(tokens, i + 1)
+            if j + 1 < n and tokens[j + 1][0] == '←':
+                indices = _parse_index(tokens[i + 2:j], fn_names)
+                units.append(('assign_idx', value, indices, _parse_expr(tokens[j + 2:], fn_names)))
+                break
+        if kind == 'mop':
+            if value in '/⌿\\⍀' and (not units or not _is_function_node(units[-1])):
+                units.append(('prim', value))
+            elif not units:
+                raise APLError(f"SYNTAX ERROR: missing operand for {value}", line)
+            else:
+                units[-1] = ('op1', value, units[-1])
+            i += 1
+            continue
+        if kind == 'dop':
+            if value == '∘' and i + 2 < n and tokens[i + 1][1] == '.':
+                operand, i = _parse_unit(tokens, i + 2, fn_names)
+                units.append(('outer', operand))
+                continue
+            if not units or i + 1 >= n:
+                raise APLError(f"SYNTAX ERROR: missing operand for {value}", line)
+            right, i = _parse_unit(tokens, i + 1, fn_names)
+            units[-1] = ('op2', value, units[-1], right)
+            continue
+        if kind == '[':
+            j = _matching(tokens, i)
+            if not units or _is_function_node(units[-1]):
+                raise APLError('NONCE ERROR: axis specification', line)
+            units[-1] = ('index', units[-1], _parse_index(tokens[i + 1:j], fn_names))
+            i = j + 1
+            continue
+        node, i = _parse_unit(tokens, i, fn_names)
+        units.append(node)
+    return _bind_units(units)
+
+def _strand_items(node):
+    if node[0] == 'num':
+        return tuple(('num', (value,)) for value in node[1])
+    return (node,)
+
+def _bind_units(units):
+    """Combine parsed units into a tree, right to left"""
+    if any(unit[0] == 'fassign' for unit in units) and len(units) > 1:
+        raise APLError('SYNTAX ERROR')
+    merged = []
+    for unit in units:
+        if merged and not _is_function_node(unit) and not _is_function_node(merged[-1]):
+            previous = merged[-1]
+            items = previous[1] if previous[0] == 'strand' else _strand_items(previous)
+            merged[-1] = ('strand', items + _strand_items(unit))
+        else:
+            merged.append(unit)
+    if _is_function_node(merged[-1]):
+        return _train(merged)
+    node = merged[-1]
+    i = len(merged) - 2
+    while i >= 0:
+        fn = merged[i]
+        if not _is_function_node(fn):
+            raise APLError('SYNTAX ERROR')
+        if i >= 1 and not _is_function_node(merged[i - 1]):
+            node = ('dyad', fn, merged[i - 1], node)
+            i -= 2
+        else:
+            node = ('monad', fn, node)
+            i -= 1
+    return node
+
+def _train(units):
+    node = units[-1]
+    i = len(units) - 2
+    while i >= 0:
+        if i >= 1:
+            node = ('fork', units[i - 1], units[i], node)
+            i -= 2
+        else:
+            node = ('atop', units[i], node)
+            i -= 1
+    return node
+
+def _parse_block(tokens, fn_names):
+    """Parse the statements of a dfn body"""
+    body = []
+    for statement in _split_statements(tokens):
+        colon, depth = None, 0
+        for k, token in enumerate(statement):
+            if token[0] in ('(', '[', '{'):
+                depth += 1
+            elif token[0] in (')', ']', '}'):
+                depth -= 1
+            elif token[0] == ':' and depth == 0:
+                colon = k
+                break
+        if colon is None:
+            body.append(_parse_expr(statement, fn_names))
+        else:
+            body.append(('guard', _parse_expr(statement[:colon], fn_names),
+                         _parse_expr(statement[colon + 1:], fn_names)))
+    return tuple(body)
+
+def parse_apl_program(source):
+    """Parse APL source into a tuple of (line number, statement) pairs"""
+    fn_names = set()
+    program = []
+    for statement in _split_statements(_tokenize(source)):
+        line = statement[0][2]
+        try:
+            program.append((line, _fuse_nodes(_parse_expr(statement, fn_names))))
+        except APLError as error:
+            error.line = error.line or line
+            raise
+    return tuple(program)
+
+# Evaluation
+
+class APLScope(dict):
+    """Variable bindings; dfn scopes chain to the scope they were defined in"""
+
+    def __init__(self, parent=None):
+        super().__init__()
+        self.parent = parent
+
+    def lookup(self, name):
+        scope = self
+        while scope is not None:
+            if name in scope:
+                return scope[name]
+            scope = scope.parent
+        raise APLError(f"VALUE ERROR: {name}")
+
+def _eval(node, scope):
+    return _EVALUATORS[node[0]](node, scope)
+
+def _eval_num(node, scope):
+    values = node[1]
+    return APLArray(() if len(values) == 1 else (len(values),), array('d', values))
+
+def _eval_chr(node, scope):
+    text = node[1]
+    return APLArray(() if len(text) == 1 else (len(text),), text)
+
+def _eval_var(node, scope):
+    value = scope.lookup(node[1])
+    if type(value) is not APLArray:
+        raise APLError(f"SYNTAX ERROR: {node[1]} is a function")
+    return value
+
+def _eval_quad(node, scope):
+    name = node[1].upper()
+    if name == '⎕IO':
+        return apl_scalar(APL_INDEX_ORIGIN)
+    if name == '⎕PP':
+        return apl_scalar(APL_PRINT_PRECISION)
+    if name == '⎕A':
+        return apl_vector('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    if name == '⎕D':
+        return apl_vector('0123456789')
+    if name == '⎕TS':
+        now = datetime.now()
+        return apl_vector([now.year, now.month, now.day, now.hour, now.minute,
+                           now.second, now.microsecond // 1000])
+    raise APLError(f"VALUE ERROR: {node[1]}")
+
+def _eval_strand(node, scope):
+    items = [_as_item(_eval(item, scope)) for item in reversed(node[1])]
+    items.reverse()
+    return apl_vector_items(items)
+
+def _eval_group(node, scope):
+    return _eval(node[1], scope)
+
+def _eval_monad(node, scope):
+    w = _eval(node[2], scope)
+    return _function(node[1], scope)(w)
+
+def _eval_dyad(node, scope):
+    w = _eval(node[3], scope)
+    f = _function(node[1], scope)
+    return f(w, _eval(node[2], scope))
+
+def _index_plan(arr, indices):
+    if len(indices) != len(arr.shape):
+        raise APLError('RANK ERROR')
+    plan, shape = [], []
+    for dim, stride, index in zip(arr.shape, _strides(arr.shape), indices):
+        if index is None:
+            plan.append((range(dim), stride))
+            shape.append(dim)
+            continue
+        positions = [i - APL_INDEX_ORIGIN for i in _ints(index)]
+        if any(not 0 <= p < dim for p in positions):
+            raise APLError('INDEX ERROR')
+        plan.append((positions, stride))
+        shape.extend(index.shape)
+    return plan, tuple(shape)
+
+def _eval_indices(nodes, scope):
+    indices = [None if node is None else _eval(node, scope) for node in reversed(nodes)]
+    indices.reverse()
+    return indices
+
+def _eval_index(node, scope):
+    indices = _eval_indices(node[2], scope)
+    arr = _eval(node[1], scope)
+    plan, shape = _index_plan(arr, indices)
+    return APLArray(shape, _select(arr, plan).data)
+
+def _eval_assign(node, scope):
+    if node[1] == '⍺' and '⍺' in scope:
+        return scope['⍺']
+    value = _eval(node[2], scope)
+    scope[node[1]] = value
+    return value
+
+def _eval_fassign(node, scope):
+    scope[node[1]] = _function(node[2], scope)
+
+def _eval_assign_idx(node, scope):
+    value = _eval(node[3], scope)
+    indices = _eval_indices(node[2], scope)
+    target = _eval_var(('var', node[1]), scope)
+    plan, shape = _index_plan(target, indices)
+    offsets = _offsets(plan)
+    if not value.shape or len(value.data) == 1:
+        values = itertools.repeat(value.data[0], len(offsets))
+    elif value.shape == shape:
+        values = value.data
+    else:
+        raise APLError('LENGTH ERROR')
+    if type(target.data) is array and type(value.data) is array:
+        data = array('d', target.data)
+    else:
+        data = list(target.data)
+    for offset, x in zip(offsets, values):
+        data[offset] = x
+    scope[node[1]] = APLArray(target.shape, data if type(data) is array else _pack(data))
+    return value
+
+# Fused evaluation
+#
+# At parse time, maximal subtrees made of numeric scalar functions, ravel,
+# reshape, take/drop and +/ ⌈/ ⌊/ ×/ reductions are wrapped in a 'fused'
+# node. Evaluating it builds nested map/islice iterators over the source
+# buffers instead of an array per step, so 1↓SALES-¯1↓SALES makes one pass
+# and allocates only its result; take, drop and reshape are views into the
+# iterator chain. Whenever a runtime value does not fit (characters, nested
+# data, overtake, rank mismatch) or arithmetic raises, the original subtree
+# is evaluated normally so results and errors are unchanged.
+
+_FUSED_MONADIC = frozenset(_SCALAR_MONADIC) - {'?'}
+_FUSED_STRUCTURAL = frozenset('↑↓⍴')
+
+class _NotFusable(Exception):
+    pass
+
+def _fused_ops(node):
+    """Number of fusable operations in node, or -1 if it cannot be fused"""
+    kind = node[0]
+    if kind in ('num', 'var'):
+        return 0
+    if kind == 'group':
+        return _fused_ops(node[1])
+    if kind == 'monad':
+        fn = node[1]
+        if fn[0] == 'prim' and (fn[1] in _FUSED_MONADIC or fn[1] == ','):
+            pass
+        elif not (fn[0] == 'op1' and fn[1] in '/⌿' and fn[2][0] == 'prim'
+                  and fn[2][1] in _FAST_REDUCE):
+            return -1
+        inner = _fused_ops(node[2])
+        return -1 if inner < 0 else inner + 1
+    if kind == 'dyad':
+        fn = node[1]
+        if fn[0] != 'prim' or not (fn[1] in _SCALAR_DYADIC or fn[1] in _FUSED_STRUCTURAL):
+            return -1
+        left, right = _fused_ops(node[2]), _fused_ops(node[3])
+        return -1 if min(left, right) < 0 else left + right + 1
+    return -1
+
+def _fuse_nodes(node):
+    """Wrap fusable chains of two or more operations in 'fused' nodes"""
+    if type(node) is not tuple:
+        return node
+    if node and type(node[0]) is str and _fused_ops(node) >= 2:
+        return ('fused', node)
+    return tuple(_fuse_nodes(x) if type(x) is tuple else x for x in node)
+
+def _singleton(lazy):
+    shape, items = lazy
+    if _prod(shape) != 1:
+        raise _NotFusable()
+    return next(iter(items))
+
+def _lazy_count(lazy):
+    value = _singleton(lazy)
+    if value != int(value):
+        raise _NotFusable()
+    return int(value)
+
+def _lazy_slice(lazy, count, take):
+    shape, items = lazy
+    if len(shape) != 1:
+        raise _NotFusable()
+    n = shape[0]
+    if take:
+        if abs(count) > n:
+            raise _NotFusable()
+        start, stop = (0, count) if count >= 0 else (n + count, n)
+    else:
+        start, stop = (min(count, n), n) if count >= 0 else (0, max(n + count, 0))
+    return (stop - start,), itertools.islice(items, start, stop)
+
+def _lazy_dyadic(glyph, left, right):
+    if glyph in _FUSED_STRUCTURAL:
+        if glyph == '⍴':
+            dims = list(left[1])
+            shape = tuple(int(x) for x in dims)
+            if len(left[0]) > 1 or any(s < 0 or s != x for s, x in zip(shape, dims)):
+                raise _NotFusable()
+            n, available = _prod(shape), _prod(right[0])
+            if n > available:
+                if not available:
+                    raise _NotFusable()
+                return shape, itertools.islice(itertools.cycle(right[1]), n)
+            return shape, itertools.islice(right[1], n)
+        return _lazy_slice(right, _lazy_count(left), glyph == '↑')
+    fn = _SCALAR_DYADIC[glyph]
+    (shape_a, items_a), (shape_w, items_w) = left, right
+    na, nw = _prod(shape_a), _prod(shape_w)
+    if shape_a == shape_w:
+        return shape_w, map(fn, items_a, items_w)
+    if na == 1 and (nw != 1 or len(shape_a) < len(shape_w)):
+        return shape_w, map(fn, itertools.repeat(_singleton(left), nw), items_w)
+    if nw == 1:
+        return shape_a, map(fn, items_a, itertools.repeat(_singleton(right), na))
+    raise _NotFusable()
+
+def _lazy(node, scope):
+    """(shape, iterator of floats) for a fusable node"""
+    kind = node[0]
+    if kind == 'num':
+        values = node[1]
+        return (() if len(values) == 1 else (len(values),)), iter(values)
+    if kind == 'var':
+        value = scope.lookup(node[1])
+        if type(value) is not APLArray or type(value.data) is not array:
+            raise _NotFusable()
+        return value.shape, iter(value.data)
+    if kind == 'group':
+        return _lazy(node[1], scope)
+    if kind == 'monad':
+        fn = node[1]
+        shape, items = _lazy(node[2], scope)
+        if fn[0] == 'op1':
+            if len(shape) != 1:
+                raise _NotFusable()
+            return (), iter((_FAST_REDUCE[fn[2][1]](items),))
+        if fn[1] == ',':
+            return (_prod(shape),), items
+        return shape, map(_SCALAR_MONADIC[fn[1]], items)
+    right = _lazy(node[3], scope)
+    return _lazy_dyadic(node[1][1], _lazy(node[2], scope), right)
+
+def _eval_fused(node, scope):
+    try:
+        shape, items = _lazy(node[1], scope)
+        return APLArray(shape, array('d', items))
+    except (_NotFusable,) + _ARITHMETIC_ERRORS:
+        pass
+    return _eval(node[1], scope)
+
+_EVALUATORS = {
+    'num': _eval_num, 'chr': _eval_chr, 'var': _eval_var, 'quad': _eval_quad,
+    'strand': _eval_strand, 'group': _eval_group, 'monad': _eval_monad,
+    'dyad': _eval_dyad, 'index': _eval_index, 'assign': _eval_assign,
+    'fassign': _eval_fassign, 'assign_idx': _eval_assign_idx, 'fused': _eval_fused,
+}
+
+def _make_dfn(body, scope):
+    def dfn(w, a=None):
+        local = APLScope(scope)
+        local['⍵'] = w
+        if a is not None:
+            local['⍺'] = a
+        local['∇'] = dfn
+        for statement in body:
+            if statement[0] == 'guard':
+                test = _eval(statement[1], local)
+                if len(test.data) != 1 or test.data[0] not in (0, 1):
+                    raise APLError('DOMAIN ERROR')
+                if test.data[0]:
+                    return _eval(statement[2], local)
+            elif statement[0] in _SHY_NODES:
+                _eval(statement, local)
+            else:
+                return _eval(statement, local)
+        raise APLError('VALUE ERROR: dfn has no result')
+    return dfn
+
+def _execute_fn(scope):
+    def execute(w, a=None):
+        if a is not None or type(w.data) is not str:
+            raise APLError('DOMAIN ERROR')
+        fn_names = {name for name, value in scope.items() if callable(value)}
+        result = None
+        for statement in _split_statements(_tokenize(w.data)):
+            result = _eval(_parse_expr(statement, fn_names), scope)
+        return result if result is not None else APLArray((0,), array('d'))
+    return execute
+
+def _operand(node, scope):
+    return _function(node, scope) if _is_function_node(node) else _eval(node, scope)
+
+def _function(node, scope):
+    """Resolve a function node to a callable f(w, a=None)"""
+    kind = node[0]
+    if kind == 'prim':
+        return _execute_fn(scope) if node[1] == '⍎' else _PRIMITIVES[node[1]]
+    if kind == 'fvar':
+        f = scope.lookup(node[1])
+        if not callable(f):
+            raise APLError(f"SYNTAX ERROR: {node[1]} is not a function")
+        return f
+    if kind == 'sysfn':
+        return _SYSTEM_FUNCTIONS[node[1]]
+    if kind == 'dfn':
+        return _make_dfn(node[1], scope)
+    if kind == 'op1':
+        return _MONADIC_OPERATORS[node[1]](_operand(node[2], scope))
+    if kind == 'op2':
+        return _DYADIC_OPERATORS[node[1]](_operand(node[2], scope), _operand(node[3], scope))
+    if kind == 'outer':
+        return _outer_product(_function(node[1], scope))
+    if kind == 'atop':
+        return _atop(_function(node[1], scope), _function(node[2], scope))
+    if kind == 'fork':
+        return _fork(_operand(node[1], scope), _function(node[2], scope), _function(node[3], scope))
+    raise APLError('SYNTAX ERROR')
+
+def execute_apl_statement(node, scope):
+    """Evaluate one statement; returns the value to display or None"""
+    value = _eval(node, scope)
+    return None if node[0] in _SHY_NODES else value
+
+def format_apl_value(value):
+    """Display lines for an APL value"""
+    return _format_lines(value)
+
+# Compiled program cache
+#
+# Parsed programs are keyed by a hash of the source text and the interpreter
+# version, which covers this module's own source and the Python/marshal
+# version, so a parser change never reuses stale trees. Entries live in an
+# in-process LRU and, with NEW_APL_PROGRAM_CACHE=true, as marshal files under
+# APL_CACHE_DIR, letting repeated runs of an unchanged script skip tokenizing
+# and parsing entirely, even across processes.
+
+APL_CACHE_DIR = Path(os.getenv('NEW_APL_CACHE_DIR') or
+                     Path(os.getenv('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')) / 'new-apl')
+PROGRAM_CACHE_DISK = os.getenv('NEW_APL_PROGRAM_CACHE') == 'true'
+PROGRAM_CACHE_ENTRIES = 128
+_PROGRAM_CACHE = OrderedDict()
+_PROGRAM_CACHE_LOCK = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def interpreter_version():
+    """Fingerprint of the interpreter source and the Python/marshal version"""
+    digest = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=8).hexdigest()
+    return f"py{sys.version_info[0]}.{sys.version_info[1]}-m{marshal.version}-{digest}"
+
+def program_symbols(program):
+    """Names a program assigns, defines as functions, and reads"""
+    variables, functions, reads = set(), set(), set()
+    stack = [statement for _, statement in program]
+    while stack:
+        node = stack.pop()
+        if node and type(node[0]) is tuple:
+            # a tuple of nodes: dfn statements, strand items, index parts
+            stack.extend(x for x in node if type(x) is tuple)
+            continue
+        kind = node[0] if node else None
+        if kind in ('assign', 'assign_idx'):
+            variables.add(node[1])
+        elif kind == 'fassign':
+            functions.add(node[1])
+        elif kind in ('var', 'fvar'):
+            reads.add(node[1])
+        stack.extend(x for x in node[1:] if type(x) is tuple)
+    return {
+        'variables': tuple(sorted(variables)),
+        'functions': tuple(sorted(functions)),
+        'inputs': tuple(sorted(reads - variables - functions - {'⍺', '⍵', '∇'})),
+    }
+
+def _read_compiled(path, version):
+    try:
+        with open(path, 'rb') as f:
+            entry = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if type(entry) is not tuple or len(entry) != 3 or entry[0] != version:
+        return None
+    return entry[1], entry[2]
+
+def _write_compiled(path, version, entry):
+    temporary = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temporary, 'wb') as f:
+            marshal.dump((version,) + entry, f)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+
+def compile_apl_source(source):
+    """Return (program, symbols, origin); origin is 'memory', 'disk' or None"""
+    version = interpreter_version()
+    key = hashlib.blake2b(source.encode('utf-8'), digest_size=16)
+    key.update(version.encode('utf-8'))
+    key = key.hexdigest()
+    with _PROGRAM_CACHE_LOCK:
+        entry = _PROGRAM_CACHE.get(key)
+        if entry is not None:
+            _PROGRAM_CACHE.move_to_end(key)
+            return entry + ('memory',)
+    path = APL_CACHE_DIR / f"{key}.aplc"
+    entry = _read_compiled(path, version) if PROGRAM_CACHE_DISK else None
+    origin = 'disk' if entry is not None else None
+    if entry is None:
+        program = parse_apl_program(source)
+        entry = (program, program_symbols(program))
+        if PROGRAM_CACHE_DISK:
+            _write_compiled(path, version, entry)
+    with _PROGRAM_CACHE_LOCK:
+        _PROGRAM_CACHE[key] = entry
+        while len(_PROGRAM_CACHE) > PROGRAM_CACHE_ENTRIES:
+            _PROGRAM_CACHE.popitem(last=False)
+    return entry + (origin,)
+
+def run_apl_file(filename):
+    """Run an APL program through the evaluator"""
+    filepath = Path(filename)
+    if not filepath.exists():
+        examples_path = Path('examples') / filename
+        if examples_path.exists():
+            filepath = examples_path
+        else:
+            return f"❌ File not found: {filename}"
+    
+    try:
+        start_time = time.time()
+        with PROFILER.span('read source') as span:
+            content = filepath.read_text(encoding='utf-8')
+            span.nbytes = len(content)
+        with PROFILER.span('compile') as span:
+            program, _, origin = compile_apl_source(content)
+            span.rows = len(program)
+        source_lines = content.split('\n')
+        
+        print(f"🚀 Running {filepath.name}...")
+        print("=" * 40)
+        
+        scope = APLScope()
+        for line, statement in program:
+            try:
+                with PROFILER.span(f"line {line}: {source_lines[line - 1].strip()[:40]}", 'apl',
+                                   track_peak=True) as span:
+                    value = execute_apl_statement(statement, scope)
+                    span.rows = len(value.data) if value is not None else 0
+                job_checkpoint(len(value.data) if value is not None else 0)
+            except APLError as error:
+                error.line = error.line or line
+                raise
+            if value is not None:
+                for output in format_apl_value(value):
+                    print(output)
+        
+        execution_time = time.time() - start_time
+        print("=" * 40)
+        print(f"✅ Execution completed in {execution_time:.3f} seconds")
+        print(f"📊 {len(program)} statements evaluated"
+              f"{f' (compiled program from {origin} cache)' if origin else ''}")
+        
+        return f"✅ {filepath.name} executed successfully"
+        
+    except APLError as e:
+        return f"❌ {filepath.name}: {e}"
+    except Exception as e:
+        return f"❌ Error running {filename}: {str(e)}"
+
+# Static cost analysis
+#
+# explain walks the parsed program without running it. Every value is an
+# AbstractArray: a shape (None for an unknown rank or dimension), an element
+# kind and, for small constants, the values themselves, so "N←1000 ⋄ M←N N⍴⍳N×N"
+# is sized exactly: constant subexpressions are folded with the real
+# primitives. Each function application reports the element operations it
+# performs and the bytes its result allocates; a statement's peak adds the
+# temporaries alive at once to the variables already held. Program inputs can
+# be sized from a CSV ("using") or explicitly ("with V=1000000 M=1000x50").
+
+COST_HOT_OPS = 10 ** 7
+COST_HOT_BYTES = 256 << 20
+COST_HOT_CALLS = 10 ** 4
+_CONSTANT_LIMIT = 64
+_ITEM_BYTES = {'num': 8, 'chr': 1, 'nested': 64}
+
+_GLYPH_NAMES = {
+    False: {
+        '+': 'conjugate', '-': 'negate', '×': 'direction', '÷': 'reciprocal',
+        '⌈': 'ceiling', '⌊': 'floor', '|': 'magnitude', '*': 'exponential',
+        '⍟': 'natural log', '○': 'pi times', '!': 'factorial', '?': 'roll', '~': 'not',
+        '⍴': 'shape', '⍳': 'index generator', ',': 'ravel', '⍪': 'table',
+        '⌽': 'reverse', '⊖': 'reverse first', '⍉': 'transpose', '↑': 'mix',
+        '↓': 'split', '⊂': 'enclose', '⊃': 'first', '≡': 'depth', '≢': 'tally',
+        '∪': 'unique', '∊': 'enlist', '⍋': 'grade up', '⍒': 'grade down',
+        '⍕': 'format', '⍎': 'execute', '⍸': 'where', '⊢': 'same', '⊣': 'same',
+    },
+    True: {
+        '+': 'add', '-': 'subtract', '×': 'multiply', '÷': 'divide', '⌈': 'maximum',
+        '⌊': 'minimum', '|': 'residue', '*': 'power', '⍟': 'logarithm', '○': 'circular',
+        '!': 'binomial', '?': 'deal', '<': 'less than', '≤': 'less or equal',
+        '=': 'equal', '≥': 'greater or equal', '>': 'greater than', '≠': 'not equal',
+        '∧': 'and', '∨': 'or', '⍲': 'nand', '⍱': 'nor', '⍴': 'reshape',
+        '⍳': 'index of', ',': 'catenate', '⍪': 'catenate first', '⌽': 'rotate',
+        '⊖': 'rotate first', '⍉': 'reorder axes', '↑': 'take', '↓': 'drop',
+        '⊂': 'partitioned enclose', '⊃': 'pick', '≡': 'match', '≢': 'not match',
+        '∪': 'union', '∩': 'intersection', '∊': 'member of', '~': 'without',
+        '⊤': 'encode', '⊥': 'decode', '⍕': 'format', '/': 'replicate',
+        '⌿': 'replicate first', '\\': 'expand', '⍀': 'expand first',
+        '⊢': 'right', '⊣': 'left',
+    },
+}
+
+_OPERATOR_NAMES = {
+    '/': 'reduce', '⌿': 'reduce first', '\\': 'scan', '⍀': 'scan first',
+    '¨': 'each', '⍨': 'commute', '⌸': 'key', '.': 'inner product',
+    '∘': 'compose', '⍣': 'power',
+}
+
+_SHAPE_PRESERVING = frozenset('⌽⊖⊢') | frozenset(_SCALAR_MONADIC)
+_UNFOLDABLE = frozenset('?⍎')
+
+def _known(*values):
+    return all(value is not None for value in values)
+
+def _mul(*values):
+    return _prod(values) if _known(*values) else None
+
+def format_size(nbytes):
+    """Human-readable byte count; '?' when unknown"""
+    if nbytes is None:
+        return '?'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if nbytes < 1024 or unit == 'GB':
+            return f"{nbytes:,.0f} {unit}" if unit == 'B' else f"{nbytes:,.1f} {unit}"
+        nbytes /= 1024
+
+class AbstractArray:
+    """Shape, element kind and (for small constants) values of an unevaluated array"""
+
+    def __init__(self, shape, kind='num', value=None):
+        self.shape = shape
+        self.kind = kind
+        self.value = value
+
+    @property
+    def count(self):
+        if self.shape is None or None in self.shape:
+            return None
+        return _prod(self.shape)
+
+    @property
+    def nbytes(self):
+        count = self.count
+        return None if count is None else count * _ITEM_BYTES[self.kind]
+
+    def describe(self):
+        if self.shape is None:
+            return f"{self.kind} array of unknown shape"
+        if not self.shape:
+            return f"{self.kind} scalar"
+        return '×'.join('?' if dim is None else f"{dim:,}" for dim in self.shape) + f" {self.kind}"
+
+    def ints(self):
+        """The constant values as integers, or None"""
+        if self.value is None or self.kind != 'num':
+            return None
+        return [int(x) for x in self.value]
+
+    @classmethod
+    def of(cls, value):
+        """Abstract view of a concrete APLArray"""
+        data = value.data
+        if type(data) is array:
+            return cls(value.shape, 'num', tuple(data) if len(data) <= _CONSTANT_LIMIT else None)
+        if type(data) is str:
+            return cls(value.shape, 'chr', data if len(data) <= _CONSTANT_LIMIT else None)
+        return cls(value.shape, 'nested')
+
+    def concrete(self):
+        if self.kind == 'num':
+            return APLArray(self.shape, array('d', self.value))
+        return APLArray(self.shape, self.value)
+
+_UNKNOWN = AbstractArray(None, 'nested')
+
+def _node_text(node):
+    """Short APL spelling of a function or operand node"""
+    kind = node[0]
+    if kind == 'prim':
+        return node[1]
+    if kind in ('fvar', 'sysfn', 'var'):
+        return node[1]
+    if kind == 'num':
+        return ' '.join(f"{x:g}" for x in node[1])
+    if kind == 'dfn':
+        return '{…}'
+    if kind == 'op1':
+        return _node_text(node[2]) + node[1]
+    if kind == 'op2':
+        return _node_text(node[2]) + node[1] + _node_text(node[3])
+    if kind == 'outer':
+        return '∘.' + _node_text(node[1])
+    if kind in ('atop', 'fork'):
+        return '(' + ''.join(_node_text(part) for part in node[1:]) + ')'
+    return '…'
+
+def _function_name(fn, dyadic):
+    kind = fn[0]
+    if kind == 'prim':
+        name = _GLYPH_NAMES[dyadic].get(fn[1], 'primitive')
+    elif kind == 'op1' and fn[1] in '/⌿' and dyadic:
+        name = 'n-wise reduce'
+    elif kind in ('op1', 'op2'):
+        name = _OPERATOR_NAMES.get(fn[1], 'operator')
+    elif kind == 'outer':
+        name = 'outer product'
+    elif kind in ('fvar', 'dfn'):
+        name = 'call'
+    elif kind == 'sysfn':
+        name = 'system function'
+    else:
+        name = 'train'
+    return f"{name} {_node_text(fn)}"
+
+def _describe_expr(node):
+    kind = node[0]
+    if kind == 'group':
+        return _describe_expr(node[1])
+    if kind == 'fused':
+        return _describe_expr(node[1]) + ' (fused)'
+    if kind == 'monad':
+        return _function_name(node[1], False)
+    if kind == 'dyad':
+        return _function_name(node[1], True)
+    if kind == 'index':
+        return 'indexing'
+    if kind == 'chr':
+        return 'text'
+    if kind == 'num':
+        return 'literal'
+    if kind == 'strand':
+        items = node[1]
+        if all(_ungrouped(item)[0] in ('num', 'chr') for item in items):
+            return 'literal'
+        if len(items) > 3:
+            return f"strand of {len(items)} items"
+        return f"strand of {', '.join(_describe_expr(item) for item in items)}"
+    return node[1] if kind in ('var', 'quad') else kind
+
+def describe_statement(node):
+    """One-line summary of what a statement does"""
+    kind = node[0]
+    if kind == 'assign':
+        return f"{node[1]} ← {_describe_expr(node[2])}"
+    if kind == 'fassign':
+        return f"defines function {node[1]}"
+    if kind == 'assign_idx':
+        return f"{node[1]}[…] ← {_describe_expr(node[3])}"
+    if kind == 'chr':
+        return 'outputs text'
+    return f"displays {_describe_expr(node)}"
+
+def _foldable(fn):
+    """Whether a function node can be applied to constants at analysis time"""
+    kind = fn[0]
+    if kind == 'prim':
+        return fn[1] not in _UNFOLDABLE
+    if kind == 'num':
+        return True
+    if kind in ('op1', 'outer', 'atop', 'fork', 'op2'):
+        return all(_foldable(part) for part in fn[1:] if type(part) is tuple)
+    return False
+
+def _ungrouped(node):
+    while node[0] == 'group':
+        node = node[1]
+    return node
+
+def _held(node):
+    """Whether evaluating node returns an existing variable rather than a new array"""
+    return _ungrouped(node)[0] in ('var', 'quad')
+
+class CostAnalyzer:
+    """Propagate shapes through a parsed program and total its estimated costs"""
+
+    def __init__(self, inputs=None):
+        self.env = dict(inputs or {})
+        self.ops = 0
+        self.unknown_ops = False
+        self.allocated = 0
+        self.notes = []
+        self.calls = []
+        # peak bytes of one call made by the loop being applied (¨, dfn reductions)
+        self.temporaries = 0
+        self.call_peak = 0
+
+    # Bookkeeping
+
+    def _charge(self, ops, result, label=None):
+        if ops is None:
+            self.unknown_ops = True
+        else:
+            self.ops += ops
+        nbytes = result.nbytes
+        if nbytes is not None:
+            self.allocated += nbytes
+        hot = []
+        if ops is not None and ops >= COST_HOT_OPS:
+            hot.append(f"{ops:,} element operations")
+        if nbytes is not None and nbytes >= COST_HOT_BYTES:
+            hot.append(f"allocates {format_size(nbytes)}")
+        if label and hot and not any(label in note for note in self.notes):
+            self._note(f"{label}: {', '.join(hot)}")
+        return result
+
+    def _note(self, message):
+        if message not in self.notes:
+            self.notes.append(message)
+
+    def env_bytes(self):
+        return sum(value.nbytes or 0 for value in self.env.values()
+                   if type(value) is AbstractArray)
+
+    # Statements
+
+    def statement(self, node):
+        """Analyse one statement; returns (result, statement peak bytes)"""
+        kind = node[0]
+        if kind == 'fassign':
+            self.env[node[1]] = ('fn', node[2])
+            return None, 0
+        if kind == 'assign':
+            value, peak = self.value(node[2])
+            self.env[node[1]] = value
+            return value, peak
+        if kind == 'assign_idx':
+            value, peak = self.value(node[3])
+            target = self.env.get(node[1], _UNKNOWN)
+            self._charge(target.count, target)
+            copy = AbstractArray(target.shape, target.kind)
+            self.env[node[1]] = copy
+            return copy, peak + (target.nbytes or 0)
+        return self.value(node)
+
+    def value(self, node):
+        """(AbstractArray, peak bytes of temporaries) for an expression node"""
+        handler = getattr(self, '_' + node[0], None)
+        if handler is None:
+            return _UNKNOWN, 0
+        return handler(node)
+
+    def _fresh(self, node, value):
+        return 0 if _held(node) else value.nbytes or 0
+
+    def _num(self, node):
+        values = node[1]
+        shape = () if len(values) == 1 else (len(values),)
+        value = tuple(values) if len(values) <= _CONSTANT_LIMIT else None
+        result = self._charge(0, AbstractArray(shape, 'num', value))
+        return result, result.nbytes
+
+    def _chr(self, node):
+        text = node[1]
+        result = AbstractArray(() if len(text) == 1 else (len(text),), 'chr',
+                               text if len(text) <= _CONSTANT_LIMIT else None)
+        return self._charge(0, result), len(text)
+
+    def _var(self, node):
+        value = self.env.get(node[1])
+        return (value if type(value) is AbstractArray else _UNKNOWN), 0
+
+    def _quad(self, node):
+        try:
+            return AbstractArray.of(_eval_quad(node, None)), 0
+        except APLError:
+            return _UNKNOWN, 0
+
+    def _group(self, node):
+        return self.value(node[1])
+
+    def _strand(self, node):
+        items, peak, live = [], 0, 0
+        for item in reversed(node[1]):
+            value, item_peak = self.value(item)
+            peak = max(peak, live + item_peak)
+            live += self._fresh(item, value)
+            items.append(value)
+        items.reverse()
+        if all(item.kind == 'num' and item.shape == () and item.value for item in items):
+            result = AbstractArray((len(items),), 'num', tuple(item.value[0] for item in items))
+        elif all(item.shape == () and item.kind == items[0].kind for item in items):
+            result = AbstractArray((len(items),), items[0].kind)
+        else:
+            result = AbstractArray((len(items),), 'nested')
+        self._charge(len(items), result)
+        return result, max(peak, live + (result.nbytes or 0))
+
+    def _fused(self, node):
+        allocated = self.allocated
+        result, _ = self.value(node[1])
+        # the fused loop streams its operands: only the final array is allocated
+        self.allocated = allocated + (result.nbytes or 0)
+        return result, result.nbytes or 0
+
+    def _index(self, node):
+        target, peak = self.value(node[1])
+        live = self._fresh(node[1], target)
+        shape = []
+        for k, part in enumerate(node[2]):
+            if part is None:
+                dim = target.shape[k] if target.shape is not None and k < len(target.shape) else None
+                shape.append(dim)
+                continue
+            index, index_peak = self.value(part)
+            peak = max(peak, live + index_peak)
+            live += self._fresh(part, index)
+            if index.shape is None:
+                shape = None
+                break
+            shape.extend(index.shape)
+        result = AbstractArray(None if shape is None else tuple(shape), target.kind)
+        self._charge(result.count, result)
+        return result, max(peak, live + (result.nbytes or 0))
+
+    def _applied(self, fn, w, a=None):
+        """(result, temporaries one call of a loop holds alongside the result)"""
+        saved, self.temporaries = self.temporaries, 0
+        try:
+            return self.apply(fn, w, a), self.temporaries
+        finally:
+            self.temporaries = saved
+
+    def _monad(self, node):
+        w, peak = self.value(node[2])
+        result, temporaries = self._applied(node[1], w)
+        return result, max(peak, self._fresh(node[2], w) + (result.nbytes or 0) + temporaries)
+
+    def _dyad(self, node):
+        w, peak = self.value(node[3])
+        live = self._fresh(node[3], w)
+        a, left_peak = self.value(node[2])
+        live += self._fresh(node[2], a)
+        result, temporaries = self._applied(node[1], w, a)
+        return result, max(peak, live - self._fresh(node[2], a) + left_peak,
+                           live + (result.nbytes or 0) + temporaries)
+
+    # Functions
+
+    def apply(self, fn, w, a=None):
+        """Abstract result of applying a function node; charges its cost"""
+        label = _function_name(fn, a is not None)
+        kind = fn[0]
+        if kind in ('op1', 'op2') and fn[1] in '⍨∘⍣':
+            return self._derived(fn, w, a, label)
+        if kind in ('dfn', 'fvar'):
+            return self._call(fn, w, a, label)
+        if kind == 'atop':
+            return self.apply(fn[1], self.apply(fn[2], w, a))
+        if kind == 'fork':
+            right = self.apply(fn[3], w, a)
+            if fn[1][0] in ('num', 'chr'):
+                left = self.value(fn[1])[0]
+            else:
+                left = self.apply(fn[1], w, a)
+            return self.apply(fn[2], right, left)
+        if kind == 'prim':
+            result, ops = self._primitive(fn[1], w, a)
+        elif kind == 'op1':
+            result, ops = self._operator(fn, w, a, label)
+        elif kind == 'op2':
+            result, ops = self._inner(fn, w, a, label)
+        elif kind == 'outer':
+            if a is None:
+                return _UNKNOWN
+            result = AbstractArray(_concat_shapes(a.shape, w.shape), _result_kind(fn[1], w))
+            ops = result.count
+            if fn[1][0] != 'prim':
+                ops = self._per_call(fn[1], _item(w), _item(a), result.count, label)
+        elif kind == 'sysfn':
+            result, ops = self._system(fn[1], w, a)
+        else:
+            return _UNKNOWN
+        small = result.count is None or result.count <= _CONSTANT_LIMIT
+        if small and _foldable(fn) and w.value is not None and (a is None or a.value is not None):
+            result = self._fold(fn, w, a) or result
+        return self._charge(ops, result, label)
+
+    def _fold(self, fn, w, a):
+        try:
+            derived = _function(fn, APLScope())
+            value = derived(w.concrete()) if a is None else derived(w.concrete(), a.concrete())
+        except Exception:
+            return None
+        return AbstractArray.of(value)
+
+    def _primitive(self, glyph, w, a):
+        n = w.count
+        if a is None:
+            return _monadic_shape(glyph, w), _monadic_ops(glyph, w)
+        if glyph in _SCALAR_DYADIC:
+            result = AbstractArray(_broadcast(a, w), 'num')
+            return result, result.count
+        result = _dyadic_shape(glyph, a, w)
+        count = result.count
+        if glyph in '⍳∊∪∩~':
+            return result, _add(n, a.count)
+        if glyph == '?':
+            return result, count
+        return result, count if count is not None else n
+
+    def _operator(self, fn, w, a, label):
+        glyph, f = fn[1], fn[2]
+        n = w.count
+        if glyph in '/⌿':
+            axis = _reduce_axis(w, glyph == '⌿')
+            if axis is None:
+                return AbstractArray(None, _result_kind(f, w)), n
+            shape = list(w.shape)
+            length = shape[axis]
+            if a is not None:
+                window = a.ints()
+                size = abs(window[0]) if window and len(window) == 1 else None
+                shape[axis] = length - size + 1 if _known(length, size) else None
+                result = AbstractArray(tuple(shape), _result_kind(f, w))
+                if f[0] == 'prim' and f[1] in ('+', '⌈', '⌊'):
+                    return result, n
+                return result, _mul(result.count, size)
+            del shape[axis]
+            result = AbstractArray(tuple(shape), _result_kind(f, w))
+            if f[0] != 'prim':
+                return result, self._per_call(f, _item(w), _item(w), n, label)
+            return result, n
+        if glyph in '\\⍀':
+            result = AbstractArray(w.shape, _result_kind(f, w))
+            if f[0] == 'prim' and f[1] in _ASSOCIATIVE:
+                return result, n
+            axis = _reduce_axis(w, glyph == '⍀')
+            length = w.shape[axis] if axis is not None else None
+            ops = _mul(n, length)
+            ops = ops // 2 if ops is not None else None
+            if ops is not None and length and length > 1000:
+                self._note(f"{label}: non-associative scan is O(n²) per axis ({ops:,} operations)")
+            if f[0] != 'prim':
+                ops = self._per_call(f, _item(w), _item(w), ops, label)
+            return result, ops
+        if glyph == '¨':
+            if a is not None and w.count == 1:
+                shape = a.shape
+            else:
+                shape = w.shape
+            item = self.apply_quiet(f, _item(w), _item(a) if a is not None else None)
+            result = AbstractArray(shape, 'nested' if item.shape != () else item.kind)
+            count = result.count
+            return result, self._per_call(f, _item(w), _item(a) if a is not None else None,
+                                          count, label, each=True)
+        if glyph == '⌸':
+            keys = a if a is not None else w
+            result = AbstractArray((None,) if f[0] != 'dfn' else (None, None), 'num')
+            groups = keys.count
+            if f[0] != 'prim' and (groups is None or groups >= COST_HOT_CALLS):
+                self._note(f"{label}: calls its operand once per distinct key")
+            return result, _add(groups, n)
+        return _UNKNOWN, n
+
+    def _inner(self, fn, w, a, label):
+        """Inner product: m×n by n×p costs m·n·p applications of each function"""
+        f, g = fn[2], fn[3]
+        if a is None or a.shape is None or w.shape is None:
+            return _UNKNOWN, None
+        inner = (a.shape[-1] if a.shape else None) or (w.shape[0] if w.shape else None)
+        shape = a.shape[:-1] + w.shape[1:]
+        result = AbstractArray(shape, 'num')
+        ops = _mul(result.count, inner)
+        if ops is not None and ops >= COST_HOT_OPS:
+            self._note(f"large inner product {_node_text(fn)}: {_shape_text(a.shape)} by "
+                       f"{_shape_text(w.shape)} is {ops:,} multiply-adds")
+        if f[0] != 'prim' or g[0] != 'prim':
+            ops = self._per_call(g, _item(w), _item(a), ops, label)
+        return result, ops
+
+    def _derived(self, fn, w, a, label):
+        """Commute, compose and power: the cost is that of the functions they call"""
+        glyph, f = fn[1], fn[2]
+        if glyph == '⍨':
+            return self.apply(f, a if a is not None else w, w)
+        g = fn[3]
+        if glyph == '∘':
+            if g[0] in ('num', 'chr'):
+                return self.apply(f, self.value(g)[0], w)
+            if f[0] in ('num', 'chr'):
+                return self.apply(g, w, self.value(f)[0])
+            return self.apply(f, self.apply(g, w), a)
+        times = self.value(g)[0].ints() if g[0] == 'num' else None
+        ops = self.ops
+        result = self.apply(f, w, a)
+        step = self.ops - ops
+        if times and len(times) == 1:
+            self.ops += step * max(times[0] - 1, 0)
+        else:
+            self.unknown_ops = True
+            self._note(f"{label}: repeats until its condition holds ({step:,} operations per iteration)")
+        return result
+
+    def _system(self, name, w, a):
+        n = w.count
+        if name == '⎕LINEAR':
+            return AbstractArray((3,), 'num'), n
+        if name == '⎕SEASONAL':
+            period = a.ints() if a is not None else None
+            return AbstractArray((period[0] if period else SEASONAL_PERIOD,), 'num'), n
+        return AbstractArray(w.shape, 'num'), n
+
+    def _call(self, fn, w, a, label):
+        if fn[0] == 'fvar':
+            bound = self.env.get(fn[1])
+            if fn[1] == '∇':
+                self._note("recursive ∇: cost depends on the recursion depth")
+                self.unknown_ops = True
+                return _UNKNOWN
+            if type(bound) is not tuple:
+                self.unknown_ops = True
+                return _UNKNOWN
+            fn = bound[1]
+            if fn[0] != 'dfn':
+                return self.apply(fn, w, a)
+        if len(self.calls) > 8 or fn in self.calls:
+            self.unknown_ops = True
+            return _UNKNOWN
+        saved = dict(self.env)
+        self.env['⍵'] = w
+        if a is not None:
+            self.env['⍺'] = a
+        self.calls.append(fn)
+        result, peak, base = _UNKNOWN, 0, self.env_bytes()
+        try:
+            # every guard and branch is charged: an upper bound on one call
+            for statement in fn[1]:
+                local = self.env_bytes() - base
+                if statement[0] == 'guard':
+                    statement_peak = self.value(statement[1])[1]
+                    result, branch_peak = self.value(statement[2])
+                    statement_peak = max(statement_peak, branch_peak)
+                elif statement[0] in _SHY_NODES:
+                    statement_peak = self.statement(statement)[1]
+                else:
+                    result, statement_peak = self.value(statement)
+                peak = max(peak, local + statement_peak)
+        finally:
+            self.calls.pop()
+            self.env = saved
+        self.call_peak = max(peak, result.nbytes or 0)
+        return result
+
+    def apply_quiet(self, fn, w, a=None):
+        """Result of an application without charging its cost"""
+        state = (self.ops, self.unknown_ops, self.allocated, list(self.notes))
+        try:
+            return self.apply(fn, w, a)
+        finally:
+            self.ops, self.unknown_ops, self.allocated, self.notes = state
+
+    def _per_call(self, fn, w, a, calls, label, each=False):
+        """Operations for calling fn once per item; flags O(n·k) loops"""
+        ops, allocated = self.ops, self.allocated
+        self.call_peak = 0
+        result = self.apply(fn, w, a)
+        step = max(self.ops - ops, 1)
+        self.ops, self.allocated = ops, allocated
+        # one call's temporaries are live while the loop builds its result
+        self.temporaries = max(self.temporaries, self.call_peak, result.nbytes or 0)
+        if calls is None:
+            if each:
+                self._note(f"{label}: loops over an unknown number of items "
+                           f"({step:,} operations each)")
+            return None
+        total = calls * step
+        if fn[0] != 'prim' and (calls >= COST_HOT_CALLS or total >= COST_HOT_OPS):
+            self._note(f"{label}: {calls:,} interpreted calls × {step:,} operations "
+                       f"= {total:,} (O(n·k) loop)")
+        return total
+
+def _shape_text(shape):
+    if shape is None:
+        return '?'
+    return '×'.join('?' if dim is None else f"{dim:,}" for dim in shape) or 'scalar'
+
+def _item(value):
+    """Abstract item of an array: a scalar of its kind, or unknown for nested arrays"""
+    if value is None:
+        return None
+    return _UNKNOWN if value.kind == 'nested' else AbstractArray((), value.kind)
+
+def _result_kind(fn, w):
+    if fn[0] == 'prim' and fn[1] in _SCALAR_DYADIC:
+        return 'num'
+    return 'nested' if fn[0] == 'dfn' else w.kind
+
+def _reduce_axis(w, first):
+    if w.shape is None or not w.shape:
+        return None
+    return 0 if first else len(w.shape) - 1
+
+def _concat_shapes(left, right):
+    if left is None or right is None:
+        return None
+    return tuple(left) + tuple(right)
+
+def _broadcast(a, w):
+    if a.shape == () or a.count == 1:
+        return w.shape
+    if w.shape == () or w.count == 1:
+        return a.shape
+    return w.shape if w.shape is not None else a.shape
+
+def _monadic_shape(glyph, w):
+    shape = w.shape
+    if glyph in _SHAPE_PRESERVING:
+        return AbstractArray(shape, 'num' if glyph in _SCALAR_MONADIC else w.kind)
+    if glyph == '⍴':
+        return AbstractArray(None if shape is None else (len(shape),), 'num',
+                             tuple(shape) if shape is not None and None not in shape else None)
+    if glyph == '⍳':
+        n = w.ints()
+        if n is None:
+            return AbstractArray((None,) if w.shape == () else None, 'num')
+        return AbstractArray(tuple(n), 'num')
+    if glyph == ',':
+        return AbstractArray((w.count,), w.kind)
+    if glyph == '⍪':
+        if shape is None:
+            return AbstractArray(None, w.kind)
+        rest = _mul(*shape[1:]) if len(shape) > 1 else 1
+        return AbstractArray((shape[0] if shape else 1, rest), w.kind)
+    if glyph == '⍉':
+        return AbstractArray(None if shape is None else tuple(reversed(shape)), w.kind)
+    if glyph in '⍋⍒':
+        return AbstractArray(None if not shape else (shape[0],), 'num')
+    if glyph in '≡≢':
+        return AbstractArray((), 'num')
+    if glyph == '⊂':
+        return AbstractArray((), 'nested')
+    if glyph == '⍕':
+        return AbstractArray((None,), 'chr')
+    if glyph in '∪∊⍸':
+        return AbstractArray((None,), 'num' if glyph == '⍸' else w.kind)
+    return AbstractArray(None, 'nested')
+
+def _monadic_ops(glyph, w):
+    n = w.count
+    if glyph in '⍴≡≢⊂':
+        return 1
+    if glyph == '⍳':
+        return _monadic_shape(glyph, w).count
+    if glyph in '⍋⍒' and n:
+        return int(n * max(math.log2(n), 1))
+    return n
+
+def _dyadic_shape(glyph, a, w):
+    shape = w.shape
+    if glyph == '⍴':
+        dims = a.ints()
+        if dims is not None:
+            return AbstractArray(tuple(dims), w.kind)
+        rank = a.count
+        return AbstractArray(None if rank is None else (None,) * rank, w.kind)
+    if glyph in ',⍪':
+        kind = w.kind if a.kind == w.kind else 'nested'
+        if a.shape is None or shape is None:
+            return AbstractArray(None, kind)
+        if len(a.shape) <= 1 and len(shape) <= 1:
+            return AbstractArray((_add(a.count, w.count),), kind)
+        if len(a.shape) == len(shape):
+            axis = 0 if glyph == '⍪' else len(shape) - 1
+            joined = list(shape)
+            joined[axis] = _add(a.shape[axis], shape[axis])
+            return AbstractArray(tuple(joined), kind)
+        return AbstractArray(shape if len(shape) > len(a.shape) else a.shape, kind)
+    if glyph in '↑↓':
+        dims = a.ints()
+        if dims is None or shape is None:
+            return AbstractArray(None, w.kind)
+        rest = list(shape[len(dims):])
+        if glyph == '↑':
+            return AbstractArray(tuple(abs(d) for d in dims) + tuple(rest), w.kind)
+        kept = [None if dim is None else max(dim - abs(d), 0) for d, dim in zip(dims, shape)]
+        return AbstractArray(tuple(kept) + tuple(rest), w.kind)
+    if glyph in '⌽⊖⍳':
+        return AbstractArray(shape, 'num' if glyph == '⍳' else w.kind)
+    if glyph == '∊':
+        return AbstractArray(a.shape, 'num')
+    if glyph in '/⌿':
+        counts = a.ints()
+        if counts is not None and len(counts) > 1:
+            return AbstractArray((sum(counts),), w.kind)
+        if counts is not None and w.count is not None:
+            return AbstractArray((counts[0] * w.count,), w.kind)
+        return AbstractArray((None,), w.kind)
+    if glyph == '?':
+        dims = a.ints()
+        return AbstractArray((dims[0] if dims else None,), 'num')
+    if glyph == '⊤':
+        return AbstractArray(_concat_shapes(a.shape, shape), 'num')
+    if glyph == '⊥':
+        if a.shape is None or shape is None:
+            return AbstractArray(None, 'num')
+        return AbstractArray(tuple(a.shape[:-1]) + tuple(shape[1:]), 'num')
+    if glyph in '≡≢':
+        return AbstractArray((), 'num')
+    if glyph in '∪∩~':
+        return AbstractArray((None,), w.kind)
+    if glyph == '⍕':
+        return AbstractArray((None,), 'chr')
+    if glyph == '⊢':
+        return w
+    if glyph == '⊣':
+        return a
+    return AbstractArray(None, 'nested')
+
+def _add(left, right):
+    return left + right if _known(left, right) else None
+
+def estimate_csv_rows(filepath):
+    """(rows, exact) for a CSV without parsing it: cached, indexed or extrapolated"""
+    dataset = DATASET_CACHE.peek(filepath)
+    if dataset is not None:
+        return dataset.row_count, True
+    zones = load_zone_map(filepath)
+    if zones is not None:
+        return zones.rows, True
+    _, data_start, size = _csv_header(filepath)
+    if data_start is None:
+        return None, False
+    with open(filepath, 'rb') as f:
+        f.seek(data_start)
+        block = f.read(1 << 20)
+    rows = block.count(b'\n') + (1 if block and not block.endswith(b'\n') else 0)
+    if data_start + len(block) >= size or not block:
+        return rows, True
+    return round((size - data_start) * rows / len(block)), False
+
+def _cost_inputs(options, symbols):
+    """Abstract values for program inputs from 'using "file.csv"' and 'with NAME=N[xM]'"""
+    inputs, notes = {}, []
+    names = symbols['inputs'] if symbols else ()
+    using = re.search(r'\busing\s+"([^"]+)"', options)
+    if using:
+        filepath = Path(using.group(1))
+        if not filepath.exists() and (Path('examples') / filepath).exists():
+            filepath = Path('examples') / filepath
+        columns, _, _ = _csv_header(filepath)
+        rows, exact = estimate_csv_rows(filepath)
+        notes.append(f"{filepath.name}: {'' if exact else '~'}"
+                     f"{'?' if rows is None else f'{rows:,}'} rows, {len(columns)} columns")
+        lookup = {column.upper(): column for column in columns}
+        for name in names:
+            if name.upper() in lookup:
+                inputs[name] = AbstractArray((rows,), 'num')
+            elif name.upper() == 'DATA':
+                inputs[name] = AbstractArray((rows, len(columns)), 'num')
+    for name, dims in re.findall(r'([^\s=]+)\s*=\s*(\d+(?:x\d+)*)', options):
+        # a variable the program assigns is not an input: sizing it would
+        # charge its size to every line before the assignment
+        if symbols and name in symbols['variables']:
+            notes.append(f"{name}={dims} ignored: the program assigns {name}")
+            continue
+        if symbols and name not in names:
+            notes.append(f"{name}={dims} ignored: the program never reads {name}")
+            continue
+        inputs[name] = AbstractArray(tuple(int(d) for d in dims.split('x')), 'num')
+    unsized = [name for name in names if name not in inputs]
+    if unsized:
+        notes.append(f"unsized inputs (shape ?): {', '.join(unsized)}")
+    return inputs, notes
+
+def analyze_program_costs(program, inputs=None):
+    """Per-statement shapes, operations, allocations and peaks of a parsed program"""
+    analyzer = CostAnalyzer(inputs)
+    rows = []
+    for line, statement in program:
+        analyzer.ops, analyzer.unknown_ops, analyzer.allocated, analyzer.notes = 0, False, 0, []
+        held = analyzer.env_bytes()
+        try:
+            value, peak = analyzer.statement(statement)
+        except (APLError, ArithmeticError, ValueError, TypeError, IndexError):
+            value, peak = _UNKNOWN, 0
+            analyzer.unknown_ops = True
+        rows.append({
+            'line': line,
+            'summary': describe_statement(statement),
+            'shape': None if value is None else value.describe(),
+            'ops': analyzer.ops,
+            'partial': analyzer.unknown_ops,
+            'allocated': analyzer.allocated,
+            'peak': held + peak,
+            'notes': analyzer.notes,
+        })
+    return rows
+
+def explain_apl_code(filename, options=''):
+    """Explain what an APL program does and estimate what each line costs"""
+    filepath = Path(filename)
+    if not filepath.exists():
+        examples_path = Path('examples') / filename
+        if examples_path.exists():
+            filepath = examples_path
+        else:
+            return f"❌ File not found: {filename}"
+    using = re.search(r'\busing\s+"([^"]+)"', options)
+    if using and not Path(using.group(1)).exists() and not (Path('examples') / using.group(1)).exists():
+        return f"❌ File not found: {using.group(1)}"
+    
+    try:
+        content = filepath.read_text(encoding='utf-8')
+        lines = content.split('\n')
+        
+        explanation = f"📝 APL Code Explanation for {filepath.name}:\n\n"
+        try:
+            program, symbols, _ = compile_apl_source(content)
+        except APLError as error:
+            program, symbols = (), None
+            explanation += f"⚠️ Parse error: {error}\n\n"
+        inputs, input_notes = _cost_inputs(options, symbols)
+        costs = {}
+        for row in analyze_program_costs(program, inputs):
+            costs.setdefault(row['line'], []).append(row)
+        
+        for i, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+                
+            if line.startswith('⍝'):
+                explanation += f"Line {i}: Comment - {line[1:].strip()}\n"
+                continue
+            for row in costs.get(i, ()):
+                if row['summary'] == 'outputs text':
+                    explanation += f"Line {i}: Outputs text to display\n"
+                    continue
+                ops = f"{'≥' if row['partial'] else ''}{row['ops']:,}"
+                shape = f" → {row['shape']}" if row['shape'] else ''
+                explanation += (f"Line {i}: {row['summary']}{shape} · {ops} ops · "
+                                f"allocates {format_size(row['allocated'])} · "
+                                f"peak {format_size(row['peak'])}\n")
+                for note in row['notes']:
+                    explanation += f"   🔥 {note}\n"
+            if i not in costs:
+                explanation += f"Line {i}: {line}\n"
+        
+        rows = [row for line_rows in costs.values() for row in line_rows]
+        if rows:
+            total = sum(row['ops'] for row in rows)
+            hot = sum(len(row['notes']) for row in rows)
+            explanation += "\n📐 Cost estimate (static, before running):\n"
+            explanation += (f"• Element operations: {'≥' if any(row['partial'] for row in rows) else ''}"
+                            f"{total:,}\n")
+            explanation += f"• Allocations: {format_size(sum(row['allocated'] for row in rows))}\n"
+            explanation += f"• Peak memory: {format_size(max(row['peak'] for row in rows))}\n"
+            explanation += f"• Hot spots: {hot}\n"
+            for note in input_notes:
+                explanation += f"• {note}\n"
+        
+        if symbols:
+            explanation += "\n🔎 Symbols:\n"
+            for label, key in (('Variables', 'variables'), ('Functions', 'functions'),
+                               ('Inputs (read, never assigned)', 'inputs')):
+                if symbols[key]:
+                    explanation += f"• {label}: {', '.join(symbols[key])}\n"
+        
+        explanation += f"\n💡 APL Key Concepts:\n"
+        explanation += f"• Arrays are fundamental - everything operates on arrays\n"
+        explanation += f"• Operations are vectorized automatically\n" 
+        explanation += f"• Concise syntax - one line can do complex operations\n"
+        explanation += f"• Right-to-left evaluation (like math notation)\n"
+        
+        return explanation
+        
+    except Exception as e:
+        return f"❌ Error reading {filename}: {str(e)}"
+
+# Benchmarks
+#
+# Every case is prepared outside the timed region, warmed up, then timed
+# BENCHMARK_REPEAT times with time.perf_counter. Inputs are generated from a
+# fixed seed so runs on different machines or commits are comparable.
+
+BENCHMARK_SIZES = (1000, 10000, 100000)
+BENCHMARK_REPEAT = 7
+BENCHMARK_WARMUP = 2
+BENCHMARK_SUITES = ('load', 'metrics', 'analyze', 'apl')
+_BENCHMARK_ALIASES = {'matrix': ('apl',), 'sum': ('apl',), 'all': BENCHMARK_SUITES}
+
+def measure(fn, repeat=BENCHMARK_REPEAT, warmup=BENCHMARK_WARMUP):
+    """Time fn() after warm-up; returns min/median/p95/mean seconds"""
+    for _ in range(warmup):
+        fn()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    median, p95 = exact_quantiles(runs, (0.5, 0.95))
+    return {'min': min(runs), 'median': median, 'p95': p95,
+            'mean': sum(runs) / len(runs), 'runs': runs}
+
+def _benchmark_csv(directory, size):
+    """Write a deterministic sales-style CSV with size rows"""
+    rng = random.Random(size)
+    path = Path(directory) / f"bench_{size}.csv"
+    regions = ['North', 'South', 'East', 'West']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'amount', 'region', 'score'])
+        for i in range(size):
+            writer.writerow([i, round(rng.uniform(1, 1000), 2), rng.choice(regions),
+                             rng.randint(1, 5)])
+    return path
+
+def _apl_benchmark(source, scope):
+    statement = parse_apl_program(source)[0][1]
+    return lambda: execute_apl_statement(statement, scope)
+
+def _benchmark_cases(suites, size, directory, baselines):
+    """Yield (suite, name, fn) for one data size"""
+    rng = random.Random(size)
+    if {'load', 'metrics', 'analyze'} & set(suites):
+        path = _benchmark_csv(directory, size)
+        if 'load' in suites:
+            yield 'load', 'csv parse', lambda: parse_csv_dataset(path)
+            write_sidecar(parse_csv_dataset(path))
+            yield 'load', 'sidecar map', lambda: load_sidecar(path)
+            if 'pandas' in baselines:
+                yield 'load', 'pandas.read_csv', lambda: baselines['pandas'].read_csv(path)
+        if 'metrics' in suites:
+            yield 'metrics', 'calculate metrics', lambda: calculate_metrics(str(path), 'metrics')
+            yield 'metrics', 'calculate metrics stream', lambda: calculate_metrics(str(path), 'metrics', 'stream')
+            if 'pandas' in baselines:
+                frame = baselines['pandas'].read_csv(path)
+                yield 'metrics', 'pandas describe', lambda: frame.describe()
+        if 'analyze' in suites:
+            yield 'analyze', 'trend predict', lambda: analyze_data_advanced(str(path), 'trend predict')
+    if 'apl' in suites:
+        values = array('d', (rng.random() for _ in range(size)))
+        side = max(int(math.sqrt(size)), 1)
+        scope = APLScope()
+        scope['V'] = apl_vector(values)
+        scope['M'] = APLArray((side, side), values[:side * side])
+        yield 'apl', '+/V', _apl_benchmark('+/V', scope)
+        yield 'apl', 'V×V+1', _apl_benchmark('V×V+1', scope)
+        yield 'apl', '⍋V', _apl_benchmark('⍋V', scope)
+        yield 'apl', '+\\V', _apl_benchmark('+\\V', scope)
+        yield 'apl', f'M+.×M ({side}x{side})', _apl_benchmark('M+.×M', scope)
+        if 'numpy' in baselines:
+            np = baselines['numpy']
+            v = np.frombuffer(values, dtype=np.float64)
+            m = v[:side * side].reshape(side, side)
+            yield 'apl', 'numpy sum', lambda: v.sum()
+            yield 'apl', 'numpy v*(v+1)', lambda: v * (v + 1)
+            yield 'apl', 'numpy argsort', lambda: v.argsort(kind='stable')
+            yield 'apl', 'numpy cumsum', lambda: v.cumsum()
+            yield 'apl', f'numpy m@m ({side}x{side})', lambda: m @ m
+
+def _benchmark_baselines():
+    """Optional third-party libraries to time alongside New APL"""
+    baselines = {}
+    for name in ('numpy', 'pandas'):
+        try:
+            baselines[name] = __import__(name)
+        except ImportError:
+            pass
+    return baselines
+
+def run_benchmarks(suites=BENCHMARK_SUITES, sizes=BENCHMARK_SIZES,
+                   repeat=BENCHMARK_REPEAT, warmup=BENCHMARK_WARMUP, backend=None):
+    """Run the benchmark suites on backend (default: this thread's); returns a JSON-serializable report"""
+    import platform
+    import tempfile
+    backend = backend or active_backend()
+    baselines = _benchmark_baselines()
+    results = []
+    with tempfile.TemporaryDirectory() as directory, using_backend(backend):
+        try:
+            for size in sizes:
+                for suite, name, fn in _benchmark_cases(suites, size, directory, baselines):
+                    timing = measure(fn, repeat, warmup)
+                    results.append(dict(suite=suite, name=name, size=size, **timing))
+        finally:
+            # Drop the temporary datasets (and their sidecar mappings)
+            DATASET_CACHE.clear()
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'warmup': warmup,
+        'backend': backend.name,
+        'baselines': {name: module.__version__ for name, module in baselines.items()},
+        'results': results,
+    }
+
+def _format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:8.2f} ms"
+    return f"{seconds:8.3f} s "
+
+def benchmark_operation(operation):
+    """Benchmark data commands and APL primitives"""
+    try:
+        words = operation.lower()
+        suites = [s for s in BENCHMARK_SUITES if re.search(rf'\b{s}\b', words)]
+        for alias, expansion in _BENCHMARK_ALIASES.items():
+            if re.search(rf'\b{alias}\b', words):
+                suites.extend(s for s in expansion if s not in suites)
+        if not suites:
+            return (f"Benchmark '{operation}' not recognized. "
+                    f"Try one of: {', '.join(BENCHMARK_SUITES + ('all',))}.")
+        sizes = re.search(r'sizes? ([\d,]+)', words)
+        sizes = tuple(int(s) for s in sizes.group(1).split(',') if s) if sizes else BENCHMARK_SIZES
+        repeat = re.search(r'repeat (\d+)', words)
+        repeat = max(int(repeat.group(1)), 1) if repeat else BENCHMARK_REPEAT
+        output = re.search(r'json "([^"]+)"', operation)
+        baseline = re.search(r'compare "([^"]+)"', operation)
+        chosen = re.search(r'\bbackend (\w+)', words)
+
+        backend = make_backend(chosen.group(1)) if chosen else active_backend()
+        print(f"🏁 Benchmarking: {', '.join(suites)} at sizes {', '.join(f'{s:,}' for s in sizes)}"
+              f" on the {backend.name} backend")
+        report = run_benchmarks(suites, sizes, repeat, backend=backend)
+        previous = {}
+        if baseline:
+            with open(baseline.group(1), encoding='utf-8') as f:
+                previous = {(r['suite'], r['name'], r['size']): r['median']
+                            for r in json.load(f)['results']}
+
+        result = (f"⚡ Benchmark Results ({repeat} runs after {BENCHMARK_WARMUP} warm-up, "
+                  f"perf_counter, {report['backend']} backend):\n")
+        result += f"{'case':<34}{'size':>10}{'median':>13}{'p95':>13}{'min':>13}\n"
+        for r in report['results']:
+            line = (f"{r['suite'] + ': ' + r['name']:<34}{r['size']:>10,}"
+                    f"{_format_seconds(r['median']):>13}{_format_seconds(r['p95']):>13}"
+                    f"{_format_seconds(r['min']):>13}")
+            old = previous.get((r['suite'], r['name'], r['size']))
+            if old:
+                line += f"  {r['median'] / old:5.2f}x vs baseline"
+            result += line + "\n"
+        if report['baselines']:
+            result += f"📦 Baselines: {', '.join(f'{k} {v}' for k, v in report['baselines'].items())}\n"
+        else:
+            result += "📦 NumPy/pandas not installed: baseline cases skipped\n"
+        if output:
+            with open(output.group(1), 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            result += f"💾 Results written to {output.group(1)}\n"
+        return result.rstrip()
+    except Exception as e:
+        return f"❌ Benchmark failed: {str(e)}"
+
+def show_help():
+    """Show available commands"""
+    return """📖 New APL Commands:
+
+🔧 Data Operations:
+  load data "filename.csv"              - Load and analyze CSV data
+  load data "filename.csv" sidecar      - Also write a binary .napl sidecar for instant reloads
+  load data "filename.csv" index        - Also write a .zmap zone map (per-block sums, min/max)
+  load data "filename.csv" parallel [N] - Parse on N processes (default: all cores)
+  load data "sales/2026-10-*.csv"       - Load a glob or directory of partitions as one dataset
+  load data "sales/" partition as day   - Also add a column holding each row's file name
+  load data "history.csv.gz"            - Read .gz/.bz2/.xz CSVs directly, streamed
+  analyze data "file.csv" trend predict - Advanced analysis with insights
+  analyze data "f.csv" rolling 7 ema 0.3 - Rolling mean/min/max and exponential smoothing
+  analyze data "f.csv" linear seasonal 12 - Least-squares trend and seasonal offsets
+  calculate metrics from "file.csv"     - Statistical calculations
+  calculate metrics from "f.csv" stream - Constant-memory single-pass metrics
+  calculate metrics from "f.csv" by col - Per-group metrics in one hash pass
+  calculate distinct from "f.csv"       - Distinct values per column
+  calculate metrics from "f.csv" index  - Answer totals/ranges from the zone map, no rescan
+  calculate metrics from "f.csv" stream exact - Exact median/quartiles in bounded memory
+  ... sample 50000 / approx [refine]     - Estimate from a uniform sample with 95% intervals
+  refine [N]                            - List background exact refinements or show one
+  ... where region = "North" and x > 5 - Filter load/analyze/calculate while parsing (options may follow)
+  follow data "log.csv" [every 5]       - Incremental trend/predict/metrics on an append-only CSV
+
+📊 APL Programs:
+  show examples                         - List available examples
+  run "filename.apl"                    - Execute APL program
+  explain "filename.apl"                - Get code explanation with per-line shapes and costs
+  explain "p.apl" using "data.csv"      - Size the program's inputs from CSV columns (or with V=1000000)
+
+🧮 APL primitives (inside .apl programs, not REPL commands):
+  3 +/ V  ·  3 ⌈/ V                     - N-wise reduction: rolling sums, maxima (O(n))
+  0.3 ⎕EMA V · ⎕LINEAR V · 12 ⎕SEASONAL V - Smoothing, slope/intercept/r², seasonal offsets
+
+⚡ Performance:
+  benchmark all                         - Time load, metrics, analyze and APL primitives
+  benchmark apl sizes 1000,1000000      - Choose suites and data sizes
+  benchmark load repeat 15 json "b.json" - Set repeats and save JSON results
+  benchmark all compare "b.json"        - Compare medians against a saved run
+  benchmark apl backend python          - Time on one array backend (python or numpy)
+  backend [auto|python|numpy]           - Show or switch the array backend
+  sort budget [MB]                      - Memory for in-memory sorts; larger columns spill sorted runs
+  profile on [memory]                   - Print per-phase timings after each command
+  profile export chrome "trace.json"    - Save spans as JSON or a Chrome trace
+  <any command> &                       - Run it in the background and keep working
+  jobs · wait [N] · cancel N            - Show progress/throughput, collect a result, stop a job
+  profile off                           - Stop profiling (profile clear drops spans)
+
+🗄️ Caches:
+  cache stats                           - Show cached datasets, hit rate and compiled programs
+  cache clear                           - Release cached datasets and compiled programs
+  cache budget 256                      - Set the cache memory budget (MB)
+
+📡 Server:
+  python app.py --serve [host:port]     - Answer commands as JSON lines (default 127.0.0.1:8765)
+  python app.py --serve=unix:/tmp/apl   - Serve on a Unix socket instead
+
+💡 Examples:
+  load data "sales_data.csv"
+  analyze data "customer_data.csv" trend predict visualize  
+  run "sales_analysis.apl"
+  benchmark matrix
 
 ❓ Help:
   help                                  - Show this help
@@ -629,14 +6946,25 @@ def new_apl_cli():
             command = input("New APL> ").strip()
             
             if command.lower() in ['exit', 'quit', 'q']:
+                running = [job for job in JOBS if not job.future.done()]
+                for job in running:
+                    job.cancel_requested.set()
+                if running:
+                    print(f"⏹️ Cancelled {len(running)} running job(s)")
                 print("👋 Thanks for using New APL!")
                 break
             
             if not command:
                 continue
                 
-            result = parse_natural_syntax(command)
+            try:
+                result = parse_natural_syntax(command)
+            except KeyboardInterrupt:
+                # Ctrl-C stops the command in the foreground, not the session
+                result = "⏹️ Interrupted (end a command with '&' to keep working while it runs)"
             print(result)
+            for notice in job_notices():
+                print(notice)
             print("")
             
         except KeyboardInterrupt:
@@ -646,8 +6974,166 @@ def new_apl_cli():
             print(f"❌ Something went wrong: {e}")
             print("Type 'help' for available commands")
 
+# ---------------------------------------------------------------------------
+# Server mode
+#
+# "python app.py --serve" keeps one interpreter, and its dataset and program
+# caches, alive behind a local TCP or Unix socket. Each request is one line,
+# either a plain command or {"id": ..., "command": "..."}, and each answer is
+# one JSON line. Commands run on a thread pool so a dataset loaded by one
+# client is shared by all of them; answers on a connection may arrive out of
+# order, so clients that pipeline requests should send ids. The threads
+# share one GIL: requests overlap while they wait on sockets, files or the
+# CSV parser's process pool (NEW_APL_WORKERS), but pure-Python work - APL
+# evaluation, statistics on loaded columns - runs one request at a time.
+# ---------------------------------------------------------------------------
+
+SERVER_ADDRESS = os.getenv('NEW_APL_SERVE', '127.0.0.1:8765')
+SERVER_WORKERS = int(os.getenv('NEW_APL_SERVER_WORKERS', '0')) or min(32, (os.cpu_count() or 1) + 4)
+SERVER_LINE_LIMIT = 1 << 20
+
+class _ThreadOutput(io.TextIOBase):
+    """sys.stdout stand-in that captures prints made by server worker threads"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    @property
+    def encoding(self):
+        return getattr(self.stream, 'encoding', 'utf-8')
+
+    def capture(self):
+        self._local.buffer = io.StringIO()
+
+    def release(self):
+        buffer, self._local.buffer = self._local.buffer, None
+        return buffer.getvalue()
+
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def _serve_request(command):
+    """Run one client command on a worker thread, capturing its printed output"""
+    sys.stdout.capture()
+    start = time.perf_counter()
+    try:
+        result = parse_natural_syntax(command)
+    except Exception as e:
+        result = f"❌ Something went wrong: {e}"
+    finally:
+        output = sys.stdout.release()
+    return result, output, time.perf_counter() - start
+
+def _parse_request(line):
+    """Return (id, command) from a plain-text or JSON request line"""
+    text = line.decode('utf-8', 'replace').strip()
+    if not text.startswith('{'):
+        return None, text
+    request = json.loads(text)
+    if not isinstance(request, dict) or not isinstance(request.get('command'), str):
+        raise ValueError('expected {"command": "..."}')
+    return request.get('id'), request['command'].strip()
+
+async def _serve_client(reader, writer, executor):
+    """Answer every request on one connection without waiting for earlier answers"""
+    loop = asyncio.get_event_loop()
+    pending = set()
+
+    async def answer(request_id, command):
+        if re.search(r'follow data .*\bevery\b', command, re.IGNORECASE):
+            result, output, seconds = "❌ 'every' polls forever; send 'follow data' again to refresh", '', 0.0
+        else:
+            result, output, seconds = await loop.run_in_executor(executor, _serve_request, command)
+        response = {
+            'id': request_id,
+            'ok': not result.startswith(('❌', 'Command not recognized')),
+            'result': result,
+            'output': output,
+            'ms': round(seconds * 1000, 3),
+        }
+        writer.write((json.dumps(response, ensure_ascii=False) + '\n').encode('utf-8'))
+        await writer.drain()
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                request_id, command = _parse_request(line)
+            except ValueError as e:
+                writer.write((json.dumps({'id': None, 'ok': False, 'result': f"❌ Bad request: {e}"},
+                                         ensure_ascii=False)
+                              + '\n').encode('utf-8'))
+                continue
+            if not command:
+                continue
+            if command.lower() in ['exit', 'quit', 'q']:
+                break
+            task = loop.create_task(answer(request_id, command))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.wait(pending)
+    except (ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+def serve(address=None):
+    """Answer commands on a local TCP (host:port) or Unix (unix:path) socket until interrupted"""
+    address = address or SERVER_ADDRESS
+    executor = ThreadPoolExecutor(max_workers=SERVER_WORKERS)
+    socket_path = Path(address[5:]) if address.startswith('unix:') else None
+    stdout, sys.stdout = sys.stdout, _ThreadOutput(sys.stdout)
+
+    async def main():
+        handler = functools.partial(_serve_client, executor=executor)
+        if socket_path is not None:
+            if socket_path.is_socket():
+                socket_path.unlink()
+            server = await asyncio.start_unix_server(handler, str(socket_path), limit=SERVER_LINE_LIMIT)
+        else:
+            host, _, port = address.rpartition(':')
+            server = await asyncio.start_server(handler, host or '127.0.0.1', int(port),
+                                                limit=SERVER_LINE_LIMIT)
+        where = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"📡 New APL serving on {where} with {SERVER_WORKERS} worker threads "
+              f"sharing one interpreter (Ctrl-C to stop)")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\n👋 New APL server stopped")
+    except (OSError, ValueError) as e:
+        print(f"❌ Cannot serve on {address}: {e}")
+    finally:
+        executor.shutdown(wait=True)
+        sys.stdout = stdout
+        if socket_path is not None and socket_path.is_socket():
+            socket_path.unlink()
+
 if __name__ == "__main__":
+    for flag in [a for a in sys.argv[1:] if a.startswith('--profile')]:
+        PROFILER.enable(trace_memory=flag.split('=', 1)[0] == '--profile-memory')
+        if '=' in flag:
+            atexit.register(PROFILER.export, flag.split('=', 1)[1], chrome=True)
+    for flag in [a for a in sys.argv[1:] if a.startswith('--backend=')]:
+        try:
+            set_backend(flag.split('=', 1)[1])
+        except ValueError as e:
+            print(f"❌ {e}; using the {BACKEND.name} backend")
+    serving = [a for a in sys.argv[1:] if a == '--serve' or a.startswith('--serve=')]
     if is_generator_mode():
         generate_project()
+    elif serving:
+        serve(serving[-1].partition('=')[2])
     else:
         new_apl_cli()
\ No newline at end of file
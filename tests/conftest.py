@@ -0,0 +1,33 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    """Write rows (header first) to a CSV under tmp_path and return its path"""
+    def write(name, rows):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(''.join(','.join(map(str, row)) + '\n' for row in rows))
+        return path
+    return write
+
+
+@pytest.fixture
+def apl():
+    """Evaluate APL source in a fresh scope and return the last statement's value"""
+    import app
+
+    def run(source, **variables):
+        scope = app.APLScope()
+        for name, value in variables.items():
+            scope[name] = value
+        value = None
+        for _, statement in app.parse_apl_program(source):
+            value = app.execute_apl_statement(statement, scope)
+        return value
+    return run
@@ -0,0 +1,66 @@
+import random
+import threading
+from array import array
+
+import pytest
+
+import app
+
+
+class CountingBackend(app.PythonBackend):
+    name = 'counting'
+
+    def __init__(self):
+        self.calls = 0
+
+    def reduce(self, glyph, values):
+        self.calls += 1
+        return super().reduce(glyph, values)
+
+
+def test_using_backend_is_scoped_to_the_thread(apl):
+    backend = CountingBackend()
+    seen = []
+    with app.using_backend(backend):
+        thread = threading.Thread(target=lambda: seen.append(app.active_backend()))
+        thread.start()
+        thread.join()
+        assert apl('+/⍳10').data[0] == 55
+    assert backend.calls == 1
+    assert seen == [app.BACKEND]
+    assert app.active_backend() is app.BACKEND
+
+
+def test_benchmark_backend_leaves_session_backend_alone(monkeypatch):
+    session = app.BACKEND
+    chosen = []
+
+    def measure(fn, repeat, warmup):
+        chosen.append(app.active_backend().name)
+        return {'min': 0.0, 'median': 0.0, 'p95': 0.0, 'mean': 0.0, 'runs': [0.0]}
+    monkeypatch.setattr(app, 'measure', measure)
+    result = app.benchmark_operation('apl sizes 16 backend python')
+    assert 'python backend' in result
+    assert set(chosen) == {'python'}
+    assert app.BACKEND is session
+
+
+def test_numpy_matches_python_kernels():
+    pytest.importorskip('numpy')
+    rng = random.Random(19)
+    n = app.NUMPY_MIN_LENGTH * 4
+    values = array('d', (rng.uniform(-100, 100) for _ in range(n)))
+    python, numpy = app.PythonBackend(), app.NumpyBackend()
+    for glyph in '+⌈⌊':
+        assert numpy.reduce(glyph, values) == pytest.approx(python.reduce(glyph, values))
+        assert list(numpy.scan(glyph, values)) == pytest.approx(list(python.scan(glyph, values)))
+    for glyph in '+-×÷':
+        assert (list(numpy.elementwise(glyph, values, 3.0, n))
+                == pytest.approx(list(python.elementwise(glyph, values, 3.0, n))))
+    assert numpy.sort(values) == python.sort(values)
+    assert numpy.grade(values, True) == python.grade(values, True)
+    assert numpy.moments(values) == pytest.approx(python.moments(values))
+    side = 40
+    square = values[:side * side]
+    assert (list(numpy.matmul(square, square, side, side, side))
+            == pytest.approx(list(python.matmul(square, square, side, side, side))))
@@ -0,0 +1,42 @@
+import json
+
+import app
+
+
+def test_measure_reports_every_run():
+    calls = []
+    timing = app.measure(lambda: calls.append(1), repeat=3, warmup=2)
+    assert len(calls) == 5
+    assert len(timing['runs']) == 3
+    assert timing['min'] <= timing['median'] <= timing['p95']
+
+
+def test_report_schema_and_cache_cleanup():
+    report = app.run_benchmarks(('metrics', 'apl'), (40,), repeat=1, warmup=0)
+    assert {'timestamp', 'python', 'platform', 'cpu_count', 'repeat', 'warmup',
+            'backend', 'baselines', 'results'} <= set(report)
+    assert report['repeat'] == 1 and report['backend'] == app.active_backend().name
+    suites = {result['suite'] for result in report['results']}
+    assert suites == {'metrics', 'apl'}
+    for result in report['results']:
+        assert result['size'] == 40
+        assert set(result) == {'suite', 'name', 'size', 'min', 'median', 'p95', 'mean', 'runs'}
+        assert len(result['runs']) == 1
+    assert app.DATASET_CACHE.stats()['entries'] == []
+    json.dumps(report)
+
+
+def test_json_output_and_compare(tmp_path):
+    saved = tmp_path / 'bench.json'
+    first = app.benchmark_operation(f'apl sizes 16 repeat 1 json "{saved}"')
+    assert f'💾 Results written to {saved}' in first
+    assert 'x vs baseline' not in first
+    cases = json.loads(saved.read_text())['results']
+    assert {case['name'] for case in cases} >= {'+/V', '⍋V'}
+    compared = app.benchmark_operation(f'apl sizes 16 repeat 1 compare "{saved}"')
+    lines = [line for line in compared.splitlines() if line.startswith('apl: ')]
+    assert lines and all(line.rstrip().endswith('x vs baseline') for line in lines)
+
+
+def test_unknown_suite_is_reported():
+    assert app.benchmark_operation('nothing here').startswith("Benchmark 'nothing here' not recognized")
@@ -0,0 +1,42 @@
+import functools
+import random
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def customers(write_csv):
+    rng = random.Random(8)
+    rows = [('name', 'segment', 'spend')]
+    rows += [(f"c{i}", rng.choice(['retail', 'wholesale', 'online', '']), rng.randint(1, 900))
+             for i in range(3000)]
+    return write_csv('customers.csv', rows)
+
+
+def test_low_cardinality_text_becomes_a_category(customers):
+    dataset = app.parse_csv_dataset(customers)
+    segment = dataset.columns['segment']
+    assert segment.kind == 'category'
+    assert segment.codes.itemsize == 1
+    assert sorted(segment.categories) == ['', 'online', 'retail', 'wholesale']
+    assert dataset.columns['name'].kind == 'text'
+
+
+def test_range_dictionaries_merge_into_one(customers, monkeypatch):
+    serial = app.parse_csv_dataset(customers)
+    monkeypatch.setattr(app, '_csv_ranges', functools.partial(app._csv_ranges, range_bytes=2048))
+    split = app.parse_csv_dataset(customers, workers=2)
+    assert split.columns['segment'].kind == 'category'
+    assert list(split.columns['segment']) == list(serial.columns['segment'])
+    expected = [line.split(',')[1] for line in customers.read_text().splitlines()[1:]]
+    assert list(serial.columns['segment']) == expected
+
+
+def test_distinct_counts_agree_with_streamed_counts(customers):
+    in_memory = app.distinct_counts(customers)
+    streamed = app.distinct_counts(customers, streaming=True)
+    assert 'segment: 4 (dictionary)' in in_memory
+    assert 'segment: 4 (streamed)' in streamed
+    assert '\nAPL equivalent:\nDISTINCT ← ≢∪COLUMN' in in_memory
@@ -0,0 +1,40 @@
+import math
+
+import app
+
+
+def _cells(column):
+    return ['nan' if type(x) is float and math.isnan(x) else x for x in column]
+
+
+def test_types_blanks_and_text_fallback(tmp_path):
+    path = tmp_path / 'mixed.csv'
+    path.write_text('\ufeffn,mixed,empty,label,short\n'
+                    '1,1.0,,a,5\n2.5,2,,b\n-3,x,,a,7\n,1e3,,b,\n', encoding='utf-8')
+    dataset = app.parse_csv_dataset(path)
+    assert dataset.row_count == 4
+    assert dataset.column_names == ['n', 'mixed', 'empty', 'label', 'short']
+    kinds = {name: column.kind for name, column in dataset.columns.items()}
+    assert kinds == {'n': 'number', 'mixed': 'text', 'empty': 'number',
+                     'label': 'category', 'short': 'number'}
+    assert _cells(dataset.columns['n']) == [1.0, 2.5, -3.0, 'nan']
+    assert dataset.columns['n'].missing == 1
+    # a column demoted to text keeps its raw cells, not reformatted numbers
+    assert list(dataset.columns['mixed']) == ['1.0', '2', 'x', '1e3']
+    assert dataset.columns['empty'].missing == 4
+    assert list(dataset.columns['label']) == ['a', 'b', 'a', 'b']
+    assert _cells(dataset.columns['short']) == [5.0, 'nan', 7.0, 'nan']
+    assert [column.name for column in dataset.numeric_columns()] == ['n', 'empty', 'short']
+
+
+def test_text_found_after_the_first_chunk_demotes_the_whole_column(tmp_path):
+    rows = app.DATASET_CHUNK_ROWS + 10
+    path = tmp_path / 'late.csv'
+    path.write_text('id,code\n' + ''.join(f'{i},{"late" if i == rows - 1 else f"{i}.0"}\n'
+                                          for i in range(rows)))
+    dataset = app.parse_csv_dataset(path)
+    code = dataset.columns['code']
+    assert code.kind == 'text'
+    assert code[0] == '0.0' and code[rows - 1] == 'late'
+    assert dataset.columns['id'].kind == 'number'
+    assert len(code) == dataset.row_count == rows
@@ -0,0 +1,43 @@
+import bz2
+import gzip
+import lzma
+import math
+
+import pytest
+
+import app
+
+OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+SUFFIXES = {'gzip': '.gz', 'bz2': '.bz2', 'xz': '.xz'}
+
+
+def _cells(dataset):
+    return {name: [('nan' if type(x) is float and math.isnan(x) else x) for x in column]
+            for name, column in dataset.columns.items()}
+
+
+@pytest.mark.parametrize('compression', sorted(OPENERS))
+def test_compressed_csv_matches_plain(tmp_path, monkeypatch, compression):
+    # small blocks so the prefetch thread hands over many pieces
+    monkeypatch.setattr(app, 'DECOMPRESS_BLOCK', 4096)
+    text = 'day,sales,region\n' + ''.join(
+        f"{i},{'' if i % 13 == 0 else i * 2.5},\"r{i % 3}\nx\"\n" for i in range(4000))
+    plain = tmp_path / 'history.csv'
+    plain.write_text(text)
+    packed = tmp_path / ('history.csv' + SUFFIXES[compression])
+    with OPENERS[compression](packed, 'wt', newline='') as f:
+        f.write(text)
+    assert app.compression_of(packed) == compression
+    assert app.compression_of(plain) is None
+    expected = app.parse_csv_dataset(plain)
+    streamed = app.parse_csv_dataset(packed)
+    assert streamed.row_count == expected.row_count == 4000
+    assert _cells(streamed) == _cells(expected)
+
+
+def test_corrupt_stream_raises(tmp_path):
+    packed = tmp_path / 'broken.csv.gz'
+    packed.write_bytes(gzip.compress(b'a,b\n' + b'1,2\n' * 1000)[:-40])
+    with pytest.raises((OSError, EOFError)):
+        with app.open_csv_text(packed) as f:
+            f.read()
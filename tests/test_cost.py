@@ -0,0 +1,61 @@
+import app
+
+
+def costs(source, inputs=None):
+    program, _, _ = app.compile_apl_source(source)
+    return app.analyze_program_costs(program, inputs)
+
+
+def test_strand_of_expressions_is_not_a_literal():
+    rows = costs("A←1\nS←(1 2) (3 4)\nT←(A) (A+1) (A+2)")
+    assert rows[1]['summary'] == 'S ← literal'
+    assert rows[2]['summary'] == 'T ← strand of A, add +, add +'
+
+
+def test_shapes_and_operations_propagate():
+    rows = costs("V←⍳1000\nM←10 100⍴V\nS←+/M")
+    assert [row['shape'] for row in rows] == ['1,000 num', '10×100 num', '10 num']
+    assert rows[0]['ops'] == 1000
+    assert rows[2]['peak'] >= 2 * 1000 * 8
+
+
+def test_with_sizes_only_inputs_the_program_never_assigns():
+    source = "S←+/V\nX←⍳10\nY←X+V"
+    program, symbols, _ = app.compile_apl_source(source)
+    inputs, notes = app._cost_inputs('with V=1000000 with X=1000000', symbols)
+    assert set(inputs) == {'V'}
+    assert 'X=1000000 ignored: the program assigns X' in notes
+    rows = app.analyze_program_costs(program, inputs)
+    assert rows[0]['peak'] < 9_000_000
+
+
+def test_each_loop_temporaries_count_towards_peak():
+    rows = costs("V←⍳1000\nR←{+/⍳100000}¨V")
+    assert rows[1]['peak'] >= 100000 * 8 + 2 * 1000 * 8
+    assert any('interpreted calls' in note for note in rows[1]['notes'])
+
+
+def test_explain_reports_the_cost_summary(tmp_path):
+    program = tmp_path / 'p.apl'
+    program.write_text("V←⍳100\nS←+/V\n")
+    text = app.explain_apl_code(str(program), 'with V=10')
+    assert '📐 Cost estimate (static, before running):' in text
+    assert 'V=10 ignored' in text
+
+
+def test_inputs_read_only_inside_dfns_and_strands_are_sized(write_csv, tmp_path):
+    data = write_csv('prices.csv', [('price', 'units')] + [(i, i % 7) for i in range(500)])
+    source = "F←{PRICE×⍵}\nT←+/F 2\nP←UNITS PRICE\n"
+    program, symbols, _ = app.compile_apl_source(source)
+    assert symbols['inputs'] == ('PRICE', 'UNITS')
+    inputs, notes = app._cost_inputs(f'using "{data}" with UNITS=500', symbols)
+    assert inputs['PRICE'].shape == (500,)
+    assert inputs['UNITS'].shape == (500,)
+    assert not any('ignored' in note or 'unsized' in note for note in notes)
+    rows = app.analyze_program_costs(program, inputs)
+    assert rows[1]['ops'] == 1000
+    assert rows[2]['summary'] == 'P ← strand of UNITS, PRICE'
+    path = tmp_path / 'prices.apl'
+    path.write_text(source)
+    text = app.explain_apl_code(str(path), f'using "{data}"')
+    assert 'PRICE, UNITS' in text
@@ -0,0 +1,53 @@
+import os
+import threading
+
+import app
+
+
+def test_hits_and_reload_on_change(write_csv):
+    path = write_csv('a.csv', [('x',), (1,), (2,)])
+    cache = app.DatasetCache(1 << 20)
+    first, cached = cache.get(path)
+    assert not cached and first.row_count == 2
+    again, cached = cache.get(path)
+    assert cached and again is first
+    write_csv('a.csv', [('x',), (1,), (2,), (3,)])
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    reloaded, cached = cache.get(path)
+    assert not cached and reloaded.row_count == 3
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_budget_evicts_least_recently_used(write_csv):
+    paths = [write_csv(f'{name}.csv', [('x',)] + [(i,) for i in range(100)]) for name in 'abc']
+    size = app.parse_csv_dataset(paths[0]).nbytes
+    cache = app.DatasetCache(size * 2)
+    cache.get(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert cache.stats()['entries'] == ['a.csv', 'c.csv']
+    assert cache.evictions == 1
+    assert cache.peek(paths[1]) is None
+
+
+def test_concurrent_misses_load_once(write_csv):
+    path = write_csv('shared.csv', [('x',), (1,)])
+    cache = app.DatasetCache(1 << 20)
+    loads = []
+    gate = threading.Event()
+
+    def loader(filepath):
+        loads.append(filepath)
+        gate.wait(5)
+        return app.load_dataset(filepath)
+
+    threads = [threading.Thread(target=cache.get, args=(path, loader)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert cache.hits == 3
@@ -0,0 +1,88 @@
+import pytest
+
+import app
+
+CASES = [
+    ('2 3⍴⍳6', '1 2 3\n4 5 6'),
+    ('+/2 3⍴⍳6', '6 15'),
+    ('+⌿2 3⍴⍳6', '5 7 9'),
+    ('+\\1 2 3 4', '1 3 6 10'),
+    ('-\\1 2 3 4', '1 ¯1 2 ¯2'),
+    ('-/1 2 3', '2'),
+    ('(2 2⍴1 2 3 4)+.×2 2⍴5 6 7 8', '19 22\n43 50'),
+    ('1 2 3∘.×1 2', '1 2\n2 4\n3 6'),
+    ('⍋3 1 2', '2 3 1'),
+    ('⍒3 1 2', '1 3 2'),
+    ('1 0 1/4 5 6', '4 6'),
+    ('2↑1 2 3', '1 2'),
+    ('¯2↑1 2 3', '2 3'),
+    ('5↑1 2', '1 2 0 0 0'),
+    ('⍉2 3⍴⍳6', '1 4\n2 5\n3 6'),
+    ('{⍵×2}¨1 2 3', '2 4 6'),
+    ('{⍺+⍵}/1 2 3', '6'),
+    ('F←{⍵=0:1 ⋄ ⍵×∇ ⍵-1}\nF 5', '120'),
+    ('X←1 2 3\nX[2]←10\nX', '1 10 3'),
+    ('M←3 3⍴⍳9\nM[2;]', '4 5 6'),
+    ('M←3 3⍴⍳9\nM[;1]', '1 4 7'),
+    ("'abc'⍳'c'", '3'),
+    ('(⍳5)∊2 4', '0 1 0 1 0'),
+    ('∪1 2 2 3 1', '1 2 3'),
+    ('⍴⍬', '0'),
+    ('1 2 3≡1 2 3', '1'),
+    ('≡(1 2)(3 4)', '2'),
+    ('↑(1 2)(3 4 5)', '1 2 0\n3 4 5'),
+    ('⌽1 2 3', '3 2 1'),
+    ('1⌽1 2 3', '2 3 1'),
+    ("2 2⍴'abcd'", 'ab\ncd'),
+    ('0÷0', '1'),
+    ('10|¯3 13', '7 3'),
+    ('2*10', '1024'),
+    ('1÷3', '0.3333333333'),
+    ('¯5', '¯5'),
+    ('(+/÷≢)1 2 3 4', '2.5'),
+    ('2 3⍴1 2', '1 2 1\n2 1 2'),
+    ('1 1⍉3 3⍴⍳9', '1 5 9'),
+    ('24 60⊤130', '2 10'),
+    ('2⊥1 0 1', '5'),
+    ('⍸0 1 0 1', '2 4'),
+    ('3=3', '1'),
+    ("'a'='abc'", '1 0 0'),
+    ('1 2 3 4 5~2 4', '1 3 5'),
+    ('1 2 3,4', '1 2 3 4'),
+    ('(2 2⍴⍳4),9', '1 2 9\n3 4 9'),
+    ('(2 2⍴⍳4)⍪9', '1 2\n3 4\n9 9'),
+    ('⊃2 3 4', '2'),
+    ('2⊃(1 2)(3 4)', '3 4'),
+    ('×/⍬', '1'),
+    ('2×⍣3⊢1', '8'),
+    ('+.×/ 1 2 3', '6'),
+    ('5 6 7[3 1]', '7 5'),
+    ('2 ⍕ 3.14159', '3.14'),
+    ("⍎'1+2'", '3'),
+    ('+/1 2 3 ⋄ 4', '6\n4'),
+    ('1 2 3 ⍝ comment', '1 2 3'),
+    ('~1 0', '0 1'),
+    ('⌈/⍬', '¯1.797693135E308'),
+]
+
+
+def _run(source):
+    scope = app.APLScope()
+    lines = []
+    for _, statement in app.parse_apl_program(source):
+        value = app.execute_apl_statement(statement, scope)
+        if value is not None:
+            lines.extend(app.format_apl_value(value))
+    return '\n'.join(lines)
+
+
+@pytest.mark.parametrize('source, expected', CASES)
+def test_evaluator(source, expected):
+    assert _run(source) == expected
+
+
+@pytest.mark.parametrize('source, error', [('÷0 2', 'DOMAIN ERROR'), ('1 2+1 2 3', 'LENGTH ERROR'),
+                                           ('UNDEFINED_NAME', 'VALUE ERROR')])
+def test_errors(source, error):
+    with pytest.raises(app.APLError, match=error):
+        _run(source)
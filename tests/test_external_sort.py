@@ -0,0 +1,50 @@
+import random
+from array import array
+
+import pytest
+
+import app
+
+BUDGET = 1024 * app.SORT_ITEM_BYTES
+
+
+@pytest.fixture
+def values():
+    rng = random.Random(25)
+    # few distinct values so the grades have to be stable across runs
+    return array('d', (float(rng.randint(0, 300)) for _ in range(10000)))
+
+
+def test_external_sort_matches_sorted(values):
+    assert list(app.external_sort(values, BUDGET)) == sorted(values)
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_external_grade_is_stable(values, descending):
+    expected = sorted(range(len(values)), key=values.__getitem__, reverse=descending)
+    assert list(app.external_grade(values, descending, BUDGET)) == expected
+
+
+def test_runs_are_spilled(values):
+    with app.SortedRuns(BUDGET) as runs:
+        runs.update(values[:5000])
+        runs.update(values[5000:])
+        assert len(runs.spilled) >= 4
+        assert runs.count == len(values)
+        ordered = sorted(values)
+        for k in (0, 1, 4999, 9998, 9999):
+            assert runs.select(k) == ordered[k]
+
+
+def test_spilled_quantiles_match_in_memory(values, monkeypatch):
+    fractions = (0.0, 0.25, 0.5, 0.9, 1.0)
+    expected = app.exact_quantiles(values, fractions)
+    monkeypatch.setattr(app, 'SORT_BUDGET_BYTES', BUDGET)
+    assert not app.sort_fits(len(values))
+    assert app.exact_quantiles(values, fractions) == pytest.approx(expected)
+
+
+def test_grade_primitive_spills_over_budget(apl, values, monkeypatch):
+    expected = list(apl('⍒V', V=app.apl_vector(values)).data)
+    monkeypatch.setattr(app, 'SORT_BUDGET_BYTES', BUDGET)
+    assert list(apl('⍒V', V=app.apl_vector(values)).data) == expected
@@ -0,0 +1,31 @@
+import pytest
+
+import app
+
+
+def test_refresh_reads_only_appended_records(write_csv):
+    path = write_csv('log.csv', [('t', 'value', 'note'), (1, 10, 'a'), (2, 12, 'b')])
+    state = app.FollowState(path)
+    assert state.refresh(path)[0] == 2
+    with open(path, 'a') as f:
+        f.write('3,15,c\n4,20,"half')
+    rows, _ = state.refresh(path)
+    assert rows == 1 and state.row_count == 3
+    with open(path, 'a') as f:
+        f.write(' written"\n5,25,e\n')
+    assert state.refresh(path)[0] == 2
+    assert state.refresh(path) == (0, 0)
+    value = state.columns['value']
+    assert (value['first'], value['last']) == (10, 25)
+    assert value['stats'].total == pytest.approx(82)
+    assert 'note' not in state.columns
+
+
+def test_follow_restarts_when_file_shrinks(write_csv, monkeypatch):
+    monkeypatch.setattr(app, 'FOLLOW_STATES', {})
+    path = write_csv('log.csv', [('t', 'value')] + [(i, i) for i in range(50)])
+    assert 'New rows: 50' in app.follow_data(str(path), 'metrics')
+    assert 'New rows: 0' in app.follow_data(str(path), 'metrics')
+    write_csv('log.csv', [('t', 'value'), (1, 5)])
+    result = app.follow_data(str(path), 'metrics')
+    assert 'started from the beginning' in result and 'Total rows: 1' in result
@@ -0,0 +1,50 @@
+import pytest
+
+import app
+
+EXPRESSIONS = [
+    '1↓V-¯1↓V',
+    '+/V×V+1',
+    '⌈/|V-3',
+    '⌊/2×-V',
+    '×/1+V÷100',
+    '3↑2↓V×2',
+    '¯4↑V+V',
+    '2 5⍴V×10',
+    '+/2 5⍴V-1',
+    ',(3 4⍴V)+1',
+    '(V×2)÷V-V',
+    '20↑V+1',
+    "V+'a'",
+    '1 2 3+V×2',
+]
+
+
+def _unfused(node):
+    if type(node) is not tuple:
+        return node
+    if node and node[0] == 'fused':
+        return _unfused(node[1])
+    return tuple(_unfused(x) for x in node)
+
+
+def _outcome(node, values):
+    scope = app.APLScope()
+    scope['V'] = app.apl_vector(values)
+    try:
+        result = app.execute_apl_statement(node, scope)
+        return result.shape, list(result.data)
+    except app.APLError as error:
+        return 'error', str(error)
+
+
+@pytest.mark.parametrize('source', EXPRESSIONS)
+def test_fused_matches_unfused(source):
+    values = [float(x) for x in (3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5, 8)]
+    [(_, statement)] = app.parse_apl_program(source)
+    assert _outcome(statement, values) == _outcome(_unfused(statement), values)
+
+
+def test_chains_are_fused():
+    [(_, statement)] = app.parse_apl_program('1↓V-¯1↓V')
+    assert statement[0] == 'fused'
@@ -0,0 +1,74 @@
+import random
+from collections import defaultdict
+
+import pytest
+
+import app
+
+
+def test_streamed_groups_match_brute_force(write_csv):
+    rng = random.Random(11)
+    rows = [('region', 'sales', 'units')]
+    expected = defaultdict(list)
+    for i in range(3000):
+        region = rng.choice(['north', 'south', 'east', ''])
+        sales = '' if i % 17 == 0 else round(rng.uniform(0, 100), 2)
+        rows.append((region, sales, rng.randint(1, 9)))
+        if sales != '':
+            expected[region].append(sales)
+    path = write_csv('sales.csv', rows)
+    grouped, row_count = app.stream_grouped_stats(path, 'region', chunk_rows=256)
+    assert row_count == 3000
+    stats = dict(zip(grouped.index, grouped.columns['sales']))
+    assert set(stats) == set(expected)
+    for region, values in expected.items():
+        assert stats[region].count == len(values)
+        assert stats[region].total == pytest.approx(sum(values))
+        assert (stats[region].minimum, stats[region].maximum) == (min(values), max(values))
+
+
+def _totals(grouped):
+    return {key: stats.total for key, stats in zip(grouped.index, grouped.columns['x'])}
+
+
+def test_category_codes_and_keys_agree():
+    by_key, by_code = app.GroupedStats(), app.GroupedStats()
+    keys = ['b', 'a', 'b', 'c', 'a']
+    values = {'x': [1.0, 2.0, 3.0, float('nan'), 5.0]}
+    by_key.update(keys, values)
+    by_code.update([1, 0, 1, 2, 0], values, categories=['a', 'b', 'c'])
+    assert _totals(by_key) == _totals(by_code) == {'a': 7.0, 'b': 4.0, 'c': 0.0}
+    assert dict(by_code.groups()) == {'a': 2, 'b': 2, 'c': 1}
+
+
+def test_key_operator(apl):
+    result = apl('K←1 2 1 3 2\nK {⍺,(+/⍵),≢⍵}⌸ 10 20 30 40 50')
+    assert result.shape == (3, 3)
+    assert list(result.data) == [1, 40, 2, 2, 70, 2, 3, 40, 1]
+    assert list(apl("{≢⍵}⌸ 'abcab'").data) == [2, 2, 1]
+
+
+@pytest.mark.parametrize('other', ['2', 'b'])
+def test_streamed_and_in_memory_keys_agree(write_csv, other):
+    rows = [('key', 'value'), ('1', 1), ('1.0', 2), (other, 4), ('1.50', 8), ('1.5', 16)]
+    path = write_csv(f'keys_{other}.csv', rows)
+    loaded = app.grouped_metrics(path, 'key')
+    streamed = app.grouped_metrics(path, 'key', streaming=True)
+    assert '(3 groups, 5 rows)' in loaded
+    assert streamed.replace(', streamed', '') == loaded
+    assert 'KEY = 1 (2 rows)' in loaded and 'KEY = 1.5 (2 rows)' in loaded
+
+
+def test_sparse_chunks_only_touch_their_groups(monkeypatch):
+    grouped = app.GroupedStats()
+    grouped.update([str(i) for i in range(1000)], {'x': [1.0] * 1000})
+    updates = []
+    original = app.RunningStats.update
+
+    def counting(self, values):
+        updates.append(len(values))
+        return original(self, values)
+    monkeypatch.setattr(app.RunningStats, 'update', counting)
+    grouped.update(['7', '7', '8'], {'x': [2.0, 3.0, 4.0]})
+    assert sorted(updates) == [1, 2]
+    assert dict(grouped.groups())['7'] == 3
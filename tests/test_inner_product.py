@@ -0,0 +1,30 @@
+import random
+from array import array
+
+import pytest
+
+import app
+
+
+def _naive(left, right, m, n, p):
+    return [sum(left[i * n + k] * right[k * p + j] for k in range(n)) for i in range(m) for j in range(p)]
+
+
+@pytest.mark.parametrize('m, n, p', [(1, 1, 1), (3, 5, 2), (70, 9, 130), (65, 64, 1)])
+def test_tiled_matmul_matches_naive(m, n, p):
+    rng = random.Random(m * 1000 + p)
+    left = array('d', (rng.uniform(-5, 5) for _ in range(m * n)))
+    right = array('d', (rng.uniform(-5, 5) for _ in range(n * p)))
+    assert list(app.PythonBackend().matmul(left, right, m, n, p)) == pytest.approx(_naive(left, right, m, n, p))
+
+
+def test_plus_times_primitive(apl):
+    result = apl('A←3 4⍴⍳12\nB←4 2⍴⍳8\nA+.×B')
+    assert result.shape == (3, 2)
+    assert list(result.data) == _naive(list(range(1, 13)), list(range(1, 9)), 3, 4, 2)
+
+
+def test_other_inner_products(apl):
+    assert list(apl('(2 3⍴⍳6)⌈.+3 2⍴⍳6').data) == [8, 9, 11, 12]
+    assert list(apl("'abc'∧.='abc'").data) == [1]
+    assert list(apl('1 2 3+.×4 5 6').data) == [32]
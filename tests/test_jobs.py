@@ -0,0 +1,55 @@
+import sys
+import threading
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def fresh_jobs(monkeypatch):
+    monkeypatch.setattr(app, 'JOBS', [])
+    monkeypatch.setattr(sys, 'stdout', app._ThreadOutput(sys.stdout))
+
+
+def test_background_command_result(tmp_path):
+    program = tmp_path / 'sum.apl'
+    program.write_text('+/⍳100\n')
+    started = app.parse_natural_syntax(f'run "{program}" &')
+    assert started.startswith('🧵 Job #1 started')
+    result = app.wait_command('1')
+    assert result.startswith('✅ Job #1 finished')
+    assert '5050' in result
+    assert app.JOBS[0].status == 'done'
+    assert app.job_notices() == []
+
+
+def test_cancel_stops_at_checkpoint(monkeypatch):
+    running = threading.Event()
+
+    def endless(command):
+        while True:
+            app.job_checkpoint(rows=10, nbytes=80)
+            running.set()
+
+    monkeypatch.setattr(app, 'parse_natural_syntax', endless)
+    app.start_job('spin')
+    assert running.wait(5)
+    assert app.cancel_command('1').startswith('⏹️ Cancelling job #1')
+    result = app.wait_command('1')
+    assert result.startswith('⏹️ Job #1 cancelled')
+    job = app.JOBS[0]
+    assert job.status == 'cancelled'
+    assert job.rows >= 10 and job.nbytes == job.rows * 8
+
+
+def test_failed_and_unknown_jobs(monkeypatch):
+    def broken(command):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(app, 'parse_natural_syntax', broken)
+    app.start_job('break')
+    assert app.wait_command('1') == '❌ Job #1 failed: boom'
+    assert app.wait_command('7') == '❌ No job #7 (1-1)'
+    assert app.cancel_command('1') == 'ℹ️ Job #1 already failed'
+    assert app.start_job('').startswith('❌ Nothing to run')
@@ -0,0 +1,51 @@
+import math
+import random
+
+import app
+
+
+def _cells(column):
+    return [('nan' if type(x) is float and math.isnan(x) else x) for x in column]
+
+
+def _assert_same(serial, parallel):
+    assert parallel.row_count == serial.row_count
+    assert list(parallel.columns) == list(serial.columns)
+    for name, column in serial.columns.items():
+        assert parallel.columns[name].kind == column.kind, name
+        assert _cells(parallel.columns[name]) == _cells(column), name
+
+
+def _ranges(path):
+    _, data_start, size = app._csv_header(path)
+    return app._csv_ranges(path, data_start, size, 2048)
+
+
+def test_parallel_parse_matches_serial(tmp_path):
+    rng = random.Random(6)
+    lines = ['id,price,note,code,flag']
+    for i in range(3000):
+        price = '' if i % 37 == 0 else f"{rng.uniform(0, 500):.2f}"
+        note = f'"line one, {i}\nline ""two"""' if i % 50 == 0 else rng.choice(['a', 'b', 'c'])
+        # numeric for most of the file, text in a late range: forces a re-parse as text
+        code = f"X{i}" if i == 2900 else str(rng.randint(0, 99))
+        lines.append(f"{i},{price},{note},{code},{rng.choice(['yes', 'no'])}")
+    path = tmp_path / 'mixed.csv'
+    path.write_text('\n'.join(lines) + '\n')
+    ranges = _ranges(path)
+    assert len(ranges) > 4
+    serial = app.parse_csv_dataset(path, workers=1)
+    _assert_same(serial, app.parse_csv_dataset(path, workers=3, ranges=ranges))
+    _assert_same(serial, app.parse_csv_dataset(path, workers=1, ranges=ranges))
+    assert serial.columns['code'].kind != 'number'
+    assert serial.columns['note'][50] == 'line one, 50\nline "two"'
+
+
+def test_ranges_split_on_record_boundaries(tmp_path):
+    path = tmp_path / 'quoted.csv'
+    path.write_text('a,b\n' + ''.join(f'{i},"x\n{i}"\n' for i in range(2000)))
+    ranges = _ranges(path)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    parsed = app.parse_csv_dataset(path, workers=2, ranges=ranges)
+    assert parsed.row_count == 2000
+    assert parsed.columns['b'][1999] == 'x\n1999'
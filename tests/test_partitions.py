@@ -0,0 +1,59 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def parts(write_csv, tmp_path):
+    write_csv('parts/2026-10-01.csv', [('a', 'b'), (1, 2), (3, 4)])
+    write_csv('parts/2026-10-02.csv', [('a', 'b', 'c'), (5, 6, 7), (8, 9, 10)])
+    write_csv('parts/2026-10-03.csv', [('b', 'c'), (11, 'x'), (12, 13)])
+    return tmp_path / 'parts'
+
+
+def values(dataset, name):
+    column = dataset.columns[name]
+    return [app._format_csv_number(x) for x in column.values] if column.kind == 'number' else list(column)
+
+
+def test_union_schema_fills_missing_columns(parts):
+    dataset = app.load_partitions(parts, partition='day')
+    assert dataset.column_names == ['a', 'b', 'c', 'day']
+    assert values(dataset, 'a') == ['1', '3', '5', '8', '', '']
+    assert values(dataset, 'day') == ['2026-10-01'] * 2 + ['2026-10-02'] * 2 + ['2026-10-03'] * 2
+
+
+@pytest.mark.parametrize('clause', [
+    'day = "2026-10-02"',
+    'day != "2026-10-01" and b > 8',
+    'c > 5',
+    'c != 7',
+    'a = "" or day = "2026-10-01"',
+])
+def test_where_sees_the_combined_dataset(parts, clause):
+    full = app.load_partitions(parts, partition='day')
+    expected = full.take(app.compile_where(clause, tuple(full.column_names)).select(full))
+    pushed = app.load_partitions(parts, partition='day', where=clause)
+    assert pushed.row_count == expected.row_count
+    for name in expected.column_names:
+        assert values(pushed, name) == values(expected, name)
+    with app.open_csv_rows(parts, 'day', clause) as (names, rows):
+        predicate = app.compile_where(clause, tuple(names)).test
+        assert sum(map(predicate, rows)) == expected.row_count
+
+
+def test_partition_predicate_skips_files(parts, monkeypatch):
+    parsed = []
+    ranges = app._csv_ranges
+    monkeypatch.setattr(app, '_csv_ranges', lambda path, *args: parsed.append(path.name) or ranges(path, *args))
+    dataset = app.load_partitions(parts, partition='day', where='day = "2026-10-03"')
+    assert dataset.row_count == 2
+    assert parsed == ['2026-10-03.csv']
+
+
+def test_commands_accept_partition_clauses(parts):
+    loaded = app.load_data_file(str(parts), 'partition as day where day = "2026-10-01"')
+    assert '2 matching rows' in loaded
+    for options in ('', ' stream'):
+        result = app.calculate_metrics(str(parts), 'metrics', f'partition as day where day = "2026-10-02"{options}')
+        assert 'Total: 13.00' in result, result
@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def profiler():
+    app.PROFILER.clear()
+    app.PROFILER.enable()
+    yield app.PROFILER
+    app.PROFILER.disable()
+    app.PROFILER.clear()
+
+
+def test_spans_are_bounded(monkeypatch):
+    monkeypatch.setattr(app, 'PROFILER_MAX_SPANS', 8)
+    profiler = app.Profiler()
+    profiler.enable()
+    for n in range(20):
+        with profiler.span(f'command {n}', 'command'):
+            with profiler.span('inner'):
+                pass
+    assert len(profiler.spans) == 8
+    command, inner = profiler.last_command()
+    assert command.name == 'command 19'
+    assert [span.name for span in inner] == ['inner']
+
+
+def test_last_command_is_per_thread():
+    profiler = app.Profiler()
+    profiler.enable()
+    started, release = threading.Event(), threading.Event()
+
+    def background():
+        with profiler.span('background', 'command'):
+            with profiler.span('background phase'):
+                started.set()
+                release.wait(5)
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    started.wait(5)
+    with profiler.span('foreground', 'command'):
+        with profiler.span('foreground phase'):
+            pass
+    release.set()
+    thread.join()
+    command, inner = profiler.last_command()
+    assert command.name == 'foreground'
+    assert [span.name for span in inner] == ['foreground phase']
+
+
+def test_worker_spans_are_kept(profiler, write_csv):
+    path = write_csv('numbers.csv', [('a', 'b')] + [(i, i * 2) for i in range(5000)])
+    _, data_start, size = app._csv_header(path)
+    ranges = app._csv_ranges(path, data_start, size, 4096)
+    assert len(ranges) > 2
+    with profiler.span('load', 'command'):
+        dataset = app.parse_csv_datasets([path], workers=2, ranges=[ranges])[0]
+    assert dataset.row_count == 5000
+    command, inner = profiler.last_command()
+    parse = next(span for span in inner if span.name.startswith('parse ranges'))
+    reads = [span for span in inner if span.name == 'read + decode']
+    assert len(reads) == len(ranges)
+    assert all(span.depth == parse.depth + 1 for span in reads)
+    assert sum(span.rows for span in inner if span.name == 'csv tokenize') == 5000
@@ -0,0 +1,45 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'APL_CACHE_DIR', tmp_path / 'cache')
+    with app._PROGRAM_CACHE_LOCK:
+        app._PROGRAM_CACHE.clear()
+    return tmp_path / 'cache'
+
+
+SOURCE = "V←⍳10\nF←{⍵×2}\nS←+/F V\n"
+
+
+def test_memory_cache_reuses_the_parsed_program(cache_dir):
+    program, symbols, origin = app.compile_apl_source(SOURCE)
+    assert origin is None
+    assert program == app.parse_apl_program(SOURCE)
+    assert tuple(symbols['functions']) == ('F',)
+    assert app.compile_apl_source(SOURCE)[2] == 'memory'
+
+
+def test_disk_cache_is_opt_in(cache_dir, monkeypatch):
+    assert not app.PROGRAM_CACHE_DISK
+    app.compile_apl_source(SOURCE)
+    assert not cache_dir.exists()
+
+    monkeypatch.setattr(app, 'PROGRAM_CACHE_DISK', True)
+    program, _, _ = app.compile_apl_source(SOURCE + "⍝ new key\n")
+    assert len(list(cache_dir.glob('*.aplc'))) == 1
+    with app._PROGRAM_CACHE_LOCK:
+        app._PROGRAM_CACHE.clear()
+    cached, _, origin = app.compile_apl_source(SOURCE + "⍝ new key\n")
+    assert origin == 'disk'
+    assert cached == program
+
+
+def test_symbols_walk_strands_dfn_bodies_and_indices():
+    program = app.parse_apl_program("X ← A B\nF ← {Q+⍵}\nF 1\nM[I;]\nG←{⍵>0:R ⋄ ⍵}\n")
+    symbols = app.program_symbols(program)
+    assert symbols['variables'] == ('X',)
+    assert symbols['functions'] == ('F', 'G')
+    assert symbols['inputs'] == ('A', 'B', 'I', 'M', 'Q', 'R')
@@ -0,0 +1,74 @@
+import random
+import statistics
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def events(write_csv):
+    rng = random.Random(9)
+    rows = [('id', 'latency', 'region')]
+    rows += [(i, round(rng.lognormvariate(3, 0.5), 3), rng.choice(['North', 'South'])) for i in range(60_000)]
+    return write_csv('events.csv', rows)
+
+
+@pytest.mark.parametrize('rows', [500, 2000, 5000])
+def test_block_sample_draws_exactly_the_requested_rows(events, rows):
+    dataset = app.sample_dataset(events, rows, seed=4)
+    assert dataset.sample['method'] == 'block'
+    assert dataset.row_count == rows
+    assert sum(dataset.sample['clusters']) == rows
+    assert dataset.sample['population'] == pytest.approx(60_000, rel=0.05)
+
+
+def test_block_sample_tops_up_for_selective_filters(events):
+    dataset = app.sample_dataset(events, 2000, seed=4, where='region = North')
+    assert dataset.row_count == 2000
+    assert set(dataset.columns['region']) == {'North'}
+    assert dataset.sample['population'] == pytest.approx(30_000, rel=0.1)
+
+
+def test_small_populations_report_requested_and_drawn(write_csv):
+    path = write_csv('tiny.csv', [('x',)] + [(i,) for i in range(50)])
+    dataset = app.sample_dataset(path, 1000)
+    assert dataset.row_count == 50
+    assert '50 (of 1,000 requested) of 50 rows' in app.describe_sample(dataset)
+
+
+def test_sampled_mean_interval_covers_the_true_mean(events):
+    full = app.parse_csv_dataset(events)
+    truth = statistics.mean(full.columns['latency'].present())
+    dataset = app.sample_dataset(events, 3000, seed=1)
+    column = dataset.columns['latency']
+    mean, error = app.sample_estimates(column, dataset.sample['population'], dataset.sample['clusters'])['mean']
+    assert abs(mean - truth) <= error
+
+
+def test_refinement_keeps_the_partition_column(write_csv, tmp_path):
+    write_csv('days/2026-10-01.csv', [('v',), (1,), (2,)])
+    write_csv('days/2026-10-02.csv', [('v',), (10,), (20,)])
+    options = 'partition as day where day = "2026-10-02" sample 10 refine'
+    result = app.calculate_metrics(str(tmp_path / 'days'), 'metrics', options)
+    assert '🎲 Sample: 2 (of 10 requested) of 2 rows' in result
+    number = len(app.REFINEMENTS)
+    _, future, _ = app.REFINEMENTS[number - 1]
+    exact = future.result(timeout=30)
+    assert 'Total: 30.00' in exact
+    assert exact == app.calculate_metrics(str(tmp_path / 'days'), 'metrics', 'partition as day where day = "2026-10-02"')
+
+
+def test_every_line_belongs_to_exactly_one_window(write_csv):
+    rng = random.Random(22)
+    # long rows straddle window boundaries; short ones often start right at one
+    rows = [('id', 'payload')] + [(i, 'x' * rng.choice([3, 40, 3000, 9000])) for i in range(400)]
+    path = write_csv('wide.csv', rows)
+    names, data_start, size = app._csv_header(path)
+    slots = -(-(size - data_start) // app.SAMPLE_WINDOW_BYTES)
+    seen = []
+    with open(path, 'rb') as f:
+        for slot in range(slots):
+            cells, _ = app._window_rows(f, data_start + slot * app.SAMPLE_WINDOW_BYTES, len(names), slot == 0)
+            seen.extend(int(row[0]) for row in cells)
+    assert seen == list(range(400))
@@ -0,0 +1,48 @@
+import asyncio
+import functools
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import app
+
+
+def _exchange(lines):
+    """Send request lines to _serve_client over a local socket and return the answers by id"""
+    async def main():
+        executor = ThreadPoolExecutor(max_workers=2)
+        handler = functools.partial(app._serve_client, executor=executor)
+        server = await asyncio.start_server(handler, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+        writer.write_eof()
+        answers = [json.loads(line) for line in (await reader.read()).decode('utf-8').splitlines()]
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        executor.shutdown(wait=True)
+        return answers
+    return asyncio.run(main())
+
+
+def test_requests_answered_by_id(monkeypatch):
+    monkeypatch.setattr(sys, 'stdout', app._ThreadOutput(sys.stdout))
+    answers = _exchange([
+        json.dumps({'id': 1, 'command': 'help'}),
+        json.dumps({'id': 2, 'command': 'no such command'}),
+        '{"command": 3}',
+    ])
+    by_id = {answer['id']: answer for answer in answers}
+    assert by_id[1]['ok'] and 'ms' in by_id[1]
+    assert not by_id[2]['ok']
+    assert not by_id[None]['ok'] and by_id[None]['result'].startswith('❌ Bad request')
+
+
+def test_printed_output_is_captured_per_request(monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, 'stdout', app._ThreadOutput(sys.stdout))
+    program = tmp_path / 'show.apl'
+    program.write_text('+/1 2 3\n')
+    answers = _exchange([json.dumps({'id': 'run', 'command': f'run "{program}"'})])
+    assert answers[0]['ok'], answers[0]['result']
+    assert '6' in answers[0]['output'].split('=' * 40)[1]
@@ -0,0 +1,52 @@
+import math
+import os
+
+import app
+
+
+def _cells(dataset):
+    return {name: [('nan' if type(x) is float and math.isnan(x) else x) for x in column]
+            for name, column in dataset.columns.items()}
+
+
+def test_sidecar_roundtrip(write_csv):
+    rows = [('id', 'amount', 'region', 'note')]
+    rows += [(i, '' if i % 11 == 0 else i * 1.5, ['north', 'south'][i % 2], f'note {i} é')
+             for i in range(600)]
+    path = write_csv('sales.csv', rows)
+    parsed = app.parse_csv_dataset(path)
+    app.write_sidecar(parsed)
+    mapped = app.load_sidecar(path)
+    assert mapped is not None
+    assert mapped.row_count == parsed.row_count
+    assert ({name: column.kind for name, column in mapped.columns.items()}
+            == {name: column.kind for name, column in parsed.columns.items()})
+    assert _cells(mapped) == _cells(parsed)
+
+
+def test_stale_sidecar_is_ignored(write_csv):
+    path = write_csv('small.csv', [('a', 'b'), (1, 2), (3, 4)])
+    app.write_sidecar(app.parse_csv_dataset(path))
+    assert app.load_sidecar(path) is not None
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert app.load_sidecar(path) is None
+
+
+def test_same_size_edit_in_the_middle_of_a_large_file(write_csv):
+    path = write_csv('large.csv', [('id', 'value')] + [(i, 1000 + i % 9000) for i in range(300000)])
+    assert path.stat().st_size > 2 << 20
+    dataset = app.parse_csv_dataset(path)
+    app.write_sidecar(dataset)
+    assert app.load_sidecar(path) is not None
+    stat = path.stat()
+    middle = stat.st_size // 2
+    with open(path, 'r+b') as f:
+        f.seek(middle)
+        line_end = f.read(64).index(b'\n')
+        f.seek(middle + line_end - 4)
+        f.write(b'9999')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert path.stat().st_size == stat.st_size
+    assert app.load_sidecar(path) is None
+    assert app.parse_csv_dataset(path).columns['value'].present() != dataset.columns['value'].present()
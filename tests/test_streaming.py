@@ -0,0 +1,68 @@
+import bisect
+import random
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def readings(write_csv):
+    rng = random.Random(3)
+    rows = [('source', 'value', 'count')]
+    for i in range(5000):
+        rows.append((rng.choice(['upstream', 'local']), '' if i % 97 == 0 else rng.gauss(50, 20),
+                     rng.randint(0, 9)))
+    return write_csv('readings.csv', rows)
+
+
+def test_stream_stats_match_in_memory(readings):
+    columns, row_count = app.stream_column_stats(readings, chunk_rows=512)
+    dataset = app.parse_csv_dataset(readings)
+    assert row_count == dataset.row_count
+    for column in dataset.numeric_columns():
+        present = column.present()
+        expected = app.RunningStats()
+        expected.update(present)
+        stats, _ = columns[column.name]
+        assert stats.count == expected.count == len(present)
+        assert stats.total == pytest.approx(expected.total)
+        assert stats.mean == pytest.approx(sum(present) / len(present))
+        assert stats.stdev == pytest.approx(expected.stdev)
+        assert (stats.minimum, stats.maximum) == (min(present), max(present))
+
+
+def test_stream_exact_quantiles_match_in_memory(readings):
+    columns, _ = app.stream_column_stats(readings, exact=True)
+    dataset = app.parse_csv_dataset(readings)
+    for column in dataset.numeric_columns():
+        _, runs = columns[column.name]
+        try:
+            assert runs.quantiles((0.25, 0.5, 0.75)) == pytest.approx(
+                app.exact_quantiles(column.present(), (0.25, 0.5, 0.75)))
+        finally:
+            runs.close()
+
+
+def test_sketch_rank_error_within_bound():
+    rng = random.Random(11)
+    values = [rng.expovariate(1.0) for _ in range(200_000)]
+    sketch = app.QuantileSketch(k=256, seed=5)
+    for start in range(0, len(values), 10_000):
+        sketch.update(values[start:start + 10_000])
+    ordered = sorted(values)
+    bound = sketch.error_bound()
+    assert 0 < bound < 0.05
+    fractions = [i / 20 for i in range(1, 20)]
+    for fraction, estimate in zip(fractions, sketch.quantiles(fractions)):
+        rank = bisect.bisect_left(ordered, estimate) / len(ordered)
+        assert abs(rank - fraction) <= bound
+
+
+def test_stream_keyword_is_a_whole_word(readings):
+    in_memory = app.calculate_metrics(str(readings), 'metrics', 'where source = "upstream"')
+    assert 'streamed' not in in_memory
+    streamed = app.calculate_metrics(str(readings), 'metrics', 'where source = "upstream" stream')
+    assert 'streamed' in streamed
+    total = lambda text: [line for line in text.splitlines() if 'Total' in line]
+    assert total(in_memory) == total(streamed)
@@ -0,0 +1,45 @@
+import math
+import random
+from array import array
+
+import pytest
+
+import app
+
+
+def reference_sums(values, window):
+    return [math.fsum(values[i:i + window]) for i in range(len(values) - window + 1)]
+
+
+@pytest.mark.parametrize('window', [1, 2, 7, 100])
+def test_rolling_sums_match_exact_window_sums(window):
+    rng = random.Random(window)
+    # Large spikes make prefix-sum differences lose the small values
+    values = array('d', [rng.uniform(-1, 1) + (1e12 if i % 500 == 0 else 0) for i in range(20_000)])
+    expected = reference_sums(values, window)
+    sums = app.rolling_sums(values, window)
+    assert len(sums) == len(expected)
+    for got, want in zip(sums, expected):
+        # within an ulp or two of the window's own magnitude, not the prefix's
+        assert abs(got - want) <= 4e-16 * max(abs(want), 1) + (1e-3 if abs(want) > 1e11 else 1e-9)
+
+
+def test_rolling_sums_recover_after_non_finite_values():
+    values = array('d', [1, 2, math.inf, 4, 5, 6])
+    assert list(app.rolling_sums(values, 2)) == [3, math.inf, math.inf, 9, 11]
+    assert list(app.rolling_sums(values, 7)) == []
+
+
+@pytest.mark.parametrize('largest', [True, False])
+def test_rolling_extremes_match_naive(largest):
+    rng = random.Random(2)
+    values = array('d', [rng.randint(0, 50) for _ in range(2000)])
+    pick = max if largest else min
+    expected = [pick(values[i:i + 9]) for i in range(len(values) - 8)]
+    assert list(app.rolling_extremes(values, 9, largest)) == expected
+
+
+def test_nwise_reduction_matches_rolling_sums(apl):
+    values = app.APLArray((6,), array('d', [1, 2, 3, 4, 5, 6]))
+    assert list(apl('3 +/ V', V=values).data) == [6, 9, 12, 15]
+    assert list(apl('3 ⌈/ V', V=values).data) == [3, 4, 5, 6]
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+import app
+
+
+def cells(column):
+    """A column's cells as text, whichever type it was loaded as"""
+    if column.kind == 'number':
+        return [app._format_csv_number(x) for x in column.values]
+    return [app._cell_text(cell) for cell in column]
+
+
+@pytest.fixture
+def sales(write_csv):
+    rng = random.Random(7)
+    rows = [('id', 'revenue', 'region', 'note')]
+    for i in range(2000):
+        rows.append((f"{i}.0" if i % 3 else i, rng.choice(['', rng.uniform(0, 1000)]),
+                     rng.choice(['North', 'South', 'East']), rng.choice(['a', 'b', '7', ''])))
+    return write_csv('sales.csv', rows)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('where a > 1 stream', ('stream', 'a > 1')),
+    ('where day = "x" trend', ('trend', 'day = "x"')),
+    ('stream where source = "upstream"', ('stream', 'source = "upstream"')),
+    ('where mode = stream and b < 2 or c = "by" by region', ('by region', 'mode = stream and b < 2 or c = "by"')),
+    ('trend predict', ('trend predict', None)),
+])
+def test_split_where_stops_at_options(text, expected):
+    assert app._split_where(text) == expected
+
+
+def test_unknown_words_stay_in_the_clause():
+    options, clause = app._split_where('where a > 1 bogus')
+    with pytest.raises(ValueError, match='near: bogus'):
+        app.RowFilter(clause, ['a'])
+
+
+@pytest.mark.parametrize('clause', [
+    'region = North',
+    'region != "North" and revenue >= 500',
+    'revenue < 250 or region = East',
+    'id = "1001"',
+    'id <= "20"',
+    'note = 7',
+    'note = "7" or revenue > 900',
+    'revenue != 100',
+])
+def test_pushdown_matches_post_filter(sales, clause):
+    full = app.parse_csv_dataset(sales)
+    names = tuple(full.column_names)
+    expected = app.compile_where(clause, names).select(full)
+    pushed = app.parse_csv_dataset(sales, None, clause)
+    assert pushed.row_count == len(expected)
+    filtered = full.take(expected)
+    for name in names:
+        assert cells(pushed.columns[name]) == cells(filtered.columns[name])
+
+
+def test_numeric_cells_match_their_canonical_text(sales):
+    pushed = app.parse_csv_dataset(sales, None, 'id = "1001"')
+    assert pushed.row_count == 1
@@ -0,0 +1,75 @@
+import functools
+import os
+import random
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def orders(write_csv):
+    rng = random.Random(5)
+    rows = [('amount', 'units', 'region')]
+    rows += [(round(rng.uniform(1, 500), 2), rng.randint(1, 20), rng.choice('NSEW')) for _ in range(3000)]
+    return write_csv('orders.csv', rows)
+
+
+def metric_lines(text, *labels):
+    return [line for line in text.splitlines() if line.strip().startswith(labels)]
+
+
+def test_loading_writes_no_zone_map_by_default(orders):
+    app.load_data_file(str(orders))
+    assert not app.zone_map_path(orders).exists()
+    assert '🗂️ Zone map' in app.load_data_file(str(orders), 'index')
+    assert app.zone_map_path(orders).exists()
+
+
+def test_zone_map_only_answers_when_asked(orders):
+    scanned = app.calculate_metrics(str(orders), 'metrics')
+    app.load_data_file(str(orders), 'index')
+    assert app.calculate_metrics(str(orders), 'metrics') == scanned
+    assert metric_lines(app.calculate_metrics(str(orders), 'metrics', 'stream'), 'Median')
+
+    indexed = app.calculate_metrics(str(orders), 'metrics', 'index')
+    assert 'zone map' in indexed and not metric_lines(indexed, 'Median')
+    labels = ('Total', 'Average', 'Range')
+    assert metric_lines(indexed, *labels) == metric_lines(scanned, *labels)
+
+
+def test_zone_map_block_skipping_keeps_the_same_rows(write_csv, monkeypatch):
+    monkeypatch.setattr(app, '_csv_ranges', functools.partial(app._csv_ranges, range_bytes=4096))
+    rows = [('amount', 'region')] + [(i / 10, 'NSEW'[i % 4]) for i in range(5000)]
+    path = write_csv('sorted.csv', rows)
+    dataset = app.parse_csv_dataset(path)
+    zones = app.ZoneMap.build(dataset)
+    row_filter = app.compile_where('amount > 450 or region = N', tuple(dataset.column_names))
+    assert len(zones.candidate_blocks(row_filter)) == len(zones.blocks)
+    row_filter = app.compile_where('amount > 450 and region = N', tuple(dataset.column_names))
+    blocks = zones.candidate_blocks(row_filter)
+    assert len(blocks) < len(zones.blocks)
+    skipped = app.parse_csv_dataset(path, None, row_filter.clause, blocks)
+    assert skipped.row_count == len(row_filter.select(dataset)) == 124
+
+
+def test_same_size_edit_in_the_middle_invalidates_the_zone_map(write_csv):
+    path = write_csv('large.csv', [('id', 'value')] + [(i, 1000 + i % 9000) for i in range(300000)])
+    assert path.stat().st_size > 2 << 20
+    app.write_zone_map(app.parse_csv_dataset(path))
+    before = app.calculate_metrics(str(path), 'metrics', 'index')
+    assert 'zone map' in before
+    assert app.estimate_csv_rows(path) == (300000, True)
+    stat = path.stat()
+    middle = stat.st_size // 2
+    with open(path, 'r+b') as f:
+        f.seek(middle)
+        line_end = f.read(64).index(b'\n')
+        f.seek(middle + line_end - 4)
+        f.write(b'9999')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert app.load_zone_map(path) is None
+    assert app.estimate_csv_rows(path)[1] is False
+    after = app.calculate_metrics(str(path), 'metrics', 'index')
+    assert 'No fresh zone map' in after
+    assert metric_lines(after, 'Total') != metric_lines(before, 'Total')